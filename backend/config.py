@@ -4,9 +4,65 @@ IS_PROD = os.getenv("IS_PROD") is not None
 
 PORT = int(os.getenv("PORT", "8081"))
 
+# "mongo" (synchronous driver on a thread pool), "mongo-async" (native asyncio driver) or "memory",
+# the latter is for load testing and is populated from parsha JSON files on startup
+DB_BACKEND = os.getenv("DB_BACKEND", "mongo")
+MEMORY_DB_PARSHA_DATA_DIR = os.getenv("MEMORY_DB_PARSHA_DATA_DIR", "json")
+
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/")
 MONGO_DB = os.getenv("MONGO_DB", "torah-reading-data")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+# size of the thread pool running synchronous driver calls, unused with the native async driver
+MONGO_THREADS = int(os.getenv("MONGO_THREADS", "8"))
 
 PEPPER = os.getenv("PEPPER", "no-pepper").encode("utf-8")
 
 ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "local-admin-token")
+
+# access token -> user cache, each server process has its own, so a token deleted in one process may still be
+# accepted by the others for up to TTL seconds
+AUTH_CACHE_TTL_SEC = float(os.getenv("AUTH_CACHE_TTL_SEC", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+# random starred comment shown to a user stays the same for this long, unless the user unstars a comment
+RANDOM_STARRED_COMMENT_TTL_SEC = float(os.getenv("RANDOM_STARRED_COMMENT_TTL_SEC", "600"))
+RANDOM_STARRED_COMMENT_CACHE_MAX_ENTRIES = int(os.getenv("RANDOM_STARRED_COMMENT_CACHE_MAX_ENTRIES", "10000"))
+
+# text search stops counting matches at the cap and reports "at least N" total (0 for exact counts); counts are
+# cached per normalized query for a short time, as they are by far the most expensive part of a popular query
+SEARCH_COUNT_CAP = int(os.getenv("SEARCH_COUNT_CAP", "1000"))
+SEARCH_COUNT_CACHE_TTL_SEC = float(os.getenv("SEARCH_COUNT_CACHE_TTL_SEC", "300"))
+SEARCH_COUNT_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_COUNT_CACHE_MAX_ENTRIES", "10000"))
+
+# "mongo" for Mongo $text indices or "inverted-index" for the in-process search engine, persisted to SEARCH_INDEX_DIR;
+# the engine is updated only on writes made through the same server process, so the directory must be removed
+# to rebuild the index after the data is changed by other means
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "mongo")
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", "search-index")
+# the index is saved at most once per this delay, with all updates made meanwhile
+SEARCH_INDEX_SAVE_DELAY_SEC = float(os.getenv("SEARCH_INDEX_SAVE_DELAY_SEC", "30"))
+
+PARSHA_CACHE_MAX_BYTES = int(float(os.getenv("PARSHA_CACHE_MAX_MB", "512")) * 1024**2)
+PARSHA_CACHE_EVICTION_POLICY = os.getenv("PARSHA_CACHE_EVICTION_POLICY", "lru")
+# number of chapter / verse range / text and comment source combinations per parsha with cached pre-serialized
+# responses (in addition to the whole parsha)
+PARSHA_CACHE_MAX_VIEWS = int(os.getenv("PARSHA_CACHE_MAX_VIEWS", "64"))
+PARSHA_CACHE_WARMUP = os.getenv("PARSHA_CACHE_WARMUP") is not None
+PARSHA_CACHE_WARMUP_CONCURRENCY = int(os.getenv("PARSHA_CACHE_WARMUP_CONCURRENCY", "4"))
+
+# texts, comments and starred comments read from DB on hot paths are trusted and not validated, unless this is set
+VALIDATE_DB_DOCUMENTS = os.getenv("VALIDATE_DB_DOCUMENTS") is not None
+
+# "orjson" (used only if installed) or "json" for the standard library encoder
+JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson")
+
+# compressions applied to pre-serialized responses, in order of preference; "br" is used only if the optional
+# brotli package is installed, e.g. RESPONSE_CONTENT_ENCODINGS=br,gzip
+RESPONSE_CONTENT_ENCODINGS = [ce.strip() for ce in os.getenv("RESPONSE_CONTENT_ENCODINGS", "gzip").split(",")]
+
+# Cache-Control header values for responses supporting conditional requests
+PARSHA_CACHE_CONTROL = os.getenv("PARSHA_CACHE_CONTROL", "public, no-cache")
+METADATA_CACHE_CONTROL = os.getenv("METADATA_CACHE_CONTROL", "private, no-cache")
+# for parsha data with user-specific overlays (starred and user comments)
+PRIVATE_PARSHA_CACHE_CONTROL = os.getenv("PRIVATE_PARSHA_CACHE_CONTROL", "private, no-cache")
@@ -1,6 +1,7 @@
 class AppExtensions:
     DB = "db"
     BACKGROUND_JOBS_SET = "background-tasks"
+    PARSHA_CACHE_WARMUP_TASK = "parsha-cache-warmup-task"
 
 
 SIGNUP_TOKEN_HEADER = "X-Signup-Token"
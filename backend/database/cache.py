@@ -0,0 +1,366 @@
+import asyncio
+import collections
+import hashlib
+import logging
+import sys
+import time
+from enum import Enum
+from typing import Any, Callable, Generic, Hashable, NamedTuple, Optional, TypeVar
+
+from backend import serialization
+from backend.model import ParshaData
+from backend.overlay import WHOLE_PARSHA, IndexedParshaData, ParshaDataView
+
+logger = logging.getLogger(__name__)
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class EvictionPolicy(Enum):
+    LRU = "lru"  # least recently used
+    LFU = "lfu"  # least frequently used, ties broken by recency
+
+
+class CacheStats(NamedTuple):
+    entries: int
+    size_bytes: int
+    max_size_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.entries} entries, {self.size_bytes / 1024**2:.1f} / {self.max_size_bytes / 1024**2:.1f} MiB, "
+            + f"{self.hits} hits, {self.misses} misses ({self.hit_ratio:.1%} hit ratio), {self.evictions} evictions"
+        )
+
+
+class EncodedParshaData(NamedTuple):
+    """Parsha data as a ready-to-send response body along with its HTTP validators"""
+
+    body: bytes
+    content_encoding: Optional[str]
+    # strong ETag value, without quotes; the only validator, as content hash it changes exactly when the body does
+    etag: str
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def encoded_parsha_data(body: bytes, content_encoding: Optional[str], identity_body_hash: str) -> EncodedParshaData:
+    # strong validators must differ between representations, i.e. between content encodings
+    etag = identity_body_hash if content_encoding is None else f"{identity_body_hash}-{content_encoding}"
+    return EncodedParshaData(body, content_encoding, etag)
+
+
+def estimate_size(obj: Any) -> int:
+    """Rough estimate of memory occupied by a JSON-like object (dicts, lists, strings, numbers)"""
+    size = 0
+    seen = set[int]()
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple)):
+            stack.extend(o)
+    return size
+
+
+class _CacheEntry:
+    __slots__ = (
+        "parsha_data",
+        "indexed",
+        "encoded",
+        "identity_body_hashes",
+        "views",
+        "size",
+        "uses",
+    )
+
+    def __init__(self, parsha_data: ParshaData, size: int) -> None:
+        self.parsha_data = parsha_data
+        # verse and comment positions for user data overlay
+        self.indexed: Optional[IndexedParshaData] = None
+        # pre-serialized JSON response bodies by view (chapter / verse range and sources) and content encoding
+        self.encoded: dict[tuple[ParshaDataView, str], bytes] = dict()
+        self.identity_body_hashes: dict[ParshaDataView, str] = dict()
+        # views other than the whole parsha with encoded bodies, from the least to the most recently used
+        self.views = collections.OrderedDict[ParshaDataView, None]()
+        self.size = size
+        self.uses = 0
+
+
+def _encode_all(parsha_data: ParshaData, content_encodings: list[str]) -> tuple[str, dict[str, bytes]]:
+    identity_body = serialization.dumps(parsha_data)
+    bodies = {serialization.IDENTITY: identity_body}
+    for content_encoding in content_encodings:
+        bodies[content_encoding] = serialization.compress(identity_body, content_encoding)
+    return content_hash(identity_body), bodies
+
+
+class ParshaDataCache:
+    """In-process parsha data cache with a memory budget, evicting entries according to the policy when full"""
+
+    def __init__(
+        self, max_size_bytes: int, policy: EvictionPolicy = EvictionPolicy.LRU, max_views: int = 64
+    ) -> None:
+        self.max_size_bytes = max_size_bytes
+        self.policy = policy
+        # number of views (chapters, verse ranges, source combinations) per parsha with pre-serialized bodies,
+        # the least recently used view's bodies are dropped when exceeded; the whole parsha is always kept
+        self.max_views = max_views
+        # ordered from the least to the most recently used
+        self._entries = collections.OrderedDict[int, _CacheEntry]()
+        self._size_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __contains__(self, index: int) -> bool:
+        return index in self._entries
+
+    def get(self, index: int) -> Optional[ParshaData]:
+        entry = self._entries.get(index)
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        entry.uses += 1
+        self._entries.move_to_end(index)
+        return entry.parsha_data
+
+    def peek(self, index: int) -> Optional[ParshaData]:
+        """Cached parsha data for incidental reads (e.g. single verses of search results), which neither count
+        as a cache hit or miss nor affect eviction"""
+        entry = self._entries.get(index)
+        return entry.parsha_data if entry is not None else None
+
+    def put(self, index: int, parsha_data: ParshaData) -> None:
+        self.invalidate(index)
+        size = estimate_size(parsha_data)
+        if size > self.max_size_bytes:
+            logger.warning(
+                f"Parsha #{index} is estimated at {size} bytes, which exceeds the whole cache budget, not caching it"
+            )
+            return
+        while self._size_bytes + size > self.max_size_bytes:
+            self._evict_one()
+        self._entries[index] = _CacheEntry(parsha_data, size)
+        self._size_bytes += size
+
+    def get_encoded(
+        self, index: int, content_encoding: Optional[str], view: ParshaDataView = WHOLE_PARSHA
+    ) -> Optional[EncodedParshaData]:
+        """Cached parsha data (or its view) serialized to JSON and compressed with given encoding, None if the parsha
+        is not cached or there are no verses in the view; does not count as a cache hit or miss, so it is intended
+        to be called right after the get()"""
+        entry = self._entries.get(index)
+        if entry is None:
+            return None
+        identity_body = entry.encoded.get((view, serialization.IDENTITY))
+        identity_body_hash = entry.identity_body_hashes.get(view)
+        if identity_body is None or identity_body_hash is None:
+            view_data = view.apply(entry.parsha_data)
+            if view_data is None:
+                return None
+            identity_body = serialization.dumps(view_data)
+            identity_body_hash = entry.identity_body_hashes[view] = content_hash(identity_body)
+            self._add_encoded(index, entry, view, serialization.IDENTITY, identity_body)
+        if view != WHOLE_PARSHA:
+            if view in entry.views:
+                entry.views.move_to_end(view)
+            else:
+                if len(entry.views) >= self.max_views:
+                    self._drop_encoded(entry, entry.views.popitem(last=False)[0])
+                entry.views[view] = None
+        if content_encoding is None or content_encoding == serialization.IDENTITY:
+            body = identity_body
+        else:
+            maybe_body = entry.encoded.get((view, content_encoding))
+            if maybe_body is None:
+                body = serialization.compress(identity_body, content_encoding)
+                self._add_encoded(index, entry, view, content_encoding, body)
+            else:
+                body = maybe_body
+        return encoded_parsha_data(body, content_encoding, identity_body_hash)
+
+    async def warm_up_encoded(self, index: int, content_encodings: list[str]) -> None:
+        """Pre-serialize cached parsha data and compress it with given encodings; the work is done in a thread
+        to not stall the event loop, and the bodies are stored unless the parsha was invalidated meanwhile"""
+        entry = self._entries.get(index)
+        if entry is None:
+            return
+        parsha_data = entry.parsha_data
+        identity_body_hash, bodies = await asyncio.to_thread(_encode_all, parsha_data, content_encodings)
+        entry = self._entries.get(index)
+        if entry is None or entry.parsha_data is not parsha_data:
+            return
+        # serialization is deterministic, so the bodies are the same as the ones possibly stored meanwhile
+        entry.identity_body_hashes[WHOLE_PARSHA] = identity_body_hash
+        for content_encoding, body in bodies.items():
+            if (WHOLE_PARSHA, content_encoding) not in entry.encoded:
+                self._add_encoded(index, entry, WHOLE_PARSHA, content_encoding, body)
+
+    def get_indexed(self, index: int) -> Optional[IndexedParshaData]:
+        """Cached parsha data with verse and comment positions, None if the parsha is not cached;
+        like get_encoded(), does not count as a cache hit or miss"""
+        entry = self._entries.get(index)
+        if entry is None:
+            return None
+        if entry.indexed is None:
+            indexed = IndexedParshaData(entry.parsha_data)
+            size = estimate_size(indexed.verse_positions) + estimate_size(indexed.comment_positions)
+            if not self._reserve(index, size):
+                return indexed
+            entry.indexed = indexed
+            entry.size += size
+            self._size_bytes += size
+        return entry.indexed
+
+    def invalidate(self, index: int) -> None:
+        entry = self._entries.pop(index, None)
+        if entry is not None:
+            self._size_bytes -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size_bytes = 0
+
+    def indices(self) -> list[int]:
+        return list(self._entries.keys())
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            entries=len(self._entries),
+            size_bytes=self._size_bytes,
+            max_size_bytes=self.max_size_bytes,
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+        )
+
+    def _add_encoded(
+        self,
+        index: int,
+        entry: _CacheEntry,
+        view: ParshaDataView,
+        content_encoding: str,
+        encoded: bytes,
+    ) -> None:
+        size = sys.getsizeof(encoded)
+        if not self._reserve(index, size):
+            return
+        entry.encoded[(view, content_encoding)] = encoded
+        entry.size += size
+        self._size_bytes += size
+
+    def _drop_encoded(self, entry: _CacheEntry, view: ParshaDataView) -> None:
+        entry.identity_body_hashes.pop(view, None)
+        for key in [key for key in entry.encoded if key[0] == view]:
+            size = sys.getsizeof(entry.encoded.pop(key))
+            entry.size -= size
+            self._size_bytes -= size
+
+    def _reserve(self, index: int, size: int) -> bool:
+        """Evict other entries to fit additional data of the given size for the entry, False if it's impossible"""
+        while self._size_bytes + size > self.max_size_bytes and len(self._entries) > 1:
+            self._evict_one(keep=index)
+        return self._size_bytes + size <= self.max_size_bytes
+
+    def _evict_one(self, keep: Optional[int] = None) -> None:
+        candidates = [i for i in self._entries if i != keep]
+        if self.policy is EvictionPolicy.LFU:
+            # min() returns the first of equally used entries, i.e. the least recently used one
+            index = min(candidates, key=lambda i: self._entries[i].uses)
+        else:
+            index = candidates[0]
+        logger.info(f"Evicting parsha #{index} from cache ({self.policy.value})")
+        self.invalidate(index)
+        self._evictions += 1
+
+
+class TTLCacheStats(NamedTuple):
+    entries: int
+    max_entries: int
+    hits: int
+    misses: int
+    expirations: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.entries} / {self.max_entries} entries, {self.hits} hits, {self.misses} misses "
+            + f"({self.hit_ratio:.1%} hit ratio), {self.expirations} expirations"
+        )
+
+
+class TTLCache(Generic[K, V]):
+    """Bounded cache with a fixed time-to-live for entries, evicting the oldest ones when full"""
+
+    def __init__(self, ttl: float, max_entries: int, clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        # (value, expiration time) ordered from the oldest to the newest, which is also the order of expiration
+        self._entries = collections.OrderedDict[K, tuple[V, float]]()
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if self.clock() < expires_at:
+                self._hits += 1
+                return value
+            self._entries.pop(key)
+            self._expirations += 1
+        self._misses += 1
+        return None
+
+    def put(self, key: K, value: V) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries.pop(key, None)
+        while len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+        self._entries[key] = (value, self.clock() + self.ttl)
+
+    def invalidate(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[V], bool]) -> None:
+        for key in [key for key, (value, _) in self._entries.items() if predicate(value)]:
+            self._entries.pop(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> TTLCacheStats:
+        return TTLCacheStats(
+            entries=len(self._entries),
+            max_entries=self.max_entries,
+            hits=self._hits,
+            misses=self._misses,
+            expirations=self._expirations,
+        )
@@ -1,11 +1,12 @@
 import abc
 import logging
 from enum import Enum
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from bson import ObjectId
 
 from backend.auth import generate_signup_token
+from backend.database.cache import CacheStats, EncodedParshaData, TTLCacheStats
 from backend.model import (
     DisplayedUserComment,
     EditedComment,
@@ -20,6 +21,7 @@ from backend.model import (
     StoredUserComment,
     TextOrCommentIterRequest,
 )
+from backend.overlay import WHOLE_PARSHA, IndexedParshaData, ParshaDataView
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +37,18 @@ class SearchTextIn(Enum):
     COMMENTS = "comments"
 
 
+class UserParshaData(NamedTuple):
+    """User-specific data overlayed on a parsha"""
+
+    starred_comment_ids: set[str]
+    user_comments: list[DisplayedUserComment]
+
+
+class StarredCommentsPage(NamedTuple):
+    starred_comments: list[StarredCommentData]
+    next_cursor: Optional[str]  # None on the last page
+
+
 class DatabaseInterface(abc.ABC):
     async def setup(self) -> None:
         logger.info("Reading root signup token")
@@ -46,6 +60,10 @@ class DatabaseInterface(abc.ABC):
         logger.info(f"Root signup token: {root_signup_token}")
         await self.create_indices()
 
+    async def teardown(self) -> None:
+        """Finish pending background work before the app shuts down"""
+        pass
+
     @abc.abstractmethod
     async def create_indices(self) -> None:
         """Must be indempotent as it is run on every app startup"""
@@ -92,6 +110,10 @@ class DatabaseInterface(abc.ABC):
     async def authenticate_user(self, access_token: str) -> Optional[StoredUser]:
         ...
 
+    async def get_auth_cache_stats(self) -> Optional[TTLCacheStats]:
+        """None if the implementation does not cache authenticated users"""
+        return None
+
     # starred comments
 
     @abc.abstractmethod
@@ -116,8 +138,9 @@ class DatabaseInterface(abc.ABC):
 
     @abc.abstractmethod
     async def lookup_starred_comments_data(
-        self, starrer_username: str, parsha_indices: list[int], page: int, page_size: int
-    ) -> list[StarredCommentData]:
+        self, starrer_username: str, parsha_indices: list[int], page: int, page_size: int, cursor: Optional[str] = None
+    ) -> StarredCommentsPage:
+        """Paginated by the cursor from the previous page when it's passed, by the page number otherwise"""
         ...
 
     @abc.abstractmethod
@@ -128,6 +151,27 @@ class DatabaseInterface(abc.ABC):
 
     @abc.abstractmethod
     async def get_parsha_data(self, index: int) -> Optional[ParshaData]:
+        """Returned object may be shared with the cache and other requests and must be treated as read-only"""
+        ...
+
+    @abc.abstractmethod
+    async def get_parsha_data_encoded(
+        self, index: int, content_encoding: Optional[str], view: ParshaDataView = WHOLE_PARSHA
+    ) -> Optional[EncodedParshaData]:
+        """Parsha data serialized to JSON response body and compressed with the given content encoding, optionally
+        only a chapter / verse range of it with only some of the text and comment sources; None if the parsha is
+        not available or there are no verses in the view"""
+        ...
+
+    @abc.abstractmethod
+    async def warm_up_parsha_data(self, index: int, content_encodings: list[str]) -> None:
+        """Load parsha data into cache along with response bodies for all content encodings, without blocking
+        the event loop on serialization and compression"""
+        ...
+
+    @abc.abstractmethod
+    async def get_parsha_data_indexed(self, index: int) -> Optional[IndexedParshaData]:
+        """Read-only parsha data along with verse and comment positions, for overlaying user data"""
         ...
 
     @abc.abstractmethod
@@ -146,6 +190,10 @@ class DatabaseInterface(abc.ABC):
     async def get_cached_parsha_indices(self) -> list[int]:
         ...
 
+    @abc.abstractmethod
+    async def get_parsha_cache_stats(self) -> CacheStats:
+        ...
+
     @abc.abstractmethod
     async def edit_comment(self, comment_id: ObjectId, edited_comment: EditedComment) -> None:
         ...
@@ -167,8 +215,10 @@ class DatabaseInterface(abc.ABC):
         search_in: list[SearchTextIn],
         with_verse_parsha_data: bool,
         username: Optional[str],
+        cursor: Optional[str] = None,
     ) -> SearchTextResult:
-        """Each returned ParshaData will have only one chapter with one verse, containing the matched phrase"""
+        """Each returned ParshaData will have only one chapter with one verse, containing the matched phrase;
+        paginated by the cursor from the previous page when it's passed, by the page number otherwise"""
         ...
 
     @abc.abstractmethod
@@ -198,3 +248,12 @@ class DatabaseInterface(abc.ABC):
     @abc.abstractmethod
     async def lookup_user_comments(self, username: str, parsha: int) -> list[DisplayedUserComment]:
         ...
+
+    # all user data for a parsha at once
+
+    @abc.abstractmethod
+    async def lookup_user_parsha_data(
+        self, username: str, parsha: int, with_starred_comments: bool, with_user_comments: bool
+    ) -> UserParshaData:
+        """Equivalent to lookup_starred_comments() and lookup_user_comments(), but in a single request to DB"""
+        ...
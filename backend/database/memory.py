@@ -0,0 +1,556 @@
+import collections
+import json
+import logging
+import random
+from pathlib import Path
+from typing import Iterable, Optional, TypeVar, Union
+
+import bson
+from aiohttp import web
+
+from backend import config, serialization
+from backend.database.cache import (
+    CacheStats,
+    EncodedParshaData,
+    EvictionPolicy,
+    ParshaDataCache,
+    content_hash,
+    encoded_parsha_data,
+)
+from backend.database.interface import (
+    DatabaseInterface,
+    SearchTextIn,
+    SearchTextSorting,
+    StarredCommentsPage,
+    UserParshaData,
+)
+from backend.database.mongo import (
+    CoordsTriplet,
+    are_search_totals_capped,
+    parsha_data_to_texts_and_comments,
+    texts_and_comments_to_parsha_data,
+)
+from backend.database.pagination import (
+    CursorKeysets,
+    Keyset,
+    decode_cursor,
+    next_cursor,
+    paginate_search_hits,
+)
+from backend.model import (
+    DbSchemaModel,
+    DisplayedUserComment,
+    EditedComment,
+    FoundMatch,
+    ParshaData,
+    PydanticObjectId,
+    SearchTextResult,
+    SignupToken,
+    StarredComment,
+    StarredCommentData,
+    StoredComment,
+    StoredText,
+    StoredUser,
+    StoredUserComment,
+    TextOrCommentIterRequest,
+)
+from backend.overlay import WHOLE_PARSHA, IndexedParshaData, ParshaDataView
+from backend.search.engine import IndexName, SearchEngine
+from backend.search.index import InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+
+ModelT = TypeVar("ModelT", bound=DbSchemaModel)
+TextOrComment = Union[StoredText, StoredComment]
+TextOrCommentT = TypeVar("TextOrCommentT", StoredText, StoredComment)
+
+# names of paginated result sets in cursors, matching MongoDatabase collection names
+TEXTS_CURSOR_KEY: IndexName = "texts"
+COMMENTS_CURSOR_KEY: IndexName = "comments"
+STARRED_COMMENTS_CURSOR_KEY = "starred-comments"
+
+
+def with_new_db_id(model: ModelT) -> ModelT:
+    return model.copy(update={"db_id": PydanticObjectId()})
+
+
+class InMemoryDatabase(DatabaseInterface):
+    """Complete in-process implementation of the database interface, for tests and load testing;
+    all data is lost on restart"""
+
+    def __init__(self) -> None:
+        self.users_by_id: dict[bson.ObjectId, StoredUser] = dict()
+        self.user_ids_by_username: dict[str, bson.ObjectId] = dict()
+        self.signup_tokens_by_token: dict[str, SignupToken] = dict()
+        self.signup_tokens_by_creator: dict[Optional[str], SignupToken] = dict()
+        self.user_ids_by_access_token: dict[str, bson.ObjectId] = dict()
+        # dicts instead of sets to preserve the order in which comments were starred
+        self.starred_comment_ids_by_username = collections.defaultdict[str, dict[bson.ObjectId, None]](dict)
+
+        self.texts_by_id: dict[bson.ObjectId, StoredText] = dict()
+        self.comments_by_id: dict[bson.ObjectId, StoredComment] = dict()
+        self.text_ids_by_coords = collections.defaultdict[CoordsTriplet, dict[bson.ObjectId, None]](dict)
+        self.comment_ids_by_coords = collections.defaultdict[CoordsTriplet, dict[bson.ObjectId, None]](dict)
+        self.text_ids_by_parsha = collections.defaultdict[int, dict[bson.ObjectId, None]](dict)
+        self.comment_ids_by_parsha = collections.defaultdict[int, dict[bson.ObjectId, None]](dict)
+        self.search_engine = SearchEngine(texts_index=InvertedIndex(), comments_index=InvertedIndex())
+
+        self.user_comments_by_id: dict[bson.ObjectId, StoredUserComment] = dict()
+        self.user_comment_ids_by_username_and_parsha = collections.defaultdict[
+            tuple[str, int], dict[bson.ObjectId, None]
+        ](dict)
+
+        self.parsha_data_cache = ParshaDataCache(
+            max_size_bytes=config.PARSHA_CACHE_MAX_BYTES,
+            policy=EvictionPolicy(config.PARSHA_CACHE_EVICTION_POLICY),
+            max_views=config.PARSHA_CACHE_MAX_VIEWS,
+        )
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.texts_by_id)} texts, {len(self.comments_by_id)} comments)"
+
+    @classmethod
+    def from_config(cls) -> "InMemoryDatabase":
+        db = InMemoryDatabase()
+        parsha_data_dir = Path(config.MEMORY_DB_PARSHA_DATA_DIR)
+        if parsha_data_dir.exists():
+            for path in sorted(parsha_data_dir.iterdir()):
+                if path.stem.isdigit() and path.suffix == ".json":
+                    logger.info(f"Loading parsha data from {path}")
+                    db._save_parsha_data(json.loads(path.read_text()), replace=True)
+        return db
+
+    async def create_indices(self) -> None:
+        pass  # indices are maintained on every write
+
+    # users
+
+    async def lookup_user(self, username: str) -> Optional[StoredUser]:
+        user_id = self.user_ids_by_username.get(username)
+        return self.users_by_id[user_id] if user_id is not None else None
+
+    async def save_user(self, user: StoredUser) -> StoredUser:
+        stored_user = with_new_db_id(user)
+        self.users_by_id[stored_user.db_id] = stored_user
+        self.user_ids_by_username[stored_user.username] = stored_user.db_id
+        return stored_user
+
+    # signup tokens
+
+    async def lookup_signup_token(self, token: str) -> Optional[SignupToken]:
+        return self.signup_tokens_by_token.get(token)
+
+    async def get_signup_token(self, creator_username: Optional[str]) -> Optional[SignupToken]:
+        return self.signup_tokens_by_creator.get(creator_username)
+
+    async def save_signup_token(self, signup_token: SignupToken) -> SignupToken:
+        stored_signup_token = with_new_db_id(signup_token)
+        self.signup_tokens_by_token[stored_signup_token.token] = stored_signup_token
+        self.signup_tokens_by_creator.setdefault(stored_signup_token.creator_username, stored_signup_token)
+        return stored_signup_token
+
+    # access tokens
+
+    async def save_access_token(self, access_token: str, user: StoredUser) -> None:
+        if not user.is_stored():
+            raise RuntimeError("user must be stored first to be assigned access token")
+        self.user_ids_by_access_token[access_token] = user.db_id
+
+    async def delete_access_token(self, access_token: str) -> None:
+        self.user_ids_by_access_token.pop(access_token, None)
+
+    async def authenticate_user(self, access_token: str) -> Optional[StoredUser]:
+        user_id = self.user_ids_by_access_token.get(access_token)
+        return self.users_by_id.get(user_id) if user_id is not None else None
+
+    # starred comments
+
+    async def save_starred_comment(self, starred_comment: StarredComment) -> None:
+        self.starred_comment_ids_by_username[starred_comment.starrer_username][starred_comment.comment_id] = None
+
+    async def delete_starred_comment(self, starred_comment: StarredComment) -> None:
+        self.starred_comment_ids_by_username[starred_comment.starrer_username].pop(starred_comment.comment_id, None)
+
+    def _starred_comments(self, starrer_username: str) -> list[StoredComment]:
+        """Starred comments that still exist, in the order of starring"""
+        return [
+            self.comments_by_id[comment_id]
+            for comment_id in self.starred_comment_ids_by_username.get(starrer_username, {})
+            if comment_id in self.comments_by_id
+        ]
+
+    async def lookup_starred_comments(self, starrer_username: str, parsha: int) -> list[StarredComment]:
+        return [
+            StarredComment(comment_id=comment.db_id, starrer_username=starrer_username, text_coords=comment.text_coords)
+            for comment in self._starred_comments(starrer_username)
+            if comment.text_coords.parsha == parsha
+        ]
+
+    async def count_starred_comments(self, starrer_username: str) -> int:
+        return len(self.starred_comment_ids_by_username.get(starrer_username, {}))
+
+    async def count_starred_comments_by_parsha(self, starrer_username: str) -> dict[int, int]:
+        return dict(collections.Counter(c.text_coords.parsha for c in self._starred_comments(starrer_username)))
+
+    async def load_random_starred_comment_data(self, starrer_username: str) -> Optional[StarredCommentData]:
+        starred_comments = self._starred_comments(starrer_username)
+        if not starred_comments:
+            logger.info(f"No random starred comments found for {starrer_username!r}")
+            return None
+        comment = random.choice(starred_comments).copy(update={"is_starred": True})
+        coords = CoordsTriplet.from_text_or_comment(comment)
+        parsha_data = self._lookup_single_verses_as_parsha_data(starrer_username, {coords}).get(coords)
+        return StarredCommentData(comment=comment, parsha_data=parsha_data)
+
+    async def lookup_starred_comments_data(
+        self,
+        starrer_username: str,
+        parsha_indices: list[int],
+        page: int,
+        page_size: int,
+        cursor: Optional[str] = None,
+    ) -> StarredCommentsPage:
+        def keyset_of(comment: StoredComment) -> Keyset:
+            return [*CoordsTriplet.from_text_or_comment(comment), comment.db_id]
+
+        comments = [
+            c.copy(update={"is_starred": True})
+            for c in self._starred_comments(starrer_username)
+            if not parsha_indices or c.text_coords.parsha in parsha_indices
+        ]
+        comments.sort(key=keyset_of)
+        if cursor is None:
+            start = page * page_size
+            comments = comments[start : start + page_size]  # noqa: E203
+        else:
+            keyset = decode_cursor(cursor).get(STARRED_COMMENTS_CURSOR_KEY)
+            if keyset is not None:
+                comments = [c for c in comments if keyset_of(c) > keyset]
+            comments = comments[:page_size]
+        single_verse_parsha_data_by_coords = self._lookup_single_verses_as_parsha_data(
+            username=starrer_username,
+            coord_triplets={CoordsTriplet.from_text_or_comment(c) for c in comments},
+        )
+        keysets: CursorKeysets = {
+            STARRED_COMMENTS_CURSOR_KEY: keyset_of(comments[-1]) if len(comments) == page_size else None
+        }
+        return StarredCommentsPage(
+            starred_comments=[
+                StarredCommentData(
+                    comment=comment,
+                    parsha_data=single_verse_parsha_data_by_coords.get(CoordsTriplet.from_text_or_comment(comment)),
+                )
+                for comment in comments
+            ],
+            next_cursor=next_cursor(keysets),
+        )
+
+    def _with_is_starred(self, username: Optional[str], comments: Iterable[StoredComment]) -> list[StoredComment]:
+        if username is None:
+            return list(comments)
+        starred_comment_ids = self.starred_comment_ids_by_username.get(username, {})
+        return [c.copy(update={"is_starred": c.db_id in starred_comment_ids}) for c in comments]
+
+    def _lookup_single_verses_as_parsha_data(
+        self,
+        username: Optional[str],
+        coord_triplets: set[CoordsTriplet],
+    ) -> dict[CoordsTriplet, ParshaData]:
+        result = dict[CoordsTriplet, ParshaData]()
+        for coords in coord_triplets:
+            texts = [self.texts_by_id[text_id] for text_id in self.text_ids_by_coords.get(coords, {})]
+            if not texts:
+                continue
+            comments = self._with_is_starred(
+                username,
+                (self.comments_by_id[comment_id] for comment_id in self.comment_ids_by_coords.get(coords, {})),
+            )
+            result[coords] = texts_and_comments_to_parsha_data(texts, comments)
+        return result
+
+    # parsha data
+
+    async def get_parsha_data(self, index: int) -> Optional[ParshaData]:
+        cached = self.parsha_data_cache.get(index)
+        if cached is not None:
+            return cached
+        texts = [self.texts_by_id[text_id] for text_id in self._parsha_text_ids(index)]
+        if not texts:
+            return None
+        comments = [self.comments_by_id[comment_id] for comment_id in self._parsha_comment_ids(index)]
+        parsha_data = texts_and_comments_to_parsha_data(texts, comments)
+        self.parsha_data_cache.put(index, parsha_data)
+        return parsha_data
+
+    async def warm_up_parsha_data(self, index: int, content_encodings: list[str]) -> None:
+        if await self.get_parsha_data(index) is not None:
+            await self.parsha_data_cache.warm_up_encoded(index, content_encodings)
+
+    async def get_parsha_data_indexed(self, index: int) -> Optional[IndexedParshaData]:
+        parsha_data = await self.get_parsha_data(index)
+        if parsha_data is None:
+            return None
+        return self.parsha_data_cache.get_indexed(index) or IndexedParshaData(parsha_data)
+
+    async def get_parsha_data_encoded(
+        self, index: int, content_encoding: Optional[str], view: ParshaDataView = WHOLE_PARSHA
+    ) -> Optional[EncodedParshaData]:
+        parsha_data = await self.get_parsha_data(index)
+        if parsha_data is None:
+            return None
+        encoded = self.parsha_data_cache.get_encoded(index, content_encoding, view)
+        if encoded is None:  # parsha data is too large to be cached or there are no verses in the view
+            view_data = view.apply(parsha_data)
+            if view_data is None:
+                return None
+            identity_body = serialization.dumps(view_data)
+            encoded = encoded_parsha_data(
+                body=serialization.compress(identity_body, content_encoding),
+                content_encoding=content_encoding,
+                identity_body_hash=content_hash(identity_body),
+            )
+        return encoded
+
+    def _parsha_text_ids(self, parsha: int) -> list[bson.ObjectId]:
+        return list(self.text_ids_by_parsha.get(parsha, {}))
+
+    def _parsha_comment_ids(self, parsha: int) -> list[bson.ObjectId]:
+        return list(self.comment_ids_by_parsha.get(parsha, {}))
+
+    async def save_parsha_data(self, parsha_data: ParshaData, replace: bool) -> None:
+        self._save_parsha_data(parsha_data, replace)
+
+    def _save_parsha_data(self, parsha_data: ParshaData, replace: bool) -> None:
+        if replace:
+            for text_id in self._parsha_text_ids(parsha_data["parsha"]):
+                self._delete_text(text_id)
+            for comment_id in self._parsha_comment_ids(parsha_data["parsha"]):
+                self._delete_comment(comment_id)
+        texts, comments = parsha_data_to_texts_and_comments(parsha_data)
+        logger.info(f"Extracted {len(texts)} texts and {len(comments)} comments")
+        duplicate_comment_ids = [c.db_id for c in comments if c.is_stored() and c.db_id in self.comments_by_id]
+        if duplicate_comment_ids:
+            raise ValueError(f"Comments with ids {duplicate_comment_ids} already exist")
+        for text in texts:
+            self._insert_text(with_new_db_id(text))
+        for comment in comments:
+            self._insert_comment(comment if comment.is_stored() else with_new_db_id(comment))
+        self.parsha_data_cache.invalidate(parsha_data["parsha"])
+
+    def _insert_text(self, text: StoredText) -> None:
+        self.texts_by_id[text.db_id] = text
+        self.text_ids_by_coords[CoordsTriplet.from_text_or_comment(text)][text.db_id] = None
+        self.text_ids_by_parsha[text.text_coords.parsha][text.db_id] = None
+        self.search_engine.add_text(text)
+
+    def _delete_text(self, text_id: bson.ObjectId) -> None:
+        text = self.texts_by_id.pop(text_id)
+        self.text_ids_by_coords[CoordsTriplet.from_text_or_comment(text)].pop(text_id)
+        self.text_ids_by_parsha[text.text_coords.parsha].pop(text_id)
+        self.search_engine.remove("texts", text_id)
+
+    def _insert_comment(self, comment: StoredComment) -> None:
+        self.comments_by_id[comment.db_id] = comment
+        self.comment_ids_by_coords[CoordsTriplet.from_text_or_comment(comment)][comment.db_id] = None
+        self.comment_ids_by_parsha[comment.text_coords.parsha][comment.db_id] = None
+        self.search_engine.add_comment(comment)
+
+    def _delete_comment(self, comment_id: bson.ObjectId) -> None:
+        comment = self.comments_by_id.pop(comment_id)
+        self.comment_ids_by_coords[CoordsTriplet.from_text_or_comment(comment)].pop(comment_id)
+        self.comment_ids_by_parsha[comment.text_coords.parsha].pop(comment_id)
+        self.search_engine.remove("comments", comment_id)
+
+    async def get_available_parsha_indices(self) -> list[int]:
+        return sorted(parsha for parsha, text_ids in self.text_ids_by_parsha.items() if text_ids)
+
+    async def get_cached_parsha_indices(self) -> list[int]:
+        return self.parsha_data_cache.indices()
+
+    async def get_parsha_cache_stats(self) -> CacheStats:
+        return self.parsha_data_cache.stats()
+
+    async def drop_parsha_cache(self) -> None:
+        self.parsha_data_cache.clear()
+
+    async def edit_comment(self, comment_id: bson.ObjectId, edited_comment: EditedComment) -> None:
+        comment = self.comments_by_id.get(comment_id)
+        if comment is None:
+            raise web.HTTPNotFound(reason="Comment not found")
+        comment = comment.copy(update=edited_comment.dict())
+        self.comments_by_id[comment_id] = comment
+        self.search_engine.add_comment(comment)
+        self.parsha_data_cache.invalidate(comment.text_coords.parsha)
+
+    async def edit_text(self, text_id: bson.ObjectId, text: str) -> None:
+        stored_text = self.texts_by_id.get(text_id)
+        if stored_text is None:
+            raise web.HTTPNotFound(reason="Text not found")
+        stored_text = stored_text.copy(update={"text": text})
+        self.texts_by_id[text_id] = stored_text
+        self.search_engine.add_text(stored_text)
+        self.parsha_data_cache.invalidate(stored_text.text_coords.parsha)
+
+    # full text search
+
+    async def search_text(
+        self,
+        query: str,
+        language: str,
+        page: int,
+        page_size: int,
+        sorting: SearchTextSorting,
+        search_in: list[SearchTextIn],
+        with_verse_parsha_data: bool,
+        username: Optional[str],
+        cursor: Optional[str] = None,
+    ) -> SearchTextResult:
+        logger.info(
+            f"Searching texts with {query = } {page = } {page_size = } {sorting = } "
+            + f"{search_in = } {with_verse_parsha_data = } {cursor = }"
+        )
+
+        keysets = decode_cursor(cursor) if cursor is not None else None
+        next_keysets: CursorKeysets = dict()
+
+        def search_page(
+            name: IndexName, docs_by_id: dict[bson.ObjectId, TextOrCommentT]
+        ) -> tuple[list[TextOrCommentT], int]:
+            hits = self.search_engine.search(name, query, language)
+            capped_total = min(len(hits), config.SEARCH_COUNT_CAP) if config.SEARCH_COUNT_CAP > 0 else len(hits)
+            if keysets is None:
+                page_hits, next_keysets[name] = paginate_search_hits(hits, sorting, page_size, skip=page * page_size)
+            elif name in keysets and keysets[name] is None:
+                page_hits, next_keysets[name] = [], None
+            else:
+                page_hits, next_keysets[name] = paginate_search_hits(
+                    hits, sorting, page_size, start_after=keysets.get(name)
+                )
+            return [docs_by_id[hit.doc_id] for hit in page_hits], capped_total
+
+        texts: list[StoredText] = []
+        text_matches: Optional[int] = None
+        if SearchTextIn.TEXTS in search_in:
+            texts, text_matches = search_page(TEXTS_CURSOR_KEY, self.texts_by_id)
+
+        comments: list[StoredComment] = []
+        comment_matches: Optional[int] = None
+        if SearchTextIn.COMMENTS in search_in:
+            comments, comment_matches = search_page(COMMENTS_CURSOR_KEY, self.comments_by_id)
+            comments = self._with_is_starred(username, comments)
+
+        texts_and_comments: list[TextOrComment] = [*texts, *comments]
+        logger.info(f"Got {len(texts)} texts and {len(comments)} comments")
+
+        if len(search_in) > 1:  # e.g. we concatenate results of several queries and need to reorder them
+            if sorting is SearchTextSorting.START_TO_END:
+                texts_and_comments.sort(key=CoordsTriplet.from_text_or_comment)
+            elif sorting is SearchTextSorting.END_TO_START:
+                texts_and_comments.sort(key=CoordsTriplet.from_text_or_comment, reverse=True)
+            elif sorting is SearchTextSorting.BEST_TO_WORST:
+                random.seed(f"{query}-{page}-{page_size}-{cursor}")  # ensuring query repeatability
+                random.shuffle(texts_and_comments)
+
+        if with_verse_parsha_data:
+            verse_parsha_data_by_coords = self._lookup_single_verses_as_parsha_data(
+                username=username,
+                coord_triplets={CoordsTriplet.from_text_or_comment(toc) for toc in texts_and_comments},
+            )
+        else:
+            verse_parsha_data_by_coords = dict()
+
+        found_matches = list[FoundMatch]()
+        for toc in texts_and_comments:
+            parsha_data = verse_parsha_data_by_coords.get(CoordsTriplet.from_text_or_comment(toc))
+            if isinstance(toc, StoredText):
+                found_matches.append(FoundMatch(text=toc, parsha_data=parsha_data))
+            else:
+                found_matches.append(FoundMatch(comment=toc, parsha_data=parsha_data))
+
+        return SearchTextResult(
+            found_matches=found_matches,
+            total_matched_comments=comment_matches,
+            total_matched_texts=text_matches,
+            are_totals_capped=are_search_totals_capped(text_matches, comment_matches),
+            next_cursor=next_cursor(next_keysets),
+        )
+
+    # iterating over texts and comments
+
+    def _match_entities(
+        self, request: TextOrCommentIterRequest, entities_by_id: dict[bson.ObjectId, TextOrCommentT]
+    ) -> list[TextOrCommentT]:
+        position = request.position
+        matched = [
+            entity
+            for entity in entities_by_id.values()
+            if (position.parsha is None or entity.text_coords.parsha == position.parsha)
+            and (position.chapter is None or entity.text_coords.chapter == position.chapter)
+            and (position.verse is None or entity.text_coords.verse == position.verse)
+            and (request.source is None or _source(entity) == request.source)
+        ]
+        matched.sort(key=lambda entity: entity.db_id)
+        return matched
+
+    async def count_texts(self, request: TextOrCommentIterRequest) -> int:
+        return len(self._match_entities(request, self.texts_by_id))
+
+    async def count_comments(self, request: TextOrCommentIterRequest) -> int:
+        return len(self._match_entities(request, self.comments_by_id))
+
+    async def iter_texts(self, request: TextOrCommentIterRequest) -> Optional[StoredText]:
+        matched = self._match_entities(request, self.texts_by_id)
+        return matched[request.offset] if 0 <= request.offset < len(matched) else None
+
+    async def iter_comments(self, request: TextOrCommentIterRequest) -> Optional[StoredComment]:
+        matched = self._match_entities(request, self.comments_by_id)
+        return matched[request.offset] if 0 <= request.offset < len(matched) else None
+
+    # user comments
+
+    async def save_user_comment(self, comment: StoredUserComment) -> StoredUserComment:
+        logger.info(f"Saving user comment {comment}")
+        stored_comment = with_new_db_id(comment)
+        self.user_comments_by_id[stored_comment.db_id] = stored_comment
+        self.user_comment_ids_by_username_and_parsha[
+            (stored_comment.author_username, stored_comment.text_coords.parsha)
+        ][stored_comment.db_id] = None
+        return stored_comment
+
+    async def delete_user_comment(self, comment_id: bson.ObjectId, author_username: str) -> bool:
+        comment = self.user_comments_by_id.get(comment_id)
+        if comment is None or comment.author_username != author_username:
+            return False
+        self.user_comments_by_id.pop(comment_id)
+        self.user_comment_ids_by_username_and_parsha[(author_username, comment.text_coords.parsha)].pop(comment_id)
+        return True
+
+    async def lookup_user_comments(self, username: str, parsha: int) -> list[DisplayedUserComment]:
+        author = await self.lookup_user(username)
+        if author is None:
+            return []
+        user_comments = [
+            self.user_comments_by_id[comment_id]
+            for comment_id in self.user_comment_ids_by_username_and_parsha.get((username, parsha), {})
+        ]
+        user_comments.sort(key=lambda uc: uc.timestamp)
+        return [DisplayedUserComment(**uc.dict(), author_user_data=author.data) for uc in user_comments]
+
+    # all user data for a parsha at once
+
+    async def lookup_user_parsha_data(
+        self, username: str, parsha: int, with_starred_comments: bool, with_user_comments: bool
+    ) -> UserParshaData:
+        return UserParshaData(
+            starred_comment_ids=(
+                {str(sc.comment_id) for sc in await self.lookup_starred_comments(username, parsha)}
+                if with_starred_comments
+                else set()
+            ),
+            user_comments=await self.lookup_user_comments(username, parsha) if with_user_comments else [],
+        )
+
+
+def _source(toc: TextOrComment) -> str:
+    return toc.text_source if isinstance(toc, StoredText) else toc.comment_source
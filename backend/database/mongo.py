@@ -1,28 +1,68 @@
 import asyncio
 import collections
-import copy
+import datetime
 import itertools
 import json
 import logging
 import random
+import time
 from concurrent.futures import ThreadPoolExecutor
-from typing import Any, Callable, Literal, NamedTuple, Optional, TypeVar, Union
+from pathlib import Path
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Literal,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    TypeAlias,
+    TypeVar,
+    Union,
+)
 
 import bson
 import pymongo
 from async_lru import alru_cache  # type: ignore
 from bson.codec_options import CodecOptions
-from pymongo import MongoClient
-
-from backend import config
+from pymongo import AsyncMongoClient, MongoClient, UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.collection import Collection
+from pymongo.results import DeleteResult, InsertOneResult, UpdateResult
+
+from backend import config, serialization
+from backend.database.cache import (
+    CacheStats,
+    EncodedParshaData,
+    EvictionPolicy,
+    ParshaDataCache,
+    TTLCache,
+    TTLCacheStats,
+    content_hash,
+    encoded_parsha_data,
+)
 from backend.database.interface import (
     DatabaseInterface,
     SearchTextIn,
     SearchTextSorting,
+    StarredCommentsPage,
+    UserParshaData,
+)
+from backend.database.pagination import (
+    CursorKeysets,
+    Keyset,
+    decode_cursor,
+    next_cursor,
+    paginate_search_hits,
+)
+from backend.metadata import (
+    ALL_METADATA,
+    get_book_by_parsha,
+    get_comment_source_language,
+    get_text_source_language,
 )
-from backend.metadata import get_comment_source_language, get_text_source_language
-from backend.metadata.neviim import NEVIIM_METADATA
-from backend.metadata.torah import TORAH_METADATA
+from backend.metadata.types import IsoLang
 from backend.model import (
     UNSET_DB_ID,
     ChapterData,
@@ -44,13 +84,25 @@ from backend.model import (
     TextOrCommentIterRequest,
     VerseData,
 )
+from backend.overlay import (
+    WHOLE_PARSHA,
+    IndexedParshaData,
+    ParshaDataView,
+    overlay_user_data,
+    slice_parsha_data,
+)
+from backend.search.analysis import normalize_hebrew
+from backend.search.engine import IndexName, SearchEngine
 
 logger = logging.getLogger(__name__)
 
 
 T = TypeVar("T")
 
-MongoAggregationPipeline = list[dict[str, Any]]
+MongoDocument = dict[str, Any]
+# string alias because mypy can't handle parametrized pymongo collection type in an expression
+MongoCollection: TypeAlias = "Collection[MongoDocument]"
+MongoAggregationPipeline = list[MongoDocument]
 
 
 class CoordsTriplet(NamedTuple):
@@ -65,8 +117,61 @@ class CoordsTriplet(NamedTuple):
         return CoordsTriplet(toc.text_coords.parsha, toc.text_coords.chapter, toc.text_coords.verse)
 
 
+# (field path, direction) pairs, the last one is always _id to make the order total
+SortFields = list[tuple[str, int]]
+
+COORDS_FIELDS = ["text_coords.parsha", "text_coords.chapter", "text_coords.verse"]
+
+
+def search_sort_fields(sorting: SearchTextSorting) -> SortFields:
+    if sorting is SearchTextSorting.BEST_TO_WORST:
+        return [("score", pymongo.DESCENDING), ("_id", pymongo.ASCENDING)]
+    order = pymongo.ASCENDING if sorting is SearchTextSorting.START_TO_END else pymongo.DESCENDING
+    return [(field, order) for field in [*COORDS_FIELDS, "_id"]]
+
+
+def keyset_filter(sort_fields: SortFields, keyset: Keyset) -> MongoDocument:
+    """Match documents strictly after the keyset in the sort order, instead of skipping all previous documents.
+    Only starred comments have a matching index, (starrer_username, text_coords..., comment_id), so their pages
+    are index range scans; search results are sorted by score or coords after the $text match, and the filter
+    only saves the skip there"""
+    alternatives: list[MongoDocument] = []
+    for idx, (field, order) in enumerate(sort_fields):
+        alternative: MongoDocument = {prev_field: value for (prev_field, _), value in zip(sort_fields[:idx], keyset)}
+        alternative[field] = {"$gt" if order == pymongo.ASCENDING else "$lt": keyset[idx]}
+        alternatives.append(alternative)
+    return {"$or": alternatives}
+
+
+def get_keyset(doc: MongoDocument, sort_fields: SortFields) -> Keyset:
+    keyset: Keyset = []
+    for field, _ in sort_fields:
+        value: Any = doc
+        for key in field.split("."):
+            value = value[key]
+        keyset.append(value)
+    return keyset
+
+
+def normalize_search_query(query: str) -> str:
+    """Text search is case-insensitive and ignores extra whitespace, so are the search count cache keys"""
+    return " ".join(query.lower().split())
+
+
+def are_search_totals_capped(*totals: Optional[int]) -> bool:
+    return config.SEARCH_COUNT_CAP > 0 and any(t is not None and t >= config.SEARCH_COUNT_CAP for t in totals)
+
+
+TEXT_INDEX_NAME = "search_text"
+
+STARRED_COMMENTS_SORT_FIELDS: SortFields = [(field, pymongo.ASCENDING) for field in [*COORDS_FIELDS, "comment_id"]]
+
+
 class MongoDatabase(DatabaseInterface):
-    def __init__(self, mongo_client: MongoClient[dict], db_name: str):
+    """Mongo-backed database; all queries go through a set of I/O primitives (_find, _aggregate, etc), that are run
+    on a thread pool around synchronous pymongo here, and natively in asyncio by AsyncMongoDatabase"""
+
+    def __init__(self, mongo_client: MongoClient[MongoDocument], db_name: str):
         self.client = mongo_client
         self.db = self.client[db_name]
 
@@ -74,6 +179,8 @@ class MongoDatabase(DatabaseInterface):
         self.signup_tokens_coll = self.db["signup-tokens"]
         self.access_tokens_coll = self.db["access-tokens"]
         self.starred_comments_coll = self.db["starred-comments"]
+        # per-user starred comment counts by parsha, maintained on star/unstar
+        self.starred_comments_summaries_coll = self.db["starred-comments-summaries"]
 
         # legacy parsha data
         self.parsha_data_coll = self.db["parsha-data"]
@@ -83,15 +190,50 @@ class MongoDatabase(DatabaseInterface):
 
         self.user_comments_coll = self.db["user-comments"]
 
-        self.parsha_data_cache: dict[int, ParshaData] = dict()
-        self.threads = ThreadPoolExecutor(max_workers=8)
+        self.migrations_coll = self.db["migrations"]
+
+        self.parsha_data_cache = ParshaDataCache(
+            max_size_bytes=config.PARSHA_CACHE_MAX_BYTES,
+            policy=EvictionPolicy(config.PARSHA_CACHE_EVICTION_POLICY),
+            max_views=config.PARSHA_CACHE_MAX_VIEWS,
+        )
+        self.auth_cache = TTLCache[str, StoredUser](
+            ttl=config.AUTH_CACHE_TTL_SEC,
+            max_entries=config.AUTH_CACHE_MAX_ENTRIES,
+        )
+        # username -> starred comment shown on the starred comments page, re-picked after TTL
+        self.random_starred_comment_cache = TTLCache[str, StarredCommentData](
+            ttl=config.RANDOM_STARRED_COMMENT_TTL_SEC,
+            max_entries=config.RANDOM_STARRED_COMMENT_CACHE_MAX_ENTRIES,
+        )
+        # in-process search engine used instead of Mongo $text indices, once loaded or built in the background
+        self.search_engine: Optional[SearchEngine] = None
+        self._search_engine_save_lock = asyncio.Lock()
+        # delayed save of the updated engine, updates made before it fires are saved together
+        self._search_engine_save_timer: Optional[asyncio.TimerHandle] = None
+        self._search_engine_tasks = set[asyncio.Task]()
+        # updates made while the engine is being loaded or built, replayed on it before it is used
+        self._pending_search_engine_updates: Optional[list[Callable[[SearchEngine], None]]] = None
+        # (collection name, language, normalized query) -> total number of matches
+        self.search_count_cache = TTLCache[tuple[str, str, str], int](
+            ttl=config.SEARCH_COUNT_CACHE_TTL_SEC,
+            max_entries=config.SEARCH_COUNT_CACHE_MAX_ENTRIES,
+        )
+        self.threads = ThreadPoolExecutor(max_workers=config.MONGO_THREADS)
 
     def __str__(self) -> str:
         return f"{self.__class__.__name__}({self.client})"
 
     @classmethod
     def from_config(cls) -> "MongoDatabase":
-        return MongoDatabase(mongo_client=MongoClient(config.MONGO_URL), db_name=config.MONGO_DB)
+        return MongoDatabase(
+            mongo_client=MongoClient(
+                config.MONGO_URL,
+                maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+                minPoolSize=config.MONGO_MIN_POOL_SIZE,
+            ),
+            db_name=config.MONGO_DB,
+        )
 
     async def _awrap(self, func: Callable[..., T], *args, **kwargs) -> T:
         def wrapped_func():
@@ -99,37 +241,116 @@ class MongoDatabase(DatabaseInterface):
 
         return await asyncio.get_running_loop().run_in_executor(self.threads, wrapped_func)
 
+    # I/O primitives
+
+    async def _find(self, coll: MongoCollection, filter: MongoDocument) -> list[MongoDocument]:
+        return await self._awrap(lambda: list(coll.find(filter)))
+
+    async def _find_one(self, coll: MongoCollection, filter: MongoDocument) -> Optional[MongoDocument]:
+        return await self._awrap(coll.find_one, filter)
+
+    async def _aggregate(self, coll: MongoCollection, pipeline: MongoAggregationPipeline) -> list[MongoDocument]:
+        return await self._awrap(lambda: list(coll.aggregate(pipeline)))
+
+    async def _count_documents(self, coll: MongoCollection, filter: MongoDocument) -> int:
+        return await self._awrap(coll.count_documents, filter)
+
+    async def _distinct(self, coll: MongoCollection, key: str, filter: Optional[MongoDocument] = None) -> list[Any]:
+        return await self._awrap(coll.distinct, key, filter)
+
+    async def _insert_one(self, coll: MongoCollection, doc: MongoDocument) -> InsertOneResult:
+        return await self._awrap(coll.insert_one, doc)
+
+    async def _insert_many(self, coll: MongoCollection, docs: list[MongoDocument]) -> None:
+        await self._awrap(coll.insert_many, docs)
+
+    async def _update_one(
+        self, coll: MongoCollection, filter: MongoDocument, update: MongoDocument, upsert: bool = False
+    ) -> UpdateResult:
+        return await self._awrap(coll.update_one, filter, update, upsert=upsert)
+
+    async def _update_many(self, coll: MongoCollection, filter: MongoDocument, update: MongoDocument) -> None:
+        await self._awrap(coll.update_many, filter, update)
+
+    async def _find_one_and_update(
+        self, coll: MongoCollection, filter: MongoDocument, update: Union[MongoDocument, MongoAggregationPipeline]
+    ) -> Optional[MongoDocument]:
+        return await self._awrap(coll.find_one_and_update, filter, update)
+
+    async def _find_one_and_delete(self, coll: MongoCollection, filter: MongoDocument) -> Optional[MongoDocument]:
+        return await self._awrap(coll.find_one_and_delete, filter)
+
+    async def _delete_one(self, coll: MongoCollection, filter: MongoDocument) -> DeleteResult:
+        return await self._awrap(coll.delete_one, filter)
+
+    async def _delete_many(self, coll: MongoCollection, filter: MongoDocument) -> None:
+        await self._awrap(coll.delete_many, filter)
+
+    async def _create_index(self, coll: MongoCollection, keys: list[tuple[str, Any]], **kwargs: Any) -> None:
+        await self._awrap(coll.create_index, keys, **kwargs)
+
+    async def _index_information(self, coll: MongoCollection) -> MutableMapping[str, Any]:
+        return await self._awrap(coll.index_information)
+
+    async def _drop_index(self, coll: MongoCollection, name: str) -> None:
+        await self._awrap(coll.drop_index, name)
+
+    async def _bulk_write(self, coll: MongoCollection, requests: list[UpdateOne]) -> None:
+        await self._awrap(coll.bulk_write, requests)
+
     async def create_indices(self) -> None:
         logger.info("Creating indices in Mongo")
-        await self._awrap(self.users_coll.create_index, [("username", pymongo.HASHED)])
+        await self._create_index(self.users_coll, [("username", pymongo.HASHED)])
 
-        await self._awrap(self.signup_tokens_coll.create_index, [("token", pymongo.HASHED)])
-        await self._awrap(self.signup_tokens_coll.create_index, [("creator_username", pymongo.HASHED)])
+        await self._create_index(self.signup_tokens_coll, [("token", pymongo.HASHED)])
+        await self._create_index(self.signup_tokens_coll, [("creator_username", pymongo.HASHED)])
 
-        await self._awrap(self.starred_comments_coll.create_index, [("starrer_username", pymongo.HASHED)])
+        await self._create_index(self.starred_comments_coll, [("starrer_username", pymongo.HASHED)])
+        await self._create_index(
+            self.starred_comments_coll,
+            [
+                ("starrer_username", pymongo.ASCENDING),
+                ("text_coords.parsha", pymongo.ASCENDING),
+                ("text_coords.chapter", pymongo.ASCENDING),
+                ("text_coords.verse", pymongo.ASCENDING),
+                ("comment_id", pymongo.ASCENDING),
+            ],
+        )
+        await self._create_index(
+            self.starred_comments_coll, [("starrer_username", pymongo.ASCENDING), ("comment_id", pymongo.ASCENDING)]
+        )
+        await self._run_migration("denormalize-starred-comments-coords", self._denormalize_starred_comments_coords)
+        await self._run_migration("summarize-starred-comments", self._summarize_starred_comments)
+        await self._run_migration("delete-stars-of-deleted-comments", self._delete_stars_of_deleted_comments)
 
-        await self._awrap(self.access_tokens_coll.create_index, [("token", pymongo.HASHED)])
+        await self._create_index(self.access_tokens_coll, [("token", pymongo.HASHED)])
 
         text_coords_index = [
             ("text_coords.parsha", pymongo.ASCENDING),
             ("text_coords.chapter", pymongo.ASCENDING),
             ("text_coords.verse", pymongo.ASCENDING),
         ]
-        await self._awrap(
-            self.texts_coll.create_index,
-            text_coords_index + [("text_source", pymongo.HASHED)],
-        )
-        await self._awrap(
-            self.comments_coll.create_index,
-            text_coords_index + [("comment_source", pymongo.HASHED)],
-        )
-        await self._awrap(
-            self.user_comments_coll.create_index,
-            text_coords_index + [("author_username", pymongo.HASHED)],
-        )
+        await self._create_index(self.texts_coll, text_coords_index + [("text_source", pymongo.HASHED)])
+        await self._create_index(self.comments_coll, text_coords_index + [("comment_source", pymongo.HASHED)])
+        await self._create_index(self.user_comments_coll, text_coords_index + [("author_username", pymongo.HASHED)])
         logger.info("Indices created")
 
         self._background_task = asyncio.create_task(self.create_text_indices())
+        if config.SEARCH_ENGINE == "inverted-index":
+            self._pending_search_engine_updates = []
+            self._run_search_engine_task(self._load_search_engine())
+
+    async def _run_migration(self, name: str, migration: Callable[[], Awaitable[None]]) -> None:
+        """Run a data migration unless it has already been applied, according to the migrations collection"""
+        if await self._find_one(self.migrations_coll, {"name": name}) is not None:
+            return
+        logger.info(f"Running migration {name!r}")
+        start = time.monotonic()
+        await migration()
+        await self._insert_one(
+            self.migrations_coll, {"name": name, "applied_at": datetime.datetime.now(datetime.timezone.utc)}
+        )
+        logger.info(f"Migration {name!r} applied in {time.monotonic() - start:.2f} sec")
 
     async def _rebuild_text_and_comments_collections(self):
         """One-time code, useful during test and debugging"""
@@ -167,29 +388,134 @@ class MongoDatabase(DatabaseInterface):
     async def create_text_indices(self) -> None:
         logger.info("Creating text indices in the background")
 
-        def blocking() -> None:
-            logger.info("Changing unsupported languages to none")
-            self.texts_coll.update_many(
-                filter={"language": {"$not": {"$in": ["ru", "en"]}}},
-                update={"$set": {"language": "none"}},
+        logger.info("Changing unsupported languages to none")
+        await self._update_many(
+            self.texts_coll,
+            filter={"language": {"$not": {"$in": ["ru", "en"]}}},
+            update={"$set": {"language": "none"}},
+        )
+        await self._update_many(
+            self.comments_coll,
+            filter={"language": {"$not": {"$in": ["ru", "en"]}}},
+            update={"$set": {"language": "none"}},
+        )
+
+        await self._run_migration("normalize-hebrew-texts-and-comments", self._normalize_hebrew_texts_and_comments)
+
+        logger.info("Creating text index for texts collection")
+        await self._create_text_index(self.texts_coll, ["text", "normalized_text"])
+        logger.info("Creating text index for comments collection")
+        await self._create_text_index(self.comments_coll, ["anchor_phrase", "comment", "normalized_comment"])
+        logger.info("Text indices done")
+
+    async def _create_text_index(self, coll: MongoCollection, fields: list[str]) -> None:
+        """A collection can have only one text index, so the existing one is replaced if it covers other fields"""
+        keys = [(field, pymongo.TEXT) for field in fields]
+        for name, info in (await self._index_information(coll)).items():
+            if name != TEXT_INDEX_NAME and any(direction == pymongo.TEXT for _, direction in info["key"]):
+                logger.info(f"Dropping outdated text index {name!r} on {coll.name}")
+                await self._drop_index(coll, name)
+        await self._create_index(coll, keys, name=TEXT_INDEX_NAME)
+
+    async def _normalize_hebrew_texts_and_comments(self) -> None:
+        """Fill normalized shadow fields of Hebrew texts and comments stored before they were introduced"""
+        text_updates = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"normalized_text": normalize_hebrew(doc["text"])}})
+            for doc in await self._find(self.texts_coll, {"text_source": {"$in": hebrew_text_sources()}})
+        ]
+        if text_updates:
+            await self._bulk_write(self.texts_coll, text_updates)
+
+        comment_updates = [
+            UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"normalized_comment": normalized_comment(doc.get("anchor_phrase"), doc["comment"])}},
             )
-            self.comments_coll.update_many(
-                filter={"language": {"$not": {"$in": ["ru", "en"]}}},
-                update={"$set": {"language": "none"}},
+            for doc in await self._find(self.comments_coll, {"comment_source": {"$in": hebrew_comment_sources()}})
+        ]
+        if comment_updates:
+            await self._bulk_write(self.comments_coll, comment_updates)
+        logger.info(f"Normalized {len(text_updates)} Hebrew texts and {len(comment_updates)} Hebrew comments")
+
+    # search engine
+
+    def _run_search_engine_task(self, coro: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._search_engine_tasks.add(task)  # keeping a reference until the task is done
+        task.add_done_callback(self._search_engine_tasks.discard)
+
+    async def _load_search_engine(self) -> None:
+        """Load the persisted search index or build it from the texts and comments collections; until then,
+        search falls back to Mongo $text indices and updates are queued"""
+        try:
+            search_engine, is_built = await self._load_or_build_search_engine()
+        except Exception:
+            logger.exception("Failed to load or build search engine, falling back to Mongo $text indices")
+            self._pending_search_engine_updates = None
+            return
+        # writes made during the build may or may not have been read by it, replaying them in order makes
+        # the engine consistent with the latest state either way; no awaits here, so nothing is missed
+        pending_updates = self._pending_search_engine_updates or []
+        self._pending_search_engine_updates = None
+        for update in pending_updates:
+            update(search_engine)
+        self.search_engine = search_engine
+        if is_built or pending_updates:
+            await self._save_search_engine()
+
+    async def _load_or_build_search_engine(self) -> tuple[SearchEngine, bool]:
+        """Search engine and whether it was built rather than loaded"""
+        directory = Path(config.SEARCH_INDEX_DIR)
+        try:
+            return await asyncio.to_thread(SearchEngine.load, directory), False
+        except (FileNotFoundError, ValueError):
+            logger.info(f"No usable search index found in {directory}, building it", exc_info=True)
+        texts = [StoredText.from_trusted_mongo_db(doc) for doc in await self._find(self.texts_coll, {})]
+        comments = [StoredComment.from_trusted_mongo_db(doc) for doc in await self._find(self.comments_coll, {})]
+        return await asyncio.to_thread(SearchEngine.build, texts, comments), True
+
+    def _update_search_engine(self, update: Callable[[SearchEngine], None]) -> None:
+        """Apply the update to the search engine and save it in the background, or queue the update
+        if the engine is still being loaded"""
+        if self.search_engine is not None:
+            update(self.search_engine)
+            self._schedule_search_engine_save()
+        elif self._pending_search_engine_updates is not None:
+            self._pending_search_engine_updates.append(update)
+
+    def _schedule_search_engine_save(self) -> None:
+        if self._search_engine_save_timer is None:
+            self._search_engine_save_timer = asyncio.get_running_loop().call_later(
+                config.SEARCH_INDEX_SAVE_DELAY_SEC, self._on_search_engine_save_timer
             )
 
-            logger.info("Creating text index for texts collection")
-            self.texts_coll.create_index([("text", pymongo.TEXT)])
-            logger.info("Creating text index for comments collection")
-            self.comments_coll.create_index([("anchor_phrase", pymongo.TEXT), ("comment", pymongo.TEXT)])
-            logger.info("Text indices done")
-
-        await self._awrap(blocking)
+    def _on_search_engine_save_timer(self) -> None:
+        self._search_engine_save_timer = None
+        self._run_search_engine_task(self._save_search_engine())
+
+    async def _save_search_engine(self) -> None:
+        search_engine = self.search_engine
+        if search_engine is None:
+            return
+        directory = Path(config.SEARCH_INDEX_DIR)
+        async with self._search_engine_save_lock:
+            saved_modifications = await asyncio.to_thread(search_engine.save, directory)
+            compacted = await asyncio.to_thread(search_engine.load_compacted, directory, saved_modifications)
+            search_engine.replace_compacted(compacted, saved_modifications)
+
+    async def teardown(self) -> None:
+        if self._search_engine_save_timer is not None:
+            self._search_engine_save_timer.cancel()
+            self._search_engine_save_timer = None
+            await self._save_search_engine()
+        else:
+            async with self._search_engine_save_lock:  # waiting for the ongoing save, if any
+                pass
 
     # users
 
     async def lookup_user(self, username: str) -> Optional[StoredUser]:
-        doc = await self._awrap(self.users_coll.find_one, {"username": username})
+        doc = await self._find_one(self.users_coll, {"username": username})
         if doc is None:
             logger.info(f"No user found with {username = }")
             return None
@@ -199,24 +525,25 @@ class MongoDatabase(DatabaseInterface):
 
     async def save_user(self, user: StoredUser) -> StoredUser:
         logger.info(f"Creating user {user}")
-        res = await self._awrap(self.users_coll.insert_one, user.to_mongo_db())
+        res = await self._insert_one(self.users_coll, user.to_mongo_db())
+        self.auth_cache.invalidate_where(lambda cached_user: cached_user.username == user.username)
         return user.inserted_as(res)
 
     # signup tokens
 
     async def lookup_signup_token(self, token: str) -> Optional[SignupToken]:
-        doc = await self._awrap(self.signup_tokens_coll.find_one, {"token": token})
+        doc = await self._find_one(self.signup_tokens_coll, {"token": token})
         if doc is None:
             return None
         else:
             return SignupToken.from_mongo_db(doc)
 
     async def save_signup_token(self, signup_token: SignupToken) -> SignupToken:
-        res = await self._awrap(self.signup_tokens_coll.insert_one, signup_token.to_mongo_db())
+        res = await self._insert_one(self.signup_tokens_coll, signup_token.to_mongo_db())
         return signup_token.inserted_as(res)
 
     async def get_signup_token(self, creator_username: Optional[str]) -> Optional[SignupToken]:
-        res = await self._awrap(self.signup_tokens_coll.find_one, {"creator_username": creator_username})
+        res = await self._find_one(self.signup_tokens_coll, {"creator_username": creator_username})
         if res is None:
             return None
         else:
@@ -227,15 +554,22 @@ class MongoDatabase(DatabaseInterface):
     async def save_access_token(self, access_token: str, user: StoredUser) -> None:
         if not user.is_stored():
             raise RuntimeError("user must be stored first to be assigned access token")
-        await self._awrap(
-            self.access_tokens_coll.insert_one,
-            {"token": access_token, "user_id": user.db_id},
-        )
+        await self._insert_one(self.access_tokens_coll, {"token": access_token, "user_id": user.db_id})
 
     async def delete_access_token(self, access_token: str) -> None:
-        await self._awrap(self.access_tokens_coll.delete_one, {"token": access_token})
+        self.auth_cache.invalidate(access_token)
+        await self._delete_one(self.access_tokens_coll, {"token": access_token})
 
     async def authenticate_user(self, access_token: str) -> Optional[StoredUser]:
+        cached = self.auth_cache.get(access_token)
+        if cached is not None:
+            return cached
+        user = await self._authenticate_user(access_token)
+        if user is not None:
+            self.auth_cache.put(access_token, user)
+        return user
+
+    async def _authenticate_user(self, access_token: str) -> Optional[StoredUser]:
         pipeline = [
             {"$match": {"token": access_token}},
             {
@@ -247,7 +581,7 @@ class MongoDatabase(DatabaseInterface):
                 }
             },
         ]
-        results = list(await self._awrap(self.access_tokens_coll.aggregate, pipeline))
+        results = await self._aggregate(self.access_tokens_coll, pipeline)
         if not results:
             return None
         result = results[0]
@@ -260,369 +594,493 @@ class MongoDatabase(DatabaseInterface):
     # starred comments
 
     async def save_starred_comment(self, starred_comment: StarredComment) -> None:
-        def blocking(starred_comment: StarredComment):
-            self.starred_comments_coll.update_one(
-                filter=starred_comment.to_mongo_db(),
-                update={"$set": starred_comment.to_mongo_db()},
-                upsert=True,
+        comment_doc = await self._find_one(self.comments_coll, {"_id": starred_comment.comment_id})
+        if comment_doc is not None:
+            starred_comment = starred_comment.copy(
+                update={"text_coords": StoredComment.from_mongo_db(comment_doc).text_coords}
+            )
+        update_result = await self._update_one(
+            self.starred_comments_coll,
+            filter=self._starred_comment_filter(starred_comment),
+            update={"$set": starred_comment.to_mongo_db()},
+            upsert=True,
+        )
+        if update_result.upserted_id is not None and starred_comment.text_coords is not None:
+            await self._update_starred_comments_summary(
+                starred_comment.starrer_username, starred_comment.text_coords.parsha, 1
             )
-
-        await self._awrap(blocking, starred_comment)
 
     async def delete_starred_comment(self, starred_comment: StarredComment) -> None:
-        await self._awrap(
-            self.starred_comments_coll.delete_one,
-            starred_comment.to_mongo_db(),
+        deleted_doc = await self._find_one_and_delete(
+            self.starred_comments_coll, self._starred_comment_filter(starred_comment)
+        )
+        self.random_starred_comment_cache.invalidate(starred_comment.starrer_username)
+        if deleted_doc is None:
+            return
+        deleted = StarredComment.from_mongo_db(deleted_doc)
+        if deleted.text_coords is not None:
+            await self._update_starred_comments_summary(deleted.starrer_username, deleted.text_coords.parsha, -1)
+
+    async def _delete_starred_comments_of(self, comment_ids: list[bson.ObjectId]) -> list[str]:
+        """Delete stars of the deleted comments, that would otherwise be counted and paginated over by their
+        denormalized coords; returns usernames of the affected starrers"""
+        if not comment_ids:
+            return []
+        filter_ = {"comment_id": {"$in": comment_ids}}
+        usernames: list[str] = await self._distinct(self.starred_comments_coll, "starrer_username", filter_)
+        if not usernames:
+            return []
+        await self._delete_many(self.starred_comments_coll, filter_)
+        for username in usernames:
+            self.random_starred_comment_cache.invalidate(username)
+        logger.info(f"Deleted stars of {len(comment_ids)} deleted comment(s) for {len(usernames)} user(s)")
+        return usernames
+
+    async def _delete_stars_of_deleted_comments(self) -> None:
+        """Clean up stars left by parsha replacements before they were deleted along with the comments"""
+        docs = await self._aggregate(
+            self.starred_comments_coll,
+            [
+                {
+                    "$lookup": {
+                        "from": self.comments_coll.name,
+                        "localField": "comment_id",
+                        "foreignField": "_id",
+                        "as": "comment",
+                    }
+                },
+                {"$match": {"comment": []}},
+                {"$group": {"_id": "$comment_id"}},
+            ],
+        )
+        affected_usernames = await self._delete_starred_comments_of([doc["_id"] for doc in docs])
+        if affected_usernames:
+            await self._summarize_starred_comments(affected_usernames)
+
+    async def _update_starred_comments_summary(self, starrer_username: str, parsha: int, delta: int) -> None:
+        await self._update_one(
+            self.starred_comments_summaries_coll,
+            filter={"_id": starrer_username},
+            update={"$inc": {f"by_parsha.{parsha}": delta}},
+            upsert=True,
         )
 
-    async def lookup_starred_comments(self, starrer_username: str, parsha: int) -> list[StarredComment]:
-        def blocking():
-            cursor = self.starred_comments_coll.aggregate(
-                [
-                    {"$match": {"starrer_username": starrer_username}},
-                    {
-                        "$lookup": {
-                            "from": self.comments_coll.name,
-                            "localField": "comment_id",
-                            "foreignField": "_id",
-                            "as": "comments",
-                        }
-                    },
-                    #                     V  take the first element from joined list because it's and ID
-                    {"$match": {"comments.0.text_coords.parsha": parsha}},
-                    {"$project": {"comments": False}},
-                ]
-            )
-            return [StarredComment.from_mongo_db(doc) for doc in cursor]
+    async def _summarize_starred_comments(self, usernames: Optional[list[str]] = None) -> None:
+        """(Re)build per-user summaries from the starred comments, for all users (as a migration for stars saved
+        before summaries were maintained) or for the given ones, e.g. after their stars were deleted in bulk"""
+        logger.info(f"Summarizing starred comments for {'all' if usernames is None else len(usernames)} user(s)")
+        match: MongoDocument = {"text_coords.parsha": {"$type": "int"}}
+        if usernames is not None:
+            match["starrer_username"] = {"$in": usernames}
+        await self._aggregate(
+            self.starred_comments_coll,
+            [
+                {"$match": match},
+                {
+                    "$group": {
+                        "_id": {"username": "$starrer_username", "parsha": "$text_coords.parsha"},
+                        "count": {"$sum": 1},
+                    }
+                },
+                {
+                    "$group": {
+                        "_id": "$_id.username",
+                        "by_parsha": {"$push": {"k": {"$toString": "$_id.parsha"}, "v": "$count"}},
+                    }
+                },
+                {"$project": {"by_parsha": {"$arrayToObject": "$by_parsha"}}},
+                {
+                    "$merge": {
+                        "into": self.starred_comments_summaries_coll.name,
+                        "on": "_id",
+                        "whenMatched": "replace",
+                        "whenNotMatched": "insert",
+                    }
+                },
+            ],
+        )
+        if usernames is not None:
+            # users without stars left get no summary from the pipeline, so their stale ones are removed
+            usernames_with_stars = set(await self._distinct(self.starred_comments_coll, "starrer_username", match))
+            usernames_without_stars = [u for u in usernames if u not in usernames_with_stars]
+            if usernames_without_stars:
+                await self._delete_many(self.starred_comments_summaries_coll, {"_id": {"$in": usernames_without_stars}})
+        logger.info("Starred comments summarized")
+
+    def _starred_comment_filter(self, starred_comment: StarredComment) -> MongoDocument:
+        return {"comment_id": starred_comment.comment_id, "starrer_username": starred_comment.starrer_username}
+
+    async def _denormalize_starred_comments_coords(self) -> None:
+        """Copy text coords from comments to starred comments saved before they were denormalized"""
+        logger.info("Denormalizing text coords to starred comments")
+        await self._aggregate(
+            self.starred_comments_coll,
+            [
+                {"$match": {"text_coords": None}},  # matches both missing and null values
+                {
+                    "$lookup": {
+                        "from": self.comments_coll.name,
+                        "localField": "comment_id",
+                        "foreignField": "_id",
+                        "as": "comments",
+                    }
+                },
+                {"$match": {"comments": {"$ne": []}}},
+                {"$project": {"text_coords": {"$first": "$comments.text_coords"}}},
+                {
+                    "$merge": {
+                        "into": self.starred_comments_coll.name,
+                        "on": "_id",
+                        "whenMatched": "merge",
+                        "whenNotMatched": "discard",
+                    }
+                },
+            ],
+        )
+        logger.info("Starred comments text coords denormalized")
 
-        return await self._awrap(blocking)
+    async def lookup_starred_comments(self, starrer_username: str, parsha: int) -> list[StarredComment]:
+        docs = await self._find(
+            self.starred_comments_coll, {"starrer_username": starrer_username, "text_coords.parsha": parsha}
+        )
+        return [StarredComment.from_trusted_mongo_db(doc) for doc in docs]
 
     async def count_starred_comments_by_parsha(self, starrer_username: str) -> dict[int, int]:
-        def blocking():
-            cursor = self.starred_comments_coll.aggregate(
-                [
-                    {"$match": {"starrer_username": starrer_username}},
-                    {
-                        "$lookup": {
-                            "from": self.comments_coll.name,
-                            "localField": "comment_id",
-                            "foreignField": "_id",
-                            "as": "comments",
-                        }
-                    },
-                    {"$project": {"comment": {"$first": "$comments"}}},
-                    {"$project": {"parsha": "$comment.text_coords.parsha"}},
-                    {"$group": {"_id": "$parsha", "count": {"$sum": 1}}},
-                ]
-            )
-            return {doc["_id"]: doc["count"] for doc in cursor if isinstance(doc["_id"], int)}
-
-        return await self._awrap(blocking)
+        summary_doc = await self._find_one(self.starred_comments_summaries_coll, {"_id": starrer_username})
+        if summary_doc is None:
+            return {}
+        return {int(parsha): count for parsha, count in summary_doc.get("by_parsha", {}).items() if count > 0}
 
     async def count_starred_comments(self, starrer_username: str) -> int:
-        return await self._awrap(self.starred_comments_coll.count_documents, {"starrer_username": starrer_username})
+        return await self._count_documents(self.starred_comments_coll, {"starrer_username": starrer_username})
 
     async def load_random_starred_comment_data(self, starrer_username: str) -> Optional[StarredCommentData]:
-        def blocking() -> Optional[StarredCommentData]:
-            cursor = self.starred_comments_coll.aggregate(
-                [
-                    {"$match": {"starrer_username": starrer_username}},
-                    {"$sample": {"size": 1}},
-                    {
-                        "$lookup": {
-                            "from": "comments",
-                            "localField": "comment_id",
-                            "foreignField": "_id",
-                            "as": "comment",
-                        }
-                    },
-                ]
-            )
-            docs = list(cursor)
-            try:
-                comment_doc = docs[0]["comment"][0]
-            except Exception:
-                logger.info(f"No random starred comments found for {starrer_username!r} ({docs = })")
-                return None
-            comment = StoredComment.from_mongo_db(comment_doc)
-            comment.is_starred = True
-            coords = CoordsTriplet.from_text_or_comment(comment)
-            parsha_data = self._lookup_single_verses_as_parsha_data(starrer_username, {coords}).get(coords)
-            return StarredCommentData(comment=comment, parsha_data=parsha_data)
-
-        return await self._awrap(blocking)
+        cached = self.random_starred_comment_cache.get(starrer_username)
+        if cached is not None:
+            return cached
+        random_starred_comment_data = await self._load_random_starred_comment_data(starrer_username)
+        if random_starred_comment_data is not None:
+            self.random_starred_comment_cache.put(starrer_username, random_starred_comment_data)
+        return random_starred_comment_data
+
+    async def _load_random_starred_comment_data(self, starrer_username: str) -> Optional[StarredCommentData]:
+        docs = await self._aggregate(
+            self.starred_comments_coll,
+            [
+                {"$match": {"starrer_username": starrer_username}},
+                {"$sample": {"size": 1}},
+                {
+                    "$lookup": {
+                        "from": "comments",
+                        "localField": "comment_id",
+                        "foreignField": "_id",
+                        "as": "comment",
+                    }
+                },
+            ],
+        )
+        try:
+            comment_doc = docs[0]["comment"][0]
+        except Exception:
+            logger.info(f"No random starred comments found for {starrer_username!r} ({docs = })")
+            return None
+        comment = StoredComment.from_trusted_mongo_db(comment_doc)
+        comment.is_starred = True
+        coords = CoordsTriplet.from_text_or_comment(comment)
+        parsha_data = (await self._lookup_single_verses_as_parsha_data(starrer_username, {coords})).get(coords)
+        return StarredCommentData(comment=comment, parsha_data=parsha_data)
 
     async def lookup_starred_comments_data(
-        self, starrer_username: str, parsha_indices: list[int], page: int, page_size: int
-    ) -> list[StarredCommentData]:
-        def blocking() -> list[StarredCommentData]:
-            if parsha_indices:
-                pipeline: MongoAggregationPipeline = [
-                    {"$match": {"$expr": {"$in": ["$text_coords.parsha", parsha_indices]}}}
-                ]
-            else:
-                pipeline = []
-
-            pipeline.extend(
-                [
-                    self._text_sorting_pipeline_step(start_to_end=True),
-                    {
-                        "$lookup": {
-                            "from": self.starred_comments_coll.name,
-                            "as": "starred",
-                            "let": {"comment_id": "$_id"},
-                            "pipeline": [
-                                {
-                                    "$match": {
-                                        "$expr": {
-                                            "$and": [
-                                                {"$eq": ["$starrer_username", starrer_username]},
-                                                {"$eq": ["$comment_id", "$$comment_id"]},
-                                            ]
-                                        }
-                                    }
-                                }
-                            ],
-                        }
-                    },
-                    {"$match": {"$expr": {"$toBool": {"$size": "$starred"}}}},
-                    {"$skip": page * page_size},
-                    {"$limit": page_size},
-                    {"$project": {"starred": False}},
-                ]
-            )
+        self,
+        starrer_username: str,
+        parsha_indices: list[int],
+        page: int,
+        page_size: int,
+        cursor: Optional[str] = None,
+    ) -> StarredCommentsPage:
+        # stars without coords (e.g. of comments missing on save) can't be shown and have no keyset to paginate by
+        match: MongoDocument = {"starrer_username": starrer_username, "text_coords": {"$ne": None}}
+        if parsha_indices:
+            match["text_coords.parsha"] = {"$in": parsha_indices}
+        # paginating over the starrer's index range and joining only the comments on the page
+        pipeline: MongoAggregationPipeline = [{"$match": match}]
+        if cursor is not None:
+            keyset = decode_cursor(cursor).get(self.starred_comments_coll.name)
+            if keyset is not None:
+                pipeline.append({"$match": keyset_filter(STARRED_COMMENTS_SORT_FIELDS, keyset)})
+        pipeline.append({"$sort": dict(STARRED_COMMENTS_SORT_FIELDS)})
+        if cursor is None:
+            pipeline.append({"$skip": page * page_size})
+        pipeline.extend(
+            [
+                {"$limit": page_size},
+                {
+                    "$lookup": {
+                        "from": self.comments_coll.name,
+                        "localField": "comment_id",
+                        "foreignField": "_id",
+                        "as": "comment",
+                    }
+                },
+                # starred comments are kept on the page even if the comment itself is gone, so that
+                # a short page reliably means the end of the results
+                {"$project": {**{field: True for field, _ in STARRED_COMMENTS_SORT_FIELDS}, "comment": True}},
+            ]
+        )
 
-            logger.info(f"generated pipeline: {pipeline}")
-            cursor = self.comments_coll.aggregate(pipeline)
-            comments = [StoredComment.from_mongo_db(doc) for doc in cursor]
-            for c in comments:
-                c.is_starred = True
-            single_verse_parsha_data_by_coords = self._lookup_single_verses_as_parsha_data(
-                username=starrer_username,
-                coord_triplets={CoordsTriplet.from_text_or_comment(c) for c in comments},
+        logger.info(f"generated pipeline: {pipeline}")
+        docs = await self._aggregate(self.starred_comments_coll, pipeline)
+        comments = [StoredComment.from_trusted_mongo_db(doc["comment"][0]) for doc in docs if doc["comment"]]
+        for c in comments:
+            c.is_starred = True
+        single_verse_parsha_data_by_coords = await self._lookup_single_verses_as_parsha_data(
+            username=starrer_username,
+            coord_triplets={CoordsTriplet.from_text_or_comment(c) for c in comments},
+        )
+        keysets: CursorKeysets = {
+            self.starred_comments_coll.name: (
+                get_keyset(docs[-1], STARRED_COMMENTS_SORT_FIELDS) if len(docs) == page_size else None
             )
-            return [
+        }
+        return StarredCommentsPage(
+            starred_comments=[
                 StarredCommentData(
                     comment=comment,
                     parsha_data=single_verse_parsha_data_by_coords.get(CoordsTriplet.from_text_or_comment(comment)),
                 )
                 for comment in comments
-            ]
+            ],
+            next_cursor=next_cursor(keysets),
+        )
 
-        return await self._awrap(blocking)
+    async def _starred_comment_ids(self, starrer_username: str, comment_ids: list[bson.ObjectId]) -> set[bson.ObjectId]:
+        """Ids of the given comments starred by the user, with a single indexed query"""
+        docs = await self._find(
+            self.starred_comments_coll,
+            {"starrer_username": starrer_username, "comment_id": {"$in": comment_ids}},
+        )
+        return {doc["comment_id"] for doc in docs}
 
-    def _set_is_starred(self, starrer_username: str, stored_comments: list[StoredComment]):
+    async def _set_is_starred(self, starrer_username: str, stored_comments: list[StoredComment]) -> None:
         """Modify StoredComment objects setting is_starred flag based on the data from starred-comments collection"""
         stored_comments_by_id = {sc.db_id: sc for sc in stored_comments if sc.is_stored()}
+        if not stored_comments_by_id:
+            return
 
         logger.info(f"Setting is_starred flag on {len(stored_comments)} comments with {starrer_username = }")
-        cursor = self.comments_coll.aggregate(
-            [
-                {"$limit": 1},
-                {"$addFields": {"comment_id": list(stored_comments_by_id.keys())}},
-                {"$project": {"comment_id": True}},
-                {"$unwind": "$comment_id"},
-                {
-                    "$lookup": {
-                        "from": "starred-comments",
-                        "as": "starred",
-                        "let": {"comment_id": "$comment_id"},
-                        "pipeline": [
-                            {
-                                "$match": {
-                                    "$expr": {
-                                        "$and": [
-                                            {"$eq": ["$starrer_username", starrer_username]},
-                                            {"$eq": ["$comment_id", "$$comment_id"]},
-                                        ]
-                                    }
-                                }
-                            }
-                        ],
-                    }
-                },
-                {"$project": {"comment_id": True, "is_starred": {"$toBool": {"$size": "$starred"}}}},
-            ]
-        )
-        total_starred = 0
-        for doc in cursor:
-            is_starred = doc["is_starred"]
-            if is_starred:
-                total_starred += 1
-            stored_comments_by_id[doc["comment_id"]].is_starred = is_starred
-        logger.info(f"Total starred comments: {total_starred}")
+        starred_comment_ids = await self._starred_comment_ids(starrer_username, list(stored_comments_by_id.keys()))
+        for comment_id, stored_comment in stored_comments_by_id.items():
+            stored_comment.is_starred = comment_id in starred_comment_ids
+        logger.info(f"Total starred comments: {len(starred_comment_ids)}")
 
-    def _lookup_single_verses_as_parsha_data(
+    async def _lookup_single_verses_as_parsha_data(
         self,
         username: Optional[str],
         coord_triplets: set[CoordsTriplet],
     ) -> dict[CoordsTriplet, ParshaData]:
-        """Load verse texts and comments and wrap them in a single-verse parsha data object"""
-
-        texts_and_comments_by_coords: dict[CoordsTriplet, tuple[list[StoredText], list[StoredComment]]] = dict()
-        logger.info(f"Fetching verses (single-verse parsha data objects) for {len(coord_triplets)} coords")
-        subquery_let = {"p": "$coords.parsha", "c": "$coords.chapter", "v": "$coords.verse"}
-        subquery_pipeline = [
-            {
-                "$match": {
-                    "$expr": {
-                        "$and": [
-                            {"$eq": ["$text_coords.parsha", "$$p"]},
-                            {"$eq": ["$text_coords.chapter", "$$c"]},
-                            {"$eq": ["$text_coords.verse", "$$v"]},
-                        ]
-                    }
-                }
-            }
-        ]
-
-        for doc in self.texts_coll.aggregate(
-            [
-                # {
-                #     "$documents": [
-                #         {"parsha": parsha, "chapter": chapter, "verse": verse}
-                #         for parsha, chapter, verse in coord_triplets
-                #     ]
-                # },
-                # ^^^ $documents is not available in Mongo 5, so we emulate it below
-                {"$limit": 1},
-                {
-                    "$addFields": {
-                        "coords": [
-                            {
-                                "parsha": ct.parsha,
-                                "chapter": ct.chapter,
-                                "verse": ct.verse,
-                            }
-                            for ct in coord_triplets
-                        ]
-                    }
-                },
-                {"$project": {"coords": True}},
-                {"$unwind": "$coords"},
-                # now we have a stream of {"parsha": ..., "chapter": ..., "verse": ...} docs
-                {
-                    "$lookup": {
-                        "from": "texts",
-                        "as": "texts",
-                        "let": subquery_let,
-                        "pipeline": subquery_pipeline,
-                    }
-                },
-                {
-                    "$lookup": {
-                        "from": "comments",
-                        "as": "comments",
-                        "let": subquery_let,
-                        "pipeline": subquery_pipeline,
-                    }
-                },
+        """Wrap verse texts and comments in single-verse parsha data objects; verses of cached parshas are taken
+        from the cache, the rest are loaded with a single indexed query per collection"""
+        start = time.perf_counter()
+        result = dict[CoordsTriplet, ParshaData]()
+        uncached_coord_triplets = set[CoordsTriplet]()
+        coord_triplets_by_parsha = collections.defaultdict[int, list[CoordsTriplet]](list)
+        for ct in coord_triplets:
+            coord_triplets_by_parsha[ct.parsha].append(ct)
+
+        cached_verses = dict[CoordsTriplet, ParshaData]()
+        for parsha, parsha_coord_triplets in coord_triplets_by_parsha.items():
+            # not using the indexed parsha data here, as it would be built and take cache budget just for that
+            parsha_data = self.parsha_data_cache.peek(parsha)
+            if parsha_data is None:
+                uncached_coord_triplets.update(parsha_coord_triplets)
+                continue
+            for ct in parsha_coord_triplets:
+                single_verse_parsha_data = slice_parsha_data(parsha_data, ct.chapter, ct.verse, ct.verse)
+                if single_verse_parsha_data is not None:
+                    cached_verses[ct] = single_verse_parsha_data
+
+        if cached_verses:
+            cached_comment_ids = [
+                bson.ObjectId(comment["id"])
+                for single_verse_parsha_data in cached_verses.values()
+                for comments in single_verse_parsha_data["chapters"][0]["verses"][0]["comments"].values()
+                for comment in comments
+                if "id" in comment
             ]
-        ):
-            verse_texts = [StoredText.from_mongo_db(t) for t in doc["texts"]]
-            verse_comments = [StoredComment.from_mongo_db(c) for c in doc["comments"]]
-            texts_and_comments_by_coords[
-                CoordsTriplet(
-                    doc["coords"]["parsha"],
-                    doc["coords"]["chapter"],
-                    doc["coords"]["verse"],
-                )
-            ] = (verse_texts, verse_comments)
-
-        if username is not None:
-            self._set_is_starred(
-                username,
-                list(itertools.chain.from_iterable(comments for _, comments in texts_and_comments_by_coords.values())),
+            starred_comment_ids = (
+                {str(id_) for id_ in await self._starred_comment_ids(username, cached_comment_ids)}
+                if username is not None and cached_comment_ids
+                else set[str]()
             )
-        return {
-            coords: texts_and_comments_to_parsha_data(texts, comments)
-            for coords, (texts, comments) in texts_and_comments_by_coords.items()
-        }
+            for ct, single_verse_parsha_data in cached_verses.items():
+                # the verse is shared with the cache, so the starred comments are overlayed on top of it
+                result[ct] = overlay_user_data(IndexedParshaData(single_verse_parsha_data), starred_comment_ids, [])
+
+        if uncached_coord_triplets:
+            coords_filter = {
+                "$or": [
+                    {"text_coords.parsha": ct.parsha, "text_coords.chapter": ct.chapter, "text_coords.verse": ct.verse}
+                    for ct in uncached_coord_triplets
+                ]
+            }
+            text_docs, comment_docs = await asyncio.gather(
+                self._find(self.texts_coll, coords_filter),
+                self._find(self.comments_coll, coords_filter),
+            )
+            texts_by_coords = collections.defaultdict[CoordsTriplet, list[StoredText]](list)
+            for doc in text_docs:
+                text = StoredText.from_trusted_mongo_db(doc)
+                texts_by_coords[CoordsTriplet.from_text_or_comment(text)].append(text)
+            comments_by_coords = collections.defaultdict[CoordsTriplet, list[StoredComment]](list)
+            for doc in comment_docs:
+                comment = StoredComment.from_trusted_mongo_db(doc)
+                comments_by_coords[CoordsTriplet.from_text_or_comment(comment)].append(comment)
+
+            if username is not None:
+                await self._set_is_starred(username, list(itertools.chain.from_iterable(comments_by_coords.values())))
+            for coords, texts in texts_by_coords.items():
+                result[coords] = texts_and_comments_to_parsha_data(texts, comments_by_coords.get(coords, []))
+
+        logger.info(
+            f"Looked up {len(result)} single verses for {len(coord_triplets)} coords "
+            + f"({len(coord_triplets) - len(uncached_coord_triplets)} from the parsha cache) "
+            + f"in {time.perf_counter() - start:.3f} sec"
+        )
+        return result
 
     # parsha data
 
     async def get_parsha_data(self, index: int) -> Optional[ParshaData]:
-        def blocking(parsha: int) -> Optional[ParshaData]:
-            query = {"text_coords.parsha": parsha}
-            texts = [StoredText.from_mongo_db(d) for d in self.texts_coll.find(query)]
-            if not texts:
-                return None
-            comments = [StoredComment.from_mongo_db(d) for d in self.comments_coll.find(query)]
-            return texts_and_comments_to_parsha_data(texts, comments)
-
         cached = self.parsha_data_cache.get(index)
         if cached is not None:
-            parsha_data = cached
-        else:
-            maybe_parsha_data = await self._awrap(blocking, index)
-            if maybe_parsha_data is None:
+            return cached
+        query = {"text_coords.parsha": index}
+        text_docs, comment_docs = await asyncio.gather(
+            self._find(self.texts_coll, query),
+            self._find(self.comments_coll, query),
+        )
+        if not text_docs:
+            return None
+        parsha_data = texts_and_comments_to_parsha_data(
+            [StoredText.from_trusted_mongo_db(d) for d in text_docs],
+            [StoredComment.from_trusted_mongo_db(d) for d in comment_docs],
+        )
+        self.parsha_data_cache.put(index, parsha_data)
+        return parsha_data
+
+    async def warm_up_parsha_data(self, index: int, content_encodings: list[str]) -> None:
+        if await self.get_parsha_data(index) is not None:
+            await self.parsha_data_cache.warm_up_encoded(index, content_encodings)
+
+    async def get_parsha_data_indexed(self, index: int) -> Optional[IndexedParshaData]:
+        parsha_data = await self.get_parsha_data(index)
+        if parsha_data is None:
+            return None
+        return self.parsha_data_cache.get_indexed(index) or IndexedParshaData(parsha_data)
+
+    async def get_parsha_data_encoded(
+        self, index: int, content_encoding: Optional[str], view: ParshaDataView = WHOLE_PARSHA
+    ) -> Optional[EncodedParshaData]:
+        parsha_data = await self.get_parsha_data(index)
+        if parsha_data is None:
+            return None
+        encoded = self.parsha_data_cache.get_encoded(index, content_encoding, view)
+        if encoded is None:  # parsha data is too large to be cached or there are no verses in the view
+            view_data = view.apply(parsha_data)
+            if view_data is None:
                 return None
-            else:
-                parsha_data = maybe_parsha_data
-                self.parsha_data_cache[index] = parsha_data
-        return copy.deepcopy(parsha_data)
+            identity_body = serialization.dumps(view_data)
+            encoded = encoded_parsha_data(
+                body=serialization.compress(identity_body, content_encoding),
+                content_encoding=content_encoding,
+                identity_body_hash=content_hash(identity_body),
+            )
+        return encoded
 
     async def save_parsha_data(self, parsha_data: ParshaData, replace: bool) -> None:
         delete_existing = replace and (parsha_data["parsha"] in await self.get_available_parsha_indices())
         logger.info(f"Saving parsha data, {replace = }, {delete_existing = }")
 
-        def blocking(parsha_data: ParshaData) -> None:
+        if delete_existing:
+            filter_ = {"text_coords.parsha": parsha_data["parsha"]}
+            deleted_comment_ids = await self._distinct(self.comments_coll, "_id", filter_)
+            await self._delete_many(self.texts_coll, filter_)
+            await self._delete_many(self.comments_coll, filter_)
+        texts, comments = parsha_data_to_texts_and_comments(parsha_data)
+        if delete_existing:
+            # comments uploaded with their ids are re-inserted as is and keep their stars
+            reinserted_comment_ids = {c.db_id for c in comments if c.is_stored()}
+            affected_usernames = await self._delete_starred_comments_of(
+                [id_ for id_ in deleted_comment_ids if id_ not in reinserted_comment_ids]
+            )
+            if affected_usernames:
+                await self._summarize_starred_comments(affected_usernames)
+        logger.info(f"Extracted {len(texts)} texts and {len(comments)} comments")
+        # documents get their ids on insertion
+        text_docs = [t.to_mongo_db() for t in texts]
+        comment_docs = [c.to_mongo_db() for c in comments]
+        if text_docs:
+            await self._insert_many(self.texts_coll, text_docs)
+        if comment_docs:
+            await self._insert_many(self.comments_coll, comment_docs)
+
+        def update_search_engine(search_engine: SearchEngine) -> None:
             if delete_existing:
-                filter_ = {"text_coords.parsha": parsha_data["parsha"]}
-                self.texts_coll.delete_many(filter_)
-                self.comments_coll.delete_many(filter_)
-            texts, comments = parsha_data_to_texts_and_comments(parsha_data)
-            logger.info(f"Extracted {len(texts)} texts and {len(comments)} comments")
-            if texts:
-                self.texts_coll.insert_many([t.to_mongo_db() for t in texts])
-            if comments:
-                self.comments_coll.insert_many([c.to_mongo_db() for c in comments])
-
-        await self._awrap(blocking, parsha_data)
-        self.parsha_data_cache.pop(parsha_data["parsha"], None)
+                search_engine.remove_parsha(parsha_data["parsha"])
+            for doc in text_docs:
+                search_engine.add_text(StoredText.from_mongo_db(doc))
+            for doc in comment_docs:
+                search_engine.add_comment(StoredComment.from_mongo_db(doc))
+
+        self._update_search_engine(update_search_engine)
+
+        self.parsha_data_cache.invalidate(parsha_data["parsha"])
+        self.search_count_cache.clear()
         self.get_available_parsha_indices.cache_clear()
 
     @alru_cache(maxsize=None)
     async def get_available_parsha_indices(self) -> list[int]:
-        return await self._awrap(self.texts_coll.distinct, "text_coords.parsha")
+        return await self._distinct(self.texts_coll, "text_coords.parsha")
 
     async def get_cached_parsha_indices(self) -> list[int]:
-        return list(self.parsha_data_cache.keys())
+        return self.parsha_data_cache.indices()
+
+    async def get_auth_cache_stats(self) -> Optional[TTLCacheStats]:
+        return self.auth_cache.stats()
+
+    async def get_parsha_cache_stats(self) -> CacheStats:
+        return self.parsha_data_cache.stats()
 
     async def drop_parsha_cache(self) -> None:
         self.get_available_parsha_indices.cache_clear()
         self.parsha_data_cache.clear()
 
     async def edit_comment(self, comment_id: bson.ObjectId, edited_comment: EditedComment) -> None:
-        comment_doc = await self._awrap(
-            self.comments_coll.find_one_and_update,
-            {"_id": comment_id},
-            {"$set": edited_comment.dict()},
+        # pipeline update to set the normalized shadow field depending on the stored comment source
+        update = {field: {"$literal": value} for field, value in edited_comment.dict().items()}
+        update["normalized_comment"] = if_hebrew_source(
+            "$comment_source",
+            hebrew_comment_sources(),
+            normalized_comment(edited_comment.anchor_phrase, edited_comment.comment),
         )
+        comment_doc = await self._find_one_and_update(self.comments_coll, {"_id": comment_id}, [{"$set": update}])
         comment = StoredComment.from_mongo_db(comment_doc)
-        self.parsha_data_cache.pop(comment.text_coords.parsha, None)
+        self.parsha_data_cache.invalidate(comment.text_coords.parsha)
+        # the document is returned as it was before the update
+        edited_stored_comment = comment.copy(update=edited_comment.dict())
+        self._update_search_engine(lambda search_engine: search_engine.add_comment(edited_stored_comment))
 
     async def edit_text(self, text_id: bson.ObjectId, text: str) -> None:
-        text_doc = await self._awrap(
-            self.texts_coll.find_one_and_update,
-            {"_id": text_id},
-            {"$set": {"text": text}},
-        )
-        stored_text = StoredText.from_mongo_db(text_doc)
-        self.parsha_data_cache.pop(stored_text.text_coords.parsha, None)
-
-    def _text_sorting_pipeline_step(self, start_to_end: bool) -> dict[str, Any]:
-        order = pymongo.ASCENDING if start_to_end else pymongo.DESCENDING
-        return {
-            "$sort": {
-                key: order
-                for key in [
-                    "text_coords.parsha",
-                    "text_coords.chapter",
-                    "text_coords.verse",
-                ]
-            }
+        update = {
+            "text": {"$literal": text},
+            "normalized_text": if_hebrew_source("$text_source", hebrew_text_sources(), normalize_hebrew(text)),
         }
+        text_doc = await self._find_one_and_update(self.texts_coll, {"_id": text_id}, [{"$set": update}])
+        stored_text = StoredText.from_mongo_db(text_doc)
+        self.parsha_data_cache.invalidate(stored_text.text_coords.parsha)
+        # the document is returned as it was before the update
+        edited_stored_text = stored_text.copy(update={"text": text})
+        self._update_search_engine(lambda search_engine: search_engine.add_text(edited_stored_text))
 
     async def search_text(
         self,
@@ -634,94 +1092,155 @@ class MongoDatabase(DatabaseInterface):
         search_in: list[SearchTextIn],
         with_verse_parsha_data: bool,
         username: Optional[str],
+        cursor: Optional[str] = None,
     ) -> SearchTextResult:
-        def blocking() -> SearchTextResult:
-            logger.info(
-                f"Searching texts with {query = } {page = } {page_size = } {sorting = } "
-                + f"{search_in = } {with_verse_parsha_data = }"
-            )
-            if sorting is SearchTextSorting.BEST_TO_WORST:
-                sort_step = {"$sort": {"score": {"$meta": "textScore"}}}
-            else:
-                sort_step = self._text_sorting_pipeline_step(start_to_end=sorting is SearchTextSorting.START_TO_END)
-
-            match_step = {"$match": {"$text": {"$search": query, "$language": to_mongo_language(language)}}}
-            count_pipeline: MongoAggregationPipeline = [match_step, {"$count": "total"}]
-            search_pipeline: MongoAggregationPipeline = [
-                match_step,
-                sort_step,
-                {"$skip": page * page_size},
-                {"$limit": page_size},
-            ]
-            logger.info(
-                f"Generated search pipeline:\n{json.dumps(search_pipeline, ensure_ascii=False)}\n"
-                + f"and count pipeline:\n{json.dumps(count_pipeline, ensure_ascii=False)}"
-            )
-            if SearchTextIn.TEXTS in search_in:
-                texts = [StoredText.from_mongo_db(doc) for doc in self.texts_coll.aggregate(search_pipeline)]
-                try:
-                    text_matches: Optional[int] = (self.texts_coll.aggregate(count_pipeline)).next()["total"]
-                except StopIteration:
-                    text_matches = 0
-            else:
-                texts = []
-                text_matches = None
-
-            if SearchTextIn.COMMENTS in search_in:
-                comments = [StoredComment.from_mongo_db(doc) for doc in self.comments_coll.aggregate(search_pipeline)]
-                if username is not None:
-                    self._set_is_starred(username, comments)
-                try:
-                    comment_matches: Optional[int] = self.comments_coll.aggregate(count_pipeline).next()["total"]
-                except StopIteration:
-                    comment_matches = 0
+        logger.info(
+            f"Searching texts with {query = } {page = } {page_size = } {sorting = } "
+            + f"{search_in = } {with_verse_parsha_data = } {cursor = }"
+        )
+        if language == IsoLang.HE:  # matching normalized shadow fields
+            query = normalize_hebrew(query)
+        sort_fields = search_sort_fields(sorting)
+        keysets = decode_cursor(cursor) if cursor is not None else None
+        next_keysets: CursorKeysets = dict()
+
+        match_step = {"$match": {"$text": {"$search": query, "$language": to_mongo_language(language)}}}
+        count_stages: MongoAggregationPipeline = [{"$count": "total"}]
+        if config.SEARCH_COUNT_CAP > 0:
+            count_stages.insert(0, {"$limit": config.SEARCH_COUNT_CAP})
+
+        async def search_collection_in_engine(
+            coll: MongoCollection, search_engine: SearchEngine
+        ) -> tuple[list[MongoDocument], int]:
+            """Matches are ranked and paginated in-process, only the documents on the page are loaded from Mongo"""
+            index_name: IndexName = "texts" if coll is self.texts_coll else "comments"
+            hits = search_engine.search(index_name, query, language)
+            total = min(len(hits), config.SEARCH_COUNT_CAP) if config.SEARCH_COUNT_CAP > 0 else len(hits)
+            if keysets is None:
+                page_hits, next_keysets[coll.name] = paginate_search_hits(
+                    hits, sorting, page_size, skip=page * page_size
+                )
+            elif coll.name in keysets and keysets[coll.name] is None:
+                page_hits, next_keysets[coll.name] = [], None
             else:
-                comments = []
-                comment_matches = None
-
-            texts_and_comments = texts + comments
-            if not texts_and_comments:
-                return SearchTextResult(
-                    found_matches=[],
-                    total_matched_comments=comment_matches,
-                    total_matched_texts=text_matches,
+                page_hits, next_keysets[coll.name] = paginate_search_hits(
+                    hits, sorting, page_size, start_after=keysets.get(coll.name)
                 )
-
-            logger.info(f"Got {len(texts)} texts and {len(comments)} comments")
-
-            if len(search_in) > 1:  # e.g. we concatenate results of several queries and need to reorder them
-                if sorting is SearchTextSorting.START_TO_END:
-                    texts_and_comments.sort(key=CoordsTriplet.from_text_or_comment)
-                elif sorting is SearchTextSorting.END_TO_START:
-                    texts_and_comments.sort(key=CoordsTriplet.from_text_or_comment, reverse=True)
-                elif sorting is SearchTextSorting.BEST_TO_WORST:
-                    random.seed(f"{query}-{page}-{page_size}")  # ensuring query repeatability
-                    # it's reasonable to expect that on a single page all results are more or less equal in score
-                    random.shuffle(texts_and_comments)
-
-            if with_verse_parsha_data:
-                verse_parsha_data_by_coords = self._lookup_single_verses_as_parsha_data(
-                    username=username,
-                    coord_triplets={CoordsTriplet.from_text_or_comment(toc) for toc in texts_and_comments},
+            if not page_hits:
+                return [], total
+            docs_by_id = {
+                doc["_id"]: doc for doc in await self._find(coll, {"_id": {"$in": [hit.doc_id for hit in page_hits]}})
+            }
+            return [docs_by_id[hit.doc_id] for hit in page_hits if hit.doc_id in docs_by_id], total
+
+        async def search_collection(coll: MongoCollection) -> tuple[list[MongoDocument], int]:
+            """Page and total count are computed in a single pass over the matches with $facet; the count is
+            skipped altogether if it's cached from a recent search with the same query"""
+            if self.search_engine is not None:
+                return await search_collection_in_engine(coll, self.search_engine)
+            count_cache_key = (coll.name, language, normalize_search_query(query))
+            total = self.search_count_cache.get(count_cache_key)
+
+            page_stages: Optional[MongoAggregationPipeline]  # None if the collection is already paginated over
+            if keysets is None:
+                page_stages = [{"$sort": dict(sort_fields)}, {"$skip": page * page_size}, {"$limit": page_size}]
+            elif coll.name in keysets and keysets[coll.name] is None:
+                page_stages = None
+            else:
+                keyset = keysets.get(coll.name)
+                keyset_stages = [] if keyset is None else [{"$match": keyset_filter(sort_fields, keyset)}]
+                page_stages = [*keyset_stages, {"$sort": dict(sort_fields)}, {"$limit": page_size}]
+
+            facets: dict[str, MongoAggregationPipeline] = dict()
+            if page_stages is not None:
+                facets["page"] = page_stages
+            if total is None:
+                facets["total"] = count_stages
+            docs: list[MongoDocument] = []
+            if facets:
+                pipeline: MongoAggregationPipeline = [match_step]
+                if sorting is SearchTextSorting.BEST_TO_WORST and page_stages is not None:
+                    pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+                pipeline.append({"$facet": facets})
+                logger.info(
+                    f"Generated search pipeline for {coll.name}:\n"
+                    + json.dumps(pipeline, ensure_ascii=False, default=str)
                 )
+                result = (await self._aggregate(coll, pipeline))[0]
+                docs = result.get("page", [])
+                if total is None:
+                    total = result["total"][0]["total"] if result["total"] else 0
+                    self.search_count_cache.put(count_cache_key, total)
+
+            if page_stages is None or len(docs) < page_size:
+                next_keysets[coll.name] = None
             else:
-                verse_parsha_data_by_coords = dict()
+                next_keysets[coll.name] = get_keyset(docs[-1], sort_fields)
+            return docs, total or 0
 
-            found_matches = list[FoundMatch]()
-            for toc in texts_and_comments:
-                parsha_data = verse_parsha_data_by_coords.get(CoordsTriplet.from_text_or_comment(toc))
-                if isinstance(toc, StoredText):
-                    found_matches.append(FoundMatch(text=toc, parsha_data=parsha_data))
-                else:
-                    found_matches.append(FoundMatch(comment=toc, parsha_data=parsha_data))
+        if SearchTextIn.TEXTS in search_in:
+            text_docs, text_total = await search_collection(self.texts_coll)
+            texts = [StoredText.from_trusted_mongo_db(doc) for doc in text_docs]
+            text_matches: Optional[int] = text_total
+        else:
+            texts = []
+            text_matches = None
+
+        if SearchTextIn.COMMENTS in search_in:
+            comment_docs, comment_total = await search_collection(self.comments_coll)
+            comments = [StoredComment.from_trusted_mongo_db(doc) for doc in comment_docs]
+            if username is not None:
+                await self._set_is_starred(username, comments)
+            comment_matches: Optional[int] = comment_total
+        else:
+            comments = []
+            comment_matches = None
 
+        texts_and_comments: list[Union[StoredText, StoredComment]] = [*texts, *comments]
+        if not texts_and_comments:
             return SearchTextResult(
-                found_matches=found_matches,
+                found_matches=[],
                 total_matched_comments=comment_matches,
                 total_matched_texts=text_matches,
+                are_totals_capped=are_search_totals_capped(text_matches, comment_matches),
+                next_cursor=next_cursor(next_keysets),
             )
 
-        return await self._awrap(blocking)
+        logger.info(f"Got {len(texts)} texts and {len(comments)} comments")
+
+        if len(search_in) > 1:  # e.g. we concatenate results of several queries and need to reorder them
+            if sorting is SearchTextSorting.START_TO_END:
+                texts_and_comments.sort(key=CoordsTriplet.from_text_or_comment)
+            elif sorting is SearchTextSorting.END_TO_START:
+                texts_and_comments.sort(key=CoordsTriplet.from_text_or_comment, reverse=True)
+            elif sorting is SearchTextSorting.BEST_TO_WORST:
+                random.seed(f"{query}-{page}-{page_size}-{cursor}")  # ensuring query repeatability
+                # it's reasonable to expect that on a single page all results are more or less equal in score
+                random.shuffle(texts_and_comments)
+
+        if with_verse_parsha_data:
+            verse_parsha_data_by_coords = await self._lookup_single_verses_as_parsha_data(
+                username=username,
+                coord_triplets={CoordsTriplet.from_text_or_comment(toc) for toc in texts_and_comments},
+            )
+        else:
+            verse_parsha_data_by_coords = dict()
+
+        found_matches = list[FoundMatch]()
+        for toc in texts_and_comments:
+            parsha_data = verse_parsha_data_by_coords.get(CoordsTriplet.from_text_or_comment(toc))
+            if isinstance(toc, StoredText):
+                found_matches.append(FoundMatch(text=toc, parsha_data=parsha_data))
+            else:
+                found_matches.append(FoundMatch(comment=toc, parsha_data=parsha_data))
+
+        return SearchTextResult(
+            found_matches=found_matches,
+            total_matched_comments=comment_matches,
+            total_matched_texts=text_matches,
+            are_totals_capped=are_search_totals_capped(text_matches, comment_matches),
+            next_cursor=next_cursor(next_keysets),
+        )
 
     def _match_entities_pipeline(
         self, request: TextOrCommentIterRequest, collection: Literal["texts", "comments"]
@@ -757,34 +1276,24 @@ class MongoDatabase(DatabaseInterface):
         return [*self._match_entities_pipeline(request, collection), {"$count": "count"}]
 
     async def count_texts(self, request: TextOrCommentIterRequest) -> int:
-        count_doc = list(
-            await self._awrap(self.texts_coll.aggregate, self._count_entities_pipeline(request, collection="texts"))
-        )
+        count_doc = await self._aggregate(self.texts_coll, self._count_entities_pipeline(request, collection="texts"))
         return count_doc[0]["count"]
 
     async def count_comments(self, request: TextOrCommentIterRequest) -> int:
-        count_doc = list(
-            await self._awrap(
-                self.comments_coll.aggregate, self._count_entities_pipeline(request, collection="comments")
-            )
+        count_doc = await self._aggregate(
+            self.comments_coll, self._count_entities_pipeline(request, collection="comments")
         )
         return count_doc[0]["count"]
 
     async def iter_texts(self, request: TextOrCommentIterRequest) -> Optional[StoredText]:
-        docs = list(
-            await self._awrap(self.texts_coll.aggregate, self._iter_entities_pipeline(request, collection="texts"))
-        )
+        docs = await self._aggregate(self.texts_coll, self._iter_entities_pipeline(request, collection="texts"))
         if docs:
             return StoredText.from_mongo_db(docs[0])
         else:
             return None
 
     async def iter_comments(self, request: TextOrCommentIterRequest) -> Optional[StoredComment]:
-        docs = list(
-            await self._awrap(
-                self.comments_coll.aggregate, self._iter_entities_pipeline(request, collection="comments")
-            )
-        )
+        docs = await self._aggregate(self.comments_coll, self._iter_entities_pipeline(request, collection="comments"))
         if docs:
             return StoredComment.from_mongo_db(docs[0])
         else:
@@ -792,15 +1301,15 @@ class MongoDatabase(DatabaseInterface):
 
     async def save_user_comment(self, comment: StoredUserComment) -> StoredUserComment:
         logger.info(f"Saving user comment {comment}")
-        res = await self._awrap(
-            self.user_comments_coll.insert_one,
+        res = await self._insert_one(
+            self.user_comments_coll,
             {k: v for k, v in comment.to_mongo_db().items() if k != "db_id"},  # this is a HACK but I'm tireddddd
         )
         return comment.inserted_as(res)
 
     async def delete_user_comment(self, user_comment_id: bson.ObjectId, author_username: str) -> bool:
-        res = await self._awrap(
-            self.user_comments_coll.delete_one,
+        res = await self._delete_one(
+            self.user_comments_coll,
             {
                 "_id": user_comment_id,
                 "author_username": author_username,
@@ -808,26 +1317,156 @@ class MongoDatabase(DatabaseInterface):
         )
         return res.deleted_count > 0
 
+    def _user_comments_pipeline(self, username: str, parsha: int) -> MongoAggregationPipeline:
+        return [
+            {"$match": {"author_username": username, "text_coords.parsha": parsha}},
+            {"$sort": {"timestamp": pymongo.ASCENDING}},
+            {
+                "$lookup": {
+                    "from": "users",
+                    "localField": "author_username",
+                    "foreignField": "username",
+                    "as": "_stored_users",
+                }
+            },
+            {"$set": {"_author_user": {"$first": "$_stored_users"}}},
+            {"$set": {"author_user_data": "$_author_user.data"}},
+            {"$project": {"_stored_users": False, "_author_user": False}},
+        ]
+
     async def lookup_user_comments(self, username: str, parsha: int) -> list[DisplayedUserComment]:
-        docs = await self._awrap(
-            self.user_comments_coll.with_options(codec_options=CodecOptions(tz_aware=True)).aggregate,
-            [
-                {"$match": {"author_username": username, "text_coords.parsha": parsha}},
-                {"$sort": {"timestamp": pymongo.ASCENDING}},
+        docs = await self._aggregate(
+            self.user_comments_coll.with_options(codec_options=CodecOptions(tz_aware=True)),
+            self._user_comments_pipeline(username, parsha),
+        )
+        return [DisplayedUserComment.from_mongo_db(doc) for doc in docs]
+
+    # all user data for a parsha at once
+
+    async def lookup_user_parsha_data(
+        self, username: str, parsha: int, with_starred_comments: bool, with_user_comments: bool
+    ) -> UserParshaData:
+        if not with_starred_comments and not with_user_comments:
+            return UserParshaData(starred_comment_ids=set(), user_comments=[])
+        if not with_starred_comments:
+            return UserParshaData(
+                starred_comment_ids=set(), user_comments=await self.lookup_user_comments(username, parsha)
+            )
+        pipeline: MongoAggregationPipeline = [
+            {"$match": {"starrer_username": username, "text_coords.parsha": parsha}},
+            {"$project": {"_id": False, "comment_id": True}},
+        ]
+        if with_user_comments:
+            # appending user comments to the same result set, to get everything in one round trip
+            pipeline.append(
                 {
-                    "$lookup": {
-                        "from": "users",
-                        "localField": "author_username",
-                        "foreignField": "username",
-                        "as": "_stored_users",
+                    "$unionWith": {
+                        "coll": self.user_comments_coll.name,
+                        "pipeline": self._user_comments_pipeline(username, parsha),
                     }
-                },
-                {"$set": {"_author_user": {"$first": "$_stored_users"}}},
-                {"$set": {"author_user_data": "$_author_user.data"}},
-                {"$project": {"_stored_users": False, "_author_user": False}},
-            ],
+                }
+            )
+        docs = await self._aggregate(
+            self.starred_comments_coll.with_options(codec_options=CodecOptions(tz_aware=True)), pipeline
         )
-        return [DisplayedUserComment.from_mongo_db(doc) for doc in docs]
+        starred_comment_ids = set[str]()
+        user_comments: list[DisplayedUserComment] = []
+        for doc in docs:
+            if "comment_id" in doc:
+                starred_comment_ids.add(str(doc["comment_id"]))
+            else:
+                user_comments.append(DisplayedUserComment.from_mongo_db(doc))
+        return UserParshaData(starred_comment_ids=starred_comment_ids, user_comments=user_comments)
+
+
+class AsyncMongoDatabase(MongoDatabase):
+    """Runs the same queries as MongoDatabase with PyMongo's native asyncio API instead of a thread pool;
+    synchronous collection objects are still used to reference collections (and their codec options),
+    but the synchronous client is created with connect=False and is never actually used for I/O"""
+
+    def __init__(
+        self,
+        mongo_client: MongoClient[MongoDocument],
+        async_mongo_client: AsyncMongoClient[MongoDocument],
+        db_name: str,
+    ):
+        super().__init__(mongo_client, db_name)
+        self.async_client = async_mongo_client
+        self.async_db: AsyncDatabase[MongoDocument] = self.async_client[db_name]
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.async_client})"
+
+    @classmethod
+    def from_config(cls) -> "AsyncMongoDatabase":
+        return AsyncMongoDatabase(
+            mongo_client=MongoClient(config.MONGO_URL, connect=False),
+            async_mongo_client=AsyncMongoClient(
+                config.MONGO_URL,
+                maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+                minPoolSize=config.MONGO_MIN_POOL_SIZE,
+            ),
+            db_name=config.MONGO_DB,
+        )
+
+    def _async_coll(self, coll: MongoCollection) -> AsyncCollection[MongoDocument]:
+        return self.async_db.get_collection(coll.name, codec_options=coll.codec_options)
+
+    async def _find(self, coll: MongoCollection, filter: MongoDocument) -> list[MongoDocument]:
+        return await self._async_coll(coll).find(filter).to_list()
+
+    async def _find_one(self, coll: MongoCollection, filter: MongoDocument) -> Optional[MongoDocument]:
+        return await self._async_coll(coll).find_one(filter)
+
+    async def _aggregate(self, coll: MongoCollection, pipeline: MongoAggregationPipeline) -> list[MongoDocument]:
+        cursor = await self._async_coll(coll).aggregate(pipeline)
+        return await cursor.to_list()
+
+    async def _count_documents(self, coll: MongoCollection, filter: MongoDocument) -> int:
+        return await self._async_coll(coll).count_documents(filter)
+
+    async def _distinct(self, coll: MongoCollection, key: str, filter: Optional[MongoDocument] = None) -> list[Any]:
+        return await self._async_coll(coll).distinct(key, filter)
+
+    async def _insert_one(self, coll: MongoCollection, doc: MongoDocument) -> InsertOneResult:
+        return await self._async_coll(coll).insert_one(doc)
+
+    async def _insert_many(self, coll: MongoCollection, docs: list[MongoDocument]) -> None:
+        await self._async_coll(coll).insert_many(docs)
+
+    async def _update_one(
+        self, coll: MongoCollection, filter: MongoDocument, update: MongoDocument, upsert: bool = False
+    ) -> UpdateResult:
+        return await self._async_coll(coll).update_one(filter, update, upsert=upsert)
+
+    async def _update_many(self, coll: MongoCollection, filter: MongoDocument, update: MongoDocument) -> None:
+        await self._async_coll(coll).update_many(filter, update)
+
+    async def _find_one_and_update(
+        self, coll: MongoCollection, filter: MongoDocument, update: Union[MongoDocument, MongoAggregationPipeline]
+    ) -> Optional[MongoDocument]:
+        return await self._async_coll(coll).find_one_and_update(filter, update)
+
+    async def _find_one_and_delete(self, coll: MongoCollection, filter: MongoDocument) -> Optional[MongoDocument]:
+        return await self._async_coll(coll).find_one_and_delete(filter)
+
+    async def _delete_one(self, coll: MongoCollection, filter: MongoDocument) -> DeleteResult:
+        return await self._async_coll(coll).delete_one(filter)
+
+    async def _delete_many(self, coll: MongoCollection, filter: MongoDocument) -> None:
+        await self._async_coll(coll).delete_many(filter)
+
+    async def _create_index(self, coll: MongoCollection, keys: list[tuple[str, Any]], **kwargs: Any) -> None:
+        await self._async_coll(coll).create_index(keys, **kwargs)
+
+    async def _index_information(self, coll: MongoCollection) -> MutableMapping[str, Any]:
+        return await self._async_coll(coll).index_information()
+
+    async def _drop_index(self, coll: MongoCollection, name: str) -> None:
+        await self._async_coll(coll).drop_index(name)
+
+    async def _bulk_write(self, coll: MongoCollection, requests: list[UpdateOne]) -> None:
+        await self._async_coll(coll).bulk_write(requests)
 
 
 def to_mongo_language(iso: str) -> str:
@@ -870,6 +1509,24 @@ def to_mongo_language(iso: str) -> str:
     )
 
 
+def normalized_comment(anchor_phrase: Optional[str], comment: str) -> str:
+    return normalize_hebrew(f"{anchor_phrase or ''} {comment}")
+
+
+def hebrew_text_sources() -> list[str]:
+    return [ts.key for section in ALL_METADATA for ts in section.text_sources if ts.language == IsoLang.HE]
+
+
+def hebrew_comment_sources() -> list[str]:
+    return [cs.key for section in ALL_METADATA for cs in section.comment_sources if cs.language == IsoLang.HE]
+
+
+def if_hebrew_source(source_field_path: str, hebrew_sources: list[str], normalized: str) -> MongoDocument:
+    """Aggregation expression for a normalized shadow field in a pipeline update: the value for documents
+    from Hebrew sources, the field is removed from the others"""
+    return {"$cond": [{"$in": [source_field_path, hebrew_sources]}, {"$literal": normalized}, "$$REMOVE"]}
+
+
 def parsha_data_to_texts_and_comments(parsha_data: ParshaData) -> tuple[list[StoredText], list[StoredComment]]:
     stored_texts: list[StoredText] = []
     stored_comments: list[StoredComment] = []
@@ -881,6 +1538,7 @@ def parsha_data_to_texts_and_comments(parsha_data: ParshaData) -> tuple[list[Sto
                 verse=verse_data["verse"],
             )
             for text_source, text in verse_data["text"].items():
+                text_language = get_text_source_language(text_source)
                 stored_texts.append(
                     StoredText(
                         # not parsing text ids from parsha data here, because this is used only
@@ -888,11 +1546,13 @@ def parsha_data_to_texts_and_comments(parsha_data: ParshaData) -> tuple[list[Sto
                         text_coords=text_coords,
                         text_source=text_source,
                         text=text,
-                        language=to_mongo_language(get_text_source_language(text_source)),
+                        language=to_mongo_language(text_language),
                         format=verse_data.get("text_formats", {}).get(text_source, "plain"),
+                        normalized_text=normalize_hebrew(text) if text_language == IsoLang.HE else None,
                     )
                 )
             for comment_source, comments in verse_data["comments"].items():
+                comment_language = get_comment_source_language(comment_source)
                 for index, comment in enumerate(comments):
                     c = StoredComment(
                         text_coords=text_coords,
@@ -900,9 +1560,14 @@ def parsha_data_to_texts_and_comments(parsha_data: ParshaData) -> tuple[list[Sto
                         anchor_phrase=comment["anchor_phrase"],
                         comment=comment["comment"],
                         format=comment["format"],
-                        language=to_mongo_language(get_comment_source_language(comment_source)),
+                        language=to_mongo_language(comment_language),
                         index=index,
                         legacy_id=comment.get("id"),
+                        normalized_comment=(
+                            normalized_comment(comment["anchor_phrase"], comment["comment"])
+                            if comment_language == IsoLang.HE
+                            else None
+                        ),
                         is_starred=comment.get("is_starred_by_me"),
                     )
                     if "id" in comment:
@@ -918,20 +1583,18 @@ def texts_and_comments_to_parsha_data(texts: list[StoredText], comments: list[St
     if len(parsha_values) > 1:
         raise ValueError("Stored texts and comments are from several parshas, can't construct parsha data")
     parsha_id = next(iter(parsha_values))
-    section_metadata = next(
-        iter(
-            [
-                section
-                for section in [TORAH_METADATA, NEVIIM_METADATA]
-                if any(parsha_info.id == parsha_id for parsha_info in section.parshas)
-            ]
-        ),
-        None,
-    )
-    if section_metadata is None:
+    try:
+        book_id = get_book_by_parsha(parsha_id)
+    except ValueError:
         raise ValueError("Failed to lookup Tanakh section metadata from book id")
-    parsha_info = next(iter(p for p in section_metadata.parshas if p.id == parsha_id))
-    book_id = parsha_info.book_id
+
+    # grouping texts and comments by verse in a single pass, keeping the original order within each verse
+    texts_by_verse = collections.defaultdict[tuple[int, int], list[StoredText]](list)
+    for t in texts:
+        texts_by_verse[(t.text_coords.chapter, t.text_coords.verse)].append(t)
+    comments_by_verse = collections.defaultdict[tuple[int, int], list[StoredComment]](list)
+    for c in comments:
+        comments_by_verse[(c.text_coords.chapter, c.text_coords.verse)].append(c)
 
     parsha_data = ParshaData(
         book=book_id,
@@ -939,13 +1602,11 @@ def texts_and_comments_to_parsha_data(texts: list[StoredText], comments: list[St
         chapters=[],
     )
 
-    texts = sorted(texts, key=lambda t: t.text_coords.chapter)
-    for chapter, chapter_texts_iter in itertools.groupby(texts, key=lambda t: t.text_coords.chapter):
-        chapter_texts = sorted(chapter_texts_iter, key=lambda t: t.text_coords.verse)
+    for chapter, chapter_verses_iter in itertools.groupby(sorted(texts_by_verse), key=lambda ch_v: ch_v[0]):
         chapter_data = ChapterData(chapter=chapter, verses=[])
         parsha_data["chapters"].append(chapter_data)
-        for verse, verse_texts_iter in itertools.groupby(chapter_texts, key=lambda t: t.text_coords.verse):
-            verse_texts = list(verse_texts_iter)
+        for _, verse in chapter_verses_iter:
+            verse_texts = texts_by_verse[(chapter, verse)]
             verse_texts_source_keys = {vt.text_source for vt in verse_texts}
             if len(verse_texts_source_keys) != len(verse_texts):
                 raise ValueError(
@@ -953,7 +1614,7 @@ def texts_and_comments_to_parsha_data(texts: list[StoredText], comments: list[St
                     + f" {verse_texts_source_keys =} {verse_texts = }"
                 )
 
-            verse_comments = [c for c in comments if c.text_coords.chapter == chapter and c.text_coords.verse == verse]
+            verse_comments = comments_by_verse.get((chapter, verse), [])
             verse_comments.sort(key=lambda c: c.index)
             comments_by_source = collections.defaultdict[str, list[CommentData]](list)
             for vc in verse_comments:
@@ -0,0 +1,82 @@
+import base64
+import json
+from typing import Any, Optional
+
+import bson
+
+from backend.database.interface import SearchTextSorting
+from backend.search.index import SearchHit
+
+# Keyset pagination: instead of skipping N documents, the next page is queried as documents strictly after
+# the last returned one in the sort order. The client gets the sort key of the last document (keyset)
+# wrapped in an opaque cursor string.
+
+# sort key values of a document, the last one is always its _id to make the order total
+Keyset = list[Any]
+
+# keysets of independently paginated result sets by name; None means the result set is exhausted,
+# a missing name means the result set is to be read from the start
+CursorKeysets = dict[str, Optional[Keyset]]
+
+
+def encode_cursor(keysets: CursorKeysets) -> str:
+    payload = {name: None if keyset is None else [*keyset[:-1], str(keyset[-1])] for name, keyset in keysets.items()}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> CursorKeysets:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(payload, dict):
+            raise ValueError("cursor payload must be an object")
+        return {
+            str(name): None if keyset is None else [*keyset[:-1], bson.ObjectId(keyset[-1])]
+            for name, keyset in payload.items()
+        }
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def next_cursor(keysets: CursorKeysets) -> Optional[str]:
+    """None if all result sets are exhausted"""
+    if all(keyset is None for keyset in keysets.values()):
+        return None
+    return encode_cursor(keysets)
+
+
+def search_hit_keyset(hit: SearchHit, sorting: SearchTextSorting) -> Keyset:
+    if sorting is SearchTextSorting.BEST_TO_WORST:
+        return [hit.score, hit.doc_id]
+    return [*hit.coords, hit.doc_id]
+
+
+def paginate_search_hits(
+    hits: list[SearchHit],
+    sorting: SearchTextSorting,
+    page_size: int,
+    skip: int = 0,
+    start_after: Optional[Keyset] = None,
+) -> tuple[list[SearchHit], Optional[Keyset]]:
+    """Page of in-process search hits in the same order MongoDatabase sorts $text matches in (score descending or
+    coords in the sorting direction, ties broken by _id) and the keyset to continue from, None on the last page"""
+
+    def sort_key(keyset: Keyset) -> tuple:
+        if sorting is SearchTextSorting.BEST_TO_WORST:
+            return (-keyset[0], keyset[1])
+        return tuple(keyset)
+
+    reverse = sorting is SearchTextSorting.END_TO_START
+    hits = sorted(hits, key=lambda hit: sort_key(search_hit_keyset(hit, sorting)), reverse=reverse)
+    if start_after is not None:
+        last = sort_key(start_after)
+        hits = [
+            hit
+            for hit in hits
+            if (
+                sort_key(search_hit_keyset(hit, sorting)) < last
+                if reverse
+                else sort_key(search_hit_keyset(hit, sorting)) > last
+            )
+        ]
+    page_hits = hits[skip : skip + page_size]  # noqa: E203
+    return page_hits, search_hit_keyset(page_hits[-1], sorting) if len(page_hits) == page_size else None
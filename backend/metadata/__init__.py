@@ -8,26 +8,31 @@ from backend.metadata.types import IsoLang
 
 ALL_METADATA = [TORAH_METADATA, NEVIIM_METADATA]
 
+# lookup tables, metadata is static so they are built once on import
+_BOOK_ID_BY_PARSHA = {
+    parsha_info.id: parsha_info.book_id
+    for parsha_info in itertools.chain.from_iterable(section.parshas for section in ALL_METADATA)
+}
+_TEXT_SOURCE_LANGUAGES = {ts.key: ts.language for section in ALL_METADATA for ts in section.text_sources}
+_COMMENT_SOURCE_LANGUAGES = {cs.key: cs.language for section in ALL_METADATA for cs in section.comment_sources}
 
-def get_book_by_parsha(parsha: int) -> int:
-    for parsha_info in itertools.chain.from_iterable(m.parshas for m in ALL_METADATA):
-        if parsha_info.id == parsha:
-            return parsha_info.book_id
 
-    raise ValueError(f"No Tanakh book found for parsha {parsha}")
+def get_book_by_parsha(parsha: int) -> int:
+    book_id = _BOOK_ID_BY_PARSHA.get(parsha)
+    if book_id is None:
+        raise ValueError(f"No Tanakh book found for parsha {parsha}")
+    return book_id
 
 
 def get_text_source_language(text_source_key: str) -> IsoLang:
-    for section in [TORAH_METADATA, NEVIIM_METADATA]:
-        for ts in section.text_sources:
-            if ts.key == text_source_key:
-                return ts.language
-    raise ValueError(f"Unknown text source key {text_source_key}!")
+    language = _TEXT_SOURCE_LANGUAGES.get(text_source_key)
+    if language is None:
+        raise ValueError(f"Unknown text source key {text_source_key}!")
+    return language
 
 
 def get_comment_source_language(comment_source_key: str) -> IsoLang:
-    for section in [TORAH_METADATA, NEVIIM_METADATA]:
-        for cs in section.comment_sources:
-            if cs.key == comment_source_key:
-                return cs.language
-    raise ValueError(f"Unknown text source key {comment_source_key}!")
+    language = _COMMENT_SOURCE_LANGUAGES.get(comment_source_key)
+    if language is None:
+        raise ValueError(f"Unknown text source key {comment_source_key}!")
+    return language
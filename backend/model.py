@@ -1,15 +1,17 @@
 import datetime
 import logging
-from typing import Any, Literal, Optional, Type, TypeVar
+from typing import Any, Iterator, Literal, NamedTuple, Optional, Type, TypeVar
 
 import pydantic
 from aiohttp import web
 from bson import ObjectId
 from pydantic import BaseModel, Field, ValidationError, create_model_from_typeddict
 from pydantic.error_wrappers import display_errors
+from pydantic.fields import SHAPE_SINGLETON, ModelField
 from pymongo.results import InsertOneResult, UpdateResult
 from typing_extensions import NotRequired, TypedDict
 
+from backend import config, serialization
 from backend.metadata.types import CommentSourceKey, TextSourceKey
 
 logger = logging.getLogger(__name__)
@@ -91,11 +93,62 @@ class PydanticModel(BaseModel):
             PydanticObjectId: lambda oid: str(oid) if oid != UNSET_DB_ID else "AAA",  # type: ignore
             ObjectId: lambda oid: str(oid) if oid != UNSET_DB_ID else "AAA",  # type: ignore
         }
+        json_dumps = serialization.dumps_str
 
 
 UNSET_DB_ID = PydanticObjectId(b"0" * 12)
 
 
+class _ConstructedField(NamedTuple):
+    name: str
+    field: ModelField
+    nested_model: Optional[Type[BaseModel]]
+
+
+_constructed_fields_by_model: dict[Type[BaseModel], list[_ConstructedField]] = dict()
+
+
+def _constructed_fields(cls: Type[BaseModel]) -> list[_ConstructedField]:
+    constructed_fields = _constructed_fields_by_model.get(cls)
+    if constructed_fields is None:
+        constructed_fields = _constructed_fields_by_model[cls] = [
+            _ConstructedField(
+                name=name,
+                field=field,
+                nested_model=(
+                    field.type_
+                    if field.shape == SHAPE_SINGLETON
+                    and isinstance(field.type_, type)
+                    and issubclass(field.type_, BaseModel)
+                    else None
+                ),
+            )
+            for name, field in cls.__fields__.items()
+        ]
+    return constructed_fields
+
+
+def construct_model(cls: Type[T], values: dict[str, Any]) -> T:
+    """Model built from trusted values without validation; unlike BaseModel.construct(), nested model fields
+    are constructed recursively and unknown values are dropped"""
+    fields_values: dict[str, Any] = dict()
+    fields_set = set[str]()
+    for name, field, nested_model in _constructed_fields(cls):
+        if field.alias in values:
+            value = values[field.alias]
+            if nested_model is not None and isinstance(value, dict):
+                value = construct_model(nested_model, value)
+            fields_values[name] = value
+            fields_set.add(name)
+        else:
+            fields_values[name] = field.get_default()
+    model = cls.__new__(cls)
+    object.__setattr__(model, "__dict__", fields_values)
+    object.__setattr__(model, "__fields_set__", fields_set)
+    model._init_private_attributes()
+    return model
+
+
 class DbSchemaModel(PydanticModel):
     db_id: PydanticObjectId = Field(default=UNSET_DB_ID, exclude=True)
 
@@ -117,6 +170,20 @@ class DbSchemaModel(PydanticModel):
             logger.exception("Error parsing data from db")
             raise web.HTTPInternalServerError(reason="Internal server error")
 
+    @classmethod
+    def from_trusted_mongo_db(cls: Type[T], raw: Any) -> T:
+        """Same as from_mongo_db(), but without validation, for hot paths reading documents written by us;
+        several times faster for large batches like parsha texts and comments. VALIDATE_DB_DOCUMENTS config
+        option switches it back to validation, e.g. to debug inconsistent data"""
+        if config.VALIDATE_DB_DOCUMENTS:
+            return cls.from_mongo_db(raw)  # type: ignore
+        try:
+            raw["db_id"] = PydanticObjectId(raw.pop("_id"))
+        except KeyError:
+            logger.exception("Error parsing data from db")
+            raise web.HTTPInternalServerError(reason="Internal server error")
+        return construct_model(cls, raw)
+
     def inserted_as(self: T, insert_one_result: InsertOneResult) -> T:
         return self.copy(update={"db_id": PydanticObjectId(insert_one_result.inserted_id)})
 
@@ -171,21 +238,23 @@ class SignupToken(DbSchemaModel):
 # user action models
 
 
+class TextCoords(PydanticModel):
+    parsha: int
+    chapter: int
+    verse: int
+
+
 class StarredComment(DbSchemaModel):
     comment_id: PydanticObjectId
     starrer_username: str
+    # denormalized from the comment on save, to query starred comments by parsha without joining comments
+    text_coords: Optional[TextCoords] = None
 
 
 class StarCommentRequest(PydanticModel):
     comment_id: PydanticObjectId
 
 
-class TextCoords(PydanticModel):
-    parsha: int
-    chapter: int
-    verse: int
-
-
 class EditTextRequest(PydanticModel):
     id: PydanticObjectId
     text: str
@@ -212,6 +281,14 @@ class StoredText(PublicIdDbSchemaModel):
     text: str
     language: str
     format: Format = "plain"  # default for texts stored before this field is introduced
+    # niqqud-insensitive shadow of Hebrew texts, indexed for search along with the text, not exposed from API
+    normalized_text: Optional[str] = Field(default=None, exclude=True)
+
+    def to_mongo_db(self) -> dict[str, Any]:
+        dump = super().to_mongo_db()
+        if self.normalized_text is not None:
+            dump["normalized_text"] = self.normalized_text
+        return dump
 
 
 class StoredComment(PublicIdDbSchemaModel):
@@ -225,9 +302,17 @@ class StoredComment(PublicIdDbSchemaModel):
     language: str
     index: int  # index within one source's comments
     legacy_id: Optional[str] = None
+    # same as StoredText.normalized_text, for anchor phrase and comment of Hebrew comments
+    normalized_comment: Optional[str] = Field(default=None, exclude=True)
 
     is_starred: Optional[bool] = None  # not set in DB, used when exposing data from API
 
+    def to_mongo_db(self) -> dict[str, Any]:
+        dump = super().to_mongo_db()
+        if self.normalized_comment is not None:
+            dump["normalized_comment"] = self.normalized_comment
+        return dump
+
 
 # user-authored verse-level comment
 
@@ -268,6 +353,17 @@ class SearchTextResult(PydanticModel):
     found_matches: list[FoundMatch]
     total_matched_texts: Optional[int]
     total_matched_comments: Optional[int]
+    # totals are capped at SEARCH_COUNT_CAP, i.e. the actual number of matches is at least the total
+    are_totals_capped: bool = False
+    # opaque cursor to request the next page with, None on the last page
+    next_cursor: Optional[str] = None
+
+    def iter_public_json_chunks(self) -> Iterator[bytes]:
+        """Same JSON as to_public_json(), one chunk per found match"""
+        yield b'{"found_matches":['
+        for idx, found_match in enumerate(self.found_matches):
+            yield (b"," if idx else b"") + found_match.to_public_json().encode("utf-8")
+        yield b"]," + self.json(by_alias=True, exclude={"found_matches"}).encode("utf-8")[1:]
 
 
 # starred comments looked up with the actual comment & verse data
@@ -287,6 +383,8 @@ class StarredCommentMetaResponse(PydanticModel):
 
 class StarredCommentLookupResponse(PydanticModel):
     starred_comments: list[StarredCommentData]
+    # opaque cursor to request the next page with, None on the last page
+    next_cursor: Optional[str] = None
 
 
 # filters for searching texts & comments
@@ -0,0 +1,185 @@
+import collections
+from typing import Any, NamedTuple, Optional
+
+from backend.model import (
+    ChapterData,
+    CommentData,
+    DisplayedUserComment,
+    ParshaData,
+    VerseData,
+)
+
+# Cached parsha data is shared between requests and must never be modified in place. Instead, user-specific
+# data is overlayed on top of it: only the containers on the path to the changed values are copied, everything
+# else (texts, comment lists without starred comments, etc) is shared with the cached object. To find these
+# paths without scanning the whole parsha, positions of verses and comments are indexed once per cached parsha.
+
+
+class VersePosition(NamedTuple):
+    chapter_idx: int
+    verse_idx: int
+
+
+class CommentPosition(NamedTuple):
+    chapter_idx: int
+    verse_idx: int
+    source: str
+    comment_idx: int
+
+
+class IndexedParshaData:
+    """Parsha data with positions of verses by (chapter, verse) numbers and of comments by their ids"""
+
+    __slots__ = ("parsha_data", "verse_positions", "comment_positions")
+
+    def __init__(self, parsha_data: ParshaData) -> None:
+        self.parsha_data = parsha_data
+        self.verse_positions = dict[tuple[int, int], VersePosition]()
+        self.comment_positions = dict[str, CommentPosition]()
+        for chapter_idx, chapter in enumerate(parsha_data["chapters"]):
+            for verse_idx, verse in enumerate(chapter["verses"]):
+                self.verse_positions[(chapter["chapter"], verse["verse"])] = VersePosition(chapter_idx, verse_idx)
+                for source, comments in verse["comments"].items():
+                    for comment_idx, comment in enumerate(comments):
+                        if "id" in comment:
+                            self.comment_positions[comment["id"]] = CommentPosition(
+                                chapter_idx, verse_idx, source, comment_idx
+                            )
+
+
+class _CopyOnWriteParshaData:
+    def __init__(self, parsha_data: ParshaData) -> None:
+        self.original = parsha_data
+        self.chapters = list(parsha_data["chapters"])
+        self.copied_chapter_idxs = set[int]()
+        self.copied_verses = set[VersePosition]()
+        self.copied_comment_lists = set[tuple[VersePosition, str]]()
+
+    def verse(self, position: VersePosition) -> VerseData:
+        chapter_idx, verse_idx = position
+        if chapter_idx not in self.copied_chapter_idxs:
+            chapter = self.chapters[chapter_idx]
+            self.chapters[chapter_idx] = ChapterData(chapter=chapter["chapter"], verses=list(chapter["verses"]))
+            self.copied_chapter_idxs.add(chapter_idx)
+        verses = self.chapters[chapter_idx]["verses"]
+        if position not in self.copied_verses:
+            verses[verse_idx] = verses[verse_idx].copy()
+            verses[verse_idx]["comments"] = verses[verse_idx]["comments"].copy()
+            self.copied_verses.add(position)
+        return verses[verse_idx]
+
+    def comments(self, position: VersePosition, source: str) -> list[CommentData]:
+        verse = self.verse(position)
+        if (position, source) not in self.copied_comment_lists:
+            verse["comments"][source] = list(verse["comments"][source])
+            self.copied_comment_lists.add((position, source))
+        return verse["comments"][source]
+
+    def result(self) -> ParshaData:
+        return ParshaData(book=self.original["book"], parsha=self.original["parsha"], chapters=self.chapters)
+
+
+def overlay_user_data(
+    indexed_parsha_data: IndexedParshaData,
+    starred_comment_ids: set[str],
+    user_comments: list[DisplayedUserComment],
+) -> ParshaData:
+    """Takes time proportional to the number of starred and user comments, not to the size of the parsha;
+    verses without user comments are left without "user_comments" key"""
+    overlay = _CopyOnWriteParshaData(indexed_parsha_data.parsha_data)
+
+    user_comments_by_position = collections.defaultdict[VersePosition, list[Any]](list)
+    for uc in user_comments:
+        verse_position = indexed_parsha_data.verse_positions.get((uc.text_coords.chapter, uc.text_coords.verse))
+        if verse_position is None:
+            continue
+        # ids and timestamps are left as is, serialization.dumps() encodes them the same way as pydantic does
+        user_comments_by_position[verse_position].append(uc.dict(by_alias=True))
+    for verse_position, verse_user_comments in user_comments_by_position.items():
+        overlay.verse(verse_position)["user_comments"] = verse_user_comments
+
+    for comment_id in starred_comment_ids:
+        comment_position = indexed_parsha_data.comment_positions.get(comment_id)
+        if comment_position is None:
+            continue
+        chapter_idx, verse_idx, source, comment_idx = comment_position
+        comments = overlay.comments(VersePosition(chapter_idx, verse_idx), source)
+        comments[comment_idx] = comments[comment_idx].copy()
+        comments[comment_idx]["is_starred_by_me"] = True
+
+    return overlay.result()
+
+
+def slice_parsha_data(
+    parsha_data: ParshaData, chapter: int, first_verse: Optional[int] = None, last_verse: Optional[int] = None
+) -> Optional[ParshaData]:
+    """Parsha data with a single chapter or a verse range in it, None if there are no such verses;
+    the verses are shared with the original, so it's safe to slice cached and overlayed parsha data alike"""
+    for chapter_data in parsha_data["chapters"]:
+        if chapter_data["chapter"] != chapter:
+            continue
+        verses = [
+            verse
+            for verse in chapter_data["verses"]
+            if (first_verse is None or verse["verse"] >= first_verse)
+            and (last_verse is None or verse["verse"] <= last_verse)
+        ]
+        if not verses:
+            return None
+        return ParshaData(
+            book=parsha_data["book"],
+            parsha=parsha_data["parsha"],
+            chapters=[ChapterData(chapter=chapter, verses=verses)],
+        )
+    return None
+
+
+class SourceFilter(NamedTuple):
+    """Text and comment sources to keep in parsha data, None to keep all of them"""
+
+    text_sources: Optional[frozenset[str]] = None
+    comment_sources: Optional[frozenset[str]] = None
+
+
+def filter_sources(parsha_data: ParshaData, source_filter: SourceFilter) -> ParshaData:
+    """Parsha data with only the given text and comment sources; verses are copied shallowly, so texts and comment
+    lists are shared with the original"""
+    text_sources, comment_sources = source_filter
+    chapters: list[ChapterData] = []
+    for chapter in parsha_data["chapters"]:
+        verses: list[VerseData] = []
+        for verse in chapter["verses"]:
+            filtered = verse.copy()
+            if text_sources is not None:
+                filtered["text"] = {k: v for k, v in verse["text"].items() if k in text_sources}
+                if "text_ids" in verse:
+                    filtered["text_ids"] = {k: v for k, v in verse["text_ids"].items() if k in text_sources}
+                if "text_formats" in verse:
+                    filtered["text_formats"] = {k: v for k, v in verse["text_formats"].items() if k in text_sources}
+            if comment_sources is not None:
+                filtered["comments"] = {k: v for k, v in verse["comments"].items() if k in comment_sources}
+            verses.append(filtered)
+        chapters.append(ChapterData(chapter=chapter["chapter"], verses=verses))
+    return ParshaData(book=parsha_data["book"], parsha=parsha_data["parsha"], chapters=chapters)
+
+
+class ParshaDataView(NamedTuple):
+    """Part of parsha data served as a separate response: a chapter or a verse range in it (the whole parsha if
+    chapter is None) with only some of the sources (all of them if source_filter is None)"""
+
+    chapter: Optional[int] = None
+    first_verse: Optional[int] = None
+    last_verse: Optional[int] = None
+    source_filter: Optional[SourceFilter] = None
+
+    def apply(self, parsha_data: ParshaData) -> Optional[ParshaData]:
+        """Parsha data as seen through the view, None if there are no such verses"""
+        view_data: Optional[ParshaData] = parsha_data
+        if self.chapter is not None:
+            view_data = slice_parsha_data(parsha_data, self.chapter, self.first_verse, self.last_verse)
+        if view_data is not None and self.source_filter is not None:
+            view_data = filter_sources(view_data, self.source_filter)
+        return view_data
+
+
+WHOLE_PARSHA = ParshaDataView()
@@ -0,0 +1,66 @@
+import re
+import unicodedata
+from typing import Callable, NamedTuple
+
+# cantillation marks (U+0591-U+05AF) and niqqud points (U+05B0-U+05C7), excluding punctuation: maqaf (U+05BE),
+# paseq (U+05C0), sof pasuq (U+05C3) and nun hafukha (U+05C6); they are not word characters, so without stripping
+# a pointed word is split into fragments
+HEBREW_MARKS_RE = re.compile("[\u0591-\u05bd\u05bf\u05c1\u05c2\u05c4\u05c5\u05c7]")
+
+token_re = re.compile(r"\w+")
+
+
+HEBREW_FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+
+
+def normalize_hebrew(text: str) -> str:
+    """Strip niqqud and cantillation marks and fold final letter forms, so that pointed text from the sources
+    matches unpointed queries"""
+    return HEBREW_MARKS_RE.sub("", text).translate(HEBREW_FINAL_LETTERS)
+
+
+def _normalize_russian(text: str) -> str:
+    return text.replace("ё", "е")
+
+
+NORMALIZERS: dict[str, list[Callable[[str], str]]] = {
+    "he": [normalize_hebrew],
+    "ru": [_normalize_russian],
+    "en": [],
+}
+
+
+def normalize(text: str, language: str) -> str:
+    """Normalize text for indexing or querying; for unknown languages (e.g. an undetected query language)
+    all normalizers are applied, which is safe since each of them only touches its own script"""
+    text = unicodedata.normalize("NFC", text).lower()
+    normalizers = NORMALIZERS.get(language)
+    if normalizers is None:
+        normalizers = [n for language_normalizers in NORMALIZERS.values() for n in language_normalizers]
+    for normalizer in normalizers:
+        text = normalizer(text)
+    return text
+
+
+def tokenize(text: str, language: str) -> list[str]:
+    return token_re.findall(normalize(text, language))
+
+
+class ParsedQuery(NamedTuple):
+    """Query in Mongo's $text syntax: documents matching any of the terms, all "quoted phrases"
+    and none of the -negated terms"""
+
+    terms: list[str]
+    phrases: list[list[str]]
+    negated_terms: list[str]
+
+
+def parse_query(query: str, language: str) -> ParsedQuery:
+    phrases = [tokenize(p, language) for p in re.findall(r'"([^"]+)"', query)]
+    phrases = [p for p in phrases if p]
+    query_wo_phrases = re.sub(r'"[^"]*"', " ", query)
+    negated_terms = tokenize(" ".join(re.findall(r"(?:^|\s)-(\S+)", query_wo_phrases)), language)
+    terms = tokenize(re.sub(r"(?:^|\s)-\S+", " ", query_wo_phrases), language)
+    for phrase in phrases:
+        terms.extend(phrase)
+    return ParsedQuery(terms=list(dict.fromkeys(terms)), phrases=phrases, negated_terms=negated_terms)
@@ -0,0 +1,120 @@
+import logging
+import time
+from pathlib import Path
+from typing import Iterable, Literal
+
+import bson
+
+from backend.metadata import get_comment_source_language, get_text_source_language
+from backend.model import StoredComment, StoredText
+from backend.search.analysis import parse_query, tokenize
+from backend.search.index import InvertedIndex, SearchHit
+
+logger = logging.getLogger(__name__)
+
+# index names match Mongo collection names
+IndexName = Literal["texts", "comments"]
+
+
+def text_language(text: StoredText) -> str:
+    try:
+        return get_text_source_language(text.text_source)
+    except ValueError:
+        return text.language
+
+
+def comment_language(comment: StoredComment) -> str:
+    try:
+        return get_comment_source_language(comment.comment_source)
+    except ValueError:
+        return comment.language
+
+
+def comment_searchable_text(comment: StoredComment) -> str:
+    return f"{comment.anchor_phrase or ''}\n{comment.comment}"
+
+
+class SearchEngine:
+    """In-process full text search over texts and comments, an alternative to Mongo $text indices with language-aware
+    tokenization (e.g. Hebrew is searched regardless of niqqud) and BM25 ranking; kept up to date by the database
+    on every write and persisted to a directory with an index file per collection"""
+
+    def __init__(self, texts_index: InvertedIndex, comments_index: InvertedIndex) -> None:
+        self.indices: dict[IndexName, InvertedIndex] = {"texts": texts_index, "comments": comments_index}
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}({len(self.indices['texts'])} texts, {len(self.indices['comments'])} comments)"
+        )
+
+    @classmethod
+    def build(cls, texts: Iterable[StoredText], comments: Iterable[StoredComment]) -> "SearchEngine":
+        start = time.monotonic()
+        engine = SearchEngine(InvertedIndex(), InvertedIndex())
+        for text in texts:
+            engine.add_text(text)
+        for comment in comments:
+            engine.add_comment(comment)
+        logger.info(f"Built {engine} in {time.monotonic() - start:.2f} sec")
+        return engine
+
+    @classmethod
+    def load(cls, directory: Path) -> "SearchEngine":
+        start = time.monotonic()
+        engine = SearchEngine(
+            texts_index=InvertedIndex.load(directory / "texts.idx"),
+            comments_index=InvertedIndex.load(directory / "comments.idx"),
+        )
+        logger.info(f"Loaded {engine} from {directory} in {time.monotonic() - start:.2f} sec")
+        return engine
+
+    def save(self, directory: Path) -> dict[IndexName, int]:
+        """Modification counters of the indices as of the start of saving, see load_compacted()"""
+        start = time.monotonic()
+        saved_modifications = {name: index.modifications for name, index in self.indices.items()}
+        for name, index in self.indices.items():
+            index.save(directory / f"{name}.idx")
+        logger.info(f"Saved {self} to {directory} in {time.monotonic() - start:.2f} sec")
+        return saved_modifications
+
+    def load_compacted(
+        self, directory: Path, saved_modifications: dict[IndexName, int]
+    ) -> dict[IndexName, InvertedIndex]:
+        """Saved indices with too many tombstones in memory, loaded again without them; indices modified since
+        they were saved are skipped, as their files do not have the latest changes"""
+        return {
+            name: InvertedIndex.load(directory / f"{name}.idx")
+            for name, index in self.indices.items()
+            if index.needs_compaction() and index.modifications == saved_modifications[name]
+        }
+
+    def replace_compacted(
+        self, compacted: dict[IndexName, InvertedIndex], saved_modifications: dict[IndexName, int]
+    ) -> None:
+        """Use the indices from load_compacted() unless the current ones were modified while they were loaded"""
+        for name, compacted_index in compacted.items():
+            if self.indices[name].modifications == saved_modifications[name]:
+                dropped_count = len(self.indices[name].doc_ids) - len(compacted_index)
+                logger.info(f"Compacted {name} index, dropped {dropped_count} removed document(s)")
+                self.indices[name] = compacted_index
+
+    def add_text(self, text: StoredText) -> None:
+        coords = (text.text_coords.parsha, text.text_coords.chapter, text.text_coords.verse)
+        self.indices["texts"].add(text.db_id, coords, tokenize(text.text, text_language(text)))
+
+    def add_comment(self, comment: StoredComment) -> None:
+        coords = (comment.text_coords.parsha, comment.text_coords.chapter, comment.text_coords.verse)
+        tokens = tokenize(comment_searchable_text(comment), comment_language(comment))
+        self.indices["comments"].add(comment.db_id, coords, tokens)
+
+    def remove(self, index_name: IndexName, doc_id: bson.ObjectId) -> None:
+        self.indices[index_name].remove(doc_id)
+
+    def remove_parsha(self, parsha: int) -> None:
+        for index in self.indices.values():
+            for doc_id in index.doc_ids_in_parsha(parsha):
+                index.remove(doc_id)
+
+    def search(self, index_name: IndexName, query: str, language: str) -> list[SearchHit]:
+        """Unordered hits for a query in Mongo $text syntax"""
+        return self.indices[index_name].search(parse_query(query, language))
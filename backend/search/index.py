@@ -0,0 +1,266 @@
+import collections
+import itertools
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+import bson
+
+from backend.search.analysis import ParsedQuery
+
+# BM25 parameters, the usual defaults
+K1 = 1.2
+B = 0.75
+# share of removed documents in the index after which it is worth reloading it from the saved file to drop them
+COMPACTION_TOMBSTONES_RATIO = 0.25
+
+FILE_MAGIC = b"TRIDX001"
+HEADER_LENGTH_FORMAT = "<I"
+OBJECT_ID_SIZE = 12
+
+
+class SearchHit(NamedTuple):
+    doc_id: bson.ObjectId
+    score: float
+    coords: tuple[int, int, int]
+
+
+# document number -> positions of the term in the document
+Postings = dict[int, array]
+
+
+class InvertedIndex:
+    """Positional inverted index with BM25 ranking. Documents are numbered in the order they are added; removed
+    documents leave tombstones in the postings, that are dropped when the index is saved (and from memory when the
+    saved index is loaded again, see needs_compaction()).
+
+    Saved index is a single file with a JSON header followed by flat uint32 arrays: document lengths, coords and
+    postings of all terms, each one encoded as (document number, term frequency, positions...) runs. On load,
+    the file is memory-mapped and postings of a term are decoded only when the term is first queried or updated,
+    so loading takes time proportional to the number of documents, not to the size of the index"""
+
+    def __init__(self) -> None:
+        self.doc_ids: list[Optional[bson.ObjectId]] = []  # None for removed documents
+        self.docnos_by_id: dict[bson.ObjectId, int] = dict()
+        self.doc_lengths = array("I")
+        self.doc_coords = array("I")  # (parsha, chapter, verse) triplets
+        self.total_length = 0  # of documents in the index
+        self.modifications = 0  # number of add / remove calls that changed the index
+        self._postings: dict[str, Postings] = dict()
+        # term -> (offset, length) of its encoded postings in the memory-mapped file
+        self._mapped_postings: dict[str, tuple[int, int]] = dict()
+        self._mapped: Optional[memoryview] = None
+
+    def __len__(self) -> int:
+        return len(self.docnos_by_id)
+
+    def __contains__(self, doc_id: bson.ObjectId) -> bool:
+        return doc_id in self.docnos_by_id
+
+    def coords(self, docno: int) -> tuple[int, int, int]:
+        parsha, chapter, verse = self.doc_coords[3 * docno : 3 * docno + 3]  # noqa: E203
+        return parsha, chapter, verse
+
+    def needs_compaction(self) -> bool:
+        return len(self.doc_ids) - len(self.docnos_by_id) > COMPACTION_TOMBSTONES_RATIO * len(self.doc_ids)
+
+    def doc_ids_in_parsha(self, parsha: int) -> list[bson.ObjectId]:
+        return [doc_id for doc_id, docno in self.docnos_by_id.items() if self.doc_coords[3 * docno] == parsha]
+
+    def add(self, doc_id: bson.ObjectId, coords: tuple[int, int, int], tokens: list[str]) -> None:
+        """Add a document or replace the previously added one with the same id"""
+        self.remove(doc_id)
+        docno = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.docnos_by_id[doc_id] = docno
+        self.doc_lengths.append(len(tokens))
+        self.doc_coords.extend(coords)
+        self.total_length += len(tokens)
+        self.modifications += 1
+
+        positions_by_term = collections.defaultdict[str, array](lambda: array("I"))
+        for position, term in enumerate(tokens):
+            positions_by_term[term].append(position)
+        for term, positions in positions_by_term.items():
+            postings = self._term_postings(term)
+            if postings is None:
+                postings = self._postings[term] = dict()
+            postings[docno] = positions
+
+    def remove(self, doc_id: bson.ObjectId) -> None:
+        docno = self.docnos_by_id.pop(doc_id, None)
+        if docno is None:
+            return
+        self.doc_ids[docno] = None
+        self.total_length -= self.doc_lengths[docno]
+        self.modifications += 1
+
+    def _term_postings(self, term: str) -> Optional[Postings]:
+        postings = self._postings.get(term)
+        if postings is not None:
+            return postings
+        mapped = self._mapped_postings.get(term)
+        if mapped is None:
+            return None
+        postings = self._decode_postings(*mapped)
+        # added before removal from the mapped ones, so that a concurrent save() sees the term at least once
+        self._postings[term] = postings
+        self._mapped_postings.pop(term, None)
+        return postings
+
+    def _decode_postings(self, offset: int, length: int) -> Postings:
+        assert self._mapped is not None
+        data = self._mapped[offset : offset + length]  # noqa: E203
+        postings: Postings = dict()
+        idx = 0
+        while idx < length:
+            docno, frequency = data[idx], data[idx + 1]
+            postings[docno] = array("I", data[idx + 2 : idx + 2 + frequency])  # noqa: E203
+            idx += 2 + frequency
+        return postings
+
+    def _live_postings(self, term: str) -> Postings:
+        postings = self._term_postings(term) or {}
+        return {docno: positions for docno, positions in postings.items() if self.doc_ids[docno] is not None}
+
+    def search(self, query: ParsedQuery) -> list[SearchHit]:
+        if not self.docnos_by_id:
+            return []
+        average_length = self.total_length / len(self.docnos_by_id)
+        postings_by_term = {term: self._live_postings(term) for term in query.terms}
+
+        scores = collections.defaultdict[int, float](float)
+        for postings in postings_by_term.values():
+            idf = math.log(1 + (len(self.docnos_by_id) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for docno, positions in postings.items():
+                frequency = len(positions)
+                length_norm = 1 - B + B * self.doc_lengths[docno] / average_length
+                scores[docno] += idf * frequency * (K1 + 1) / (frequency + K1 * length_norm)
+        for term in query.negated_terms:
+            for docno in self._live_postings(term):
+                scores.pop(docno, None)
+        for phrase in query.phrases:
+            scores = collections.defaultdict(
+                float,
+                {
+                    docno: score
+                    for docno, score in scores.items()
+                    if self._contains_phrase(docno, phrase, postings_by_term)
+                },
+            )
+
+        hits = list[SearchHit]()
+        for docno, score in scores.items():
+            doc_id = self.doc_ids[docno]
+            if doc_id is not None:
+                hits.append(SearchHit(doc_id=doc_id, score=score, coords=self.coords(docno)))
+        return hits
+
+    def _contains_phrase(self, docno: int, phrase: list[str], postings_by_term: dict[str, Postings]) -> bool:
+        positions_sets = []
+        for term in phrase:
+            positions = postings_by_term[term].get(docno)
+            if positions is None:
+                return False
+            positions_sets.append(set(positions))
+        return any(
+            all(start + offset in positions_sets[offset] for offset in range(1, len(phrase)))
+            for start in positions_sets[0]
+        )
+
+    # persistence
+
+    def save(self, path: Path) -> None:
+        """Write the index to a temporary file and atomically replace the target; postings are snapshotted term by
+        term, so the index may be modified concurrently (the changes will be picked up by the next save)"""
+        # mapped postings are listed before decoded ones, see _term_postings
+        mapped_postings = list(self._mapped_postings.items())
+        decoded_postings = list(self._postings.items())
+        decoded_terms = {term for term, _ in decoded_postings}
+
+        new_docnos: dict[int, int] = dict()
+        doc_ids = bytearray()
+        doc_lengths = array("I")
+        doc_coords = array("I")
+        for docno, doc_id in enumerate(list(self.doc_ids)):
+            if doc_id is None:
+                continue
+            new_docnos[docno] = len(new_docnos)
+            doc_ids.extend(doc_id.binary)
+            doc_lengths.append(self.doc_lengths[docno])
+            doc_coords.extend(self.coords(docno))
+
+        encoded_postings = array("I")
+        terms: dict[str, tuple[int, int]] = dict()
+        all_postings: Iterable[tuple[str, Postings]] = itertools.chain(
+            ((term, self._decode_postings(*mapped)) for term, mapped in mapped_postings if term not in decoded_terms),
+            decoded_postings,
+        )
+        for term, postings in all_postings:
+            offset = len(encoded_postings)
+            for docno, positions in list(postings.items()):
+                new_docno = new_docnos.get(docno)
+                if new_docno is None:
+                    continue
+                encoded_postings.extend((new_docno, len(positions)))
+                encoded_postings.extend(positions)
+            if len(encoded_postings) > offset:
+                terms[term] = (offset, len(encoded_postings) - offset)
+
+        header = json.dumps(
+            {"byteorder": sys.byteorder, "doc_count": len(new_docnos), "terms": terms}, ensure_ascii=False
+        ).encode("utf-8")
+        header += b" " * (-(len(FILE_MAGIC) + 4 + len(header)) % 4)  # aligning uint32 arrays
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(FILE_MAGIC)
+            f.write(struct.pack(HEADER_LENGTH_FORMAT, len(header)))
+            f.write(header)
+            f.write(doc_ids)
+            f.write(b"\0" * (-len(doc_ids) % 4))
+            f.write(doc_lengths.tobytes())
+            f.write(doc_coords.tobytes())
+            f.write(encoded_postings.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "InvertedIndex":
+        """Raises FileNotFoundError for missing and ValueError for incompatible index files"""
+        with open(path, "rb") as f:
+            if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                raise ValueError(f"Not a search index file: {path}")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = len(FILE_MAGIC)
+        (header_length,) = struct.unpack_from(HEADER_LENGTH_FORMAT, mapped, offset)
+        offset += 4
+        header = json.loads(mapped[offset : offset + header_length])  # noqa: E203
+        offset += header_length
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"Search index was saved on a platform with {header['byteorder']} byte order")
+        doc_count = header["doc_count"]
+
+        index = InvertedIndex()
+        for docno in range(doc_count):
+            doc_id = bson.ObjectId(bytes(mapped[offset : offset + OBJECT_ID_SIZE]))  # noqa: E203
+            index.doc_ids.append(doc_id)
+            index.docnos_by_id[doc_id] = docno
+            offset += OBJECT_ID_SIZE
+        offset += -offset % 4
+        index.doc_lengths.frombytes(mapped[offset : offset + 4 * doc_count])  # noqa: E203
+        offset += 4 * doc_count
+        index.doc_coords.frombytes(mapped[offset : offset + 12 * doc_count])  # noqa: E203
+        offset += 12 * doc_count
+        index.total_length = sum(index.doc_lengths)
+        index._mapped = memoryview(mapped)[offset:].cast("I")
+        index._mapped_postings = {
+            term: (term_offset, length) for term, (term_offset, length) in header["terms"].items()
+        }
+        return index
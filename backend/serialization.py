@@ -0,0 +1,215 @@
+import datetime
+import gzip
+import json
+import logging
+import zlib
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Protocol,
+    cast,
+)
+
+import bson
+
+try:
+    import brotli  # type: ignore
+except ImportError:
+    brotli = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+from backend import config
+
+if TYPE_CHECKING:  # model uses this module to serialize pydantic models
+    from backend.model import ParshaData
+
+logger = logging.getLogger(__name__)
+
+
+IDENTITY = "identity"
+
+
+Default = Callable[[Any], Any]
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, bson.ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+def _json_dumps(obj: Any, default: Optional[Default]) -> bytes:
+    # non-ascii characters are encoded as-is because most of our texts are in Russian and Hebrew,
+    # and \uXXXX escapes triple the body size
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default or _default).encode("utf-8")
+
+
+def _orjson_dumps(obj: Any, default: Optional[Default]) -> bytes:
+    # datetimes are serialized natively in the same ISO format, int keys are allowed for parity with json
+    return orjson.dumps(obj, default=default or _default, option=orjson.OPT_NON_STR_KEYS)
+
+
+JSON_ENCODERS: dict[str, Callable[[Any, Optional[Default]], bytes]] = {"json": _json_dumps}
+if orjson is not None:
+    JSON_ENCODERS["orjson"] = _orjson_dumps
+
+
+def dumps(obj: Any, default: Optional[Default] = None) -> bytes:
+    """Compact UTF-8 JSON with the configured encoder, falling back to the stdlib one if it is not installed;
+    default is called for objects the encoder does not support, ObjectIds and datetimes are supported anyway"""
+    return JSON_ENCODERS.get(config.JSON_ENCODER, _json_dumps)(obj, default)
+
+
+def dumps_str(obj: Any, *, default: Optional[Default] = None) -> str:
+    """Same as dumps(), for pydantic models' Config.json_dumps"""
+    return dumps(obj, default).decode("utf-8")
+
+
+def iter_parsha_data_chunks(parsha_data: "ParshaData") -> Iterator[bytes]:
+    """Same JSON as dumps(parsha_data), one chunk per chapter, to stream large parshas without materializing the
+    whole body"""
+    yield b"{"
+    for idx, (key, value) in enumerate(cast(dict[str, Any], parsha_data).items()):
+        yield (b"," if idx else b"") + dumps(key) + b":"
+        if key != "chapters":
+            yield dumps(value)
+            continue
+        yield b"["
+        for chapter_idx, chapter in enumerate(parsha_data["chapters"]):
+            yield (b"," if chapter_idx else b"") + dumps(chapter)
+        yield b"]"
+    yield b"}"
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=6)
+
+
+def _brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=5)
+
+
+COMPRESSORS = {"gzip": _gzip}
+if brotli is not None:
+    COMPRESSORS["br"] = _brotli
+
+
+class StreamCompressor(Protocol):
+    def compress(self, chunk: bytes) -> bytes:
+        """Compressed data for the chunk, flushed so that the client can decode the stream up to its end"""
+        ...
+
+    def finish(self) -> bytes:
+        ...
+
+
+class _IdentityStreamCompressor:
+    def compress(self, chunk: bytes) -> bytes:
+        return chunk
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _GzipStreamCompressor:
+    def __init__(self) -> None:
+        self._compressobj = zlib.compressobj(level=6, wbits=16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressobj.compress(chunk) + self._compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressobj.flush(zlib.Z_FINISH)
+
+
+class _BrotliStreamCompressor:
+    def __init__(self) -> None:
+        self._compressor = brotli.Compressor(quality=5)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+STREAM_COMPRESSORS: dict[str, type[StreamCompressor]] = {"gzip": _GzipStreamCompressor}
+if brotli is not None:
+    STREAM_COMPRESSORS["br"] = _BrotliStreamCompressor
+
+
+def supported_content_encodings() -> list[str]:
+    return [ce for ce in config.RESPONSE_CONTENT_ENCODINGS if ce in COMPRESSORS]
+
+
+def _accept_encoding_qvalues(accept_encoding: str) -> dict[str, float]:
+    """Content coding -> its quality value from Accept-Encoding header value; malformed values are taken as 0"""
+    qvalues: dict[str, float] = dict()
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        qvalue = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[coding] = qvalue
+    return qvalues
+
+
+def choose_content_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick a supported compression from Accept-Encoding header value, None means identity (no compression).
+    The compression with the highest quality value is picked (by our preference order if there's a tie) unless
+    identity is listed with a higher one. "*" covers the codings not listed explicitly, including identity. If no
+    supported compression is acceptable, identity is used even if the client refuses it: RFC 9110 allows to
+    disregard the header instead of responding with 406 Not Acceptable"""
+    qvalues = _accept_encoding_qvalues(accept_encoding)
+    wildcard_qvalue = qvalues.get("*", 0.0)
+    # identity is acceptable by default, but preferred only if the client says so
+    identity_qvalue = qvalues.get(IDENTITY, wildcard_qvalue)
+    best_content_encoding: Optional[str] = None
+    best_qvalue = 0.0
+    for content_encoding in supported_content_encodings():
+        qvalue = qvalues.get(content_encoding, wildcard_qvalue)
+        if qvalue > best_qvalue:
+            best_content_encoding, best_qvalue = content_encoding, qvalue
+    if best_content_encoding is None or best_qvalue < identity_qvalue:
+        return None
+    return best_content_encoding
+
+
+def compress(body: bytes, content_encoding: Optional[str]) -> bytes:
+    if content_encoding is None or content_encoding == IDENTITY:
+        return body
+    return COMPRESSORS[content_encoding](body)
+
+
+def compress_stream(chunks: Iterable[bytes], content_encoding: Optional[str]) -> Iterator[bytes]:
+    """Compressed chunks, each one decodable by the client as soon as it is received; empty ones are skipped"""
+    compressor: StreamCompressor = (
+        _IdentityStreamCompressor()
+        if content_encoding is None or content_encoding == IDENTITY
+        else STREAM_COMPRESSORS[content_encoding]()
+    )
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    tail = compressor.finish()
+    if tail:
+        yield tail
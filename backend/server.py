@@ -1,19 +1,22 @@
 import asyncio
+import contextlib
 import datetime
 import json
 import logging
 import re
 import secrets
-from typing import NoReturn, Optional, cast
+import time
+from typing import Any, Iterable, Mapping, NoReturn, Optional, cast
 
 import bson
 from aiohttp import hdrs, web
-from aiohttp.typedefs import Handler
+from aiohttp.helpers import ETAG_ANY, ETag
 from dictdiffer import diff  # type: ignore
 
-from backend import config
+from backend import config, serialization
 from backend.auth import generate_signup_token, hash_password
 from backend.constants import ACCESS_TOKEN_HEADER, SIGNUP_TOKEN_HEADER, AppExtensions
+from backend.database.cache import content_hash, encoded_parsha_data
 from backend.database.interface import (
     DatabaseInterface,
     SearchTextIn,
@@ -22,7 +25,6 @@ from backend.database.interface import (
 from backend.metadata.neviim import NEVIIM_METADATA
 from backend.metadata.torah import TORAH_METADATA
 from backend.model import (
-    DisplayedUserComment,
     EditCommentRequest,
     EditTextRequest,
     NewUser,
@@ -39,19 +41,17 @@ from backend.model import (
     UserCommentPayload,
     UserCredentials,
 )
+from backend.overlay import ParshaDataView, SourceFilter, overlay_user_data
+from backend.serialization import choose_content_encoding, supported_content_encodings
 from backend.utils import safe_request_json, worst_language_detection_ever
 
 logger = logging.getLogger(__name__)
 routes = web.RouteTableDef()
 
 
-@web.middleware
-async def cors_middleware(request: web.Request, handler: Handler) -> web.StreamResponse:
-    try:
-        resp = await handler(request)
-    except web.HTTPException as e:
-        resp = e
-
+async def add_cors_headers(request: web.Request, response: web.StreamResponse) -> None:
+    """Called on response prepare rather than as a middleware, because streamed responses send their headers
+    before the handler returns"""
     allowed_origins = [
         "https://torah-reading.surge.sh",
         "http://torah-reading.surge.sh",
@@ -63,18 +63,13 @@ async def cors_middleware(request: web.Request, handler: Handler) -> web.StreamR
     logger.debug(f"CORS: request origin = {request_origin}")
     if request_origin is not None:
         origin = request_origin if request_origin in allowed_origins else allowed_origins[0]
-        resp.headers[hdrs.ACCESS_CONTROL_ALLOW_ORIGIN] = origin
+        response.headers[hdrs.ACCESS_CONTROL_ALLOW_ORIGIN] = origin
         logger.debug(f"CORS: response Access-Control-Allow-Origin set to {origin}")
-        resp.headers[
+        response.headers[
             hdrs.ACCESS_CONTROL_ALLOW_HEADERS
         ] = f"{hdrs.CONTENT_TYPE},{SIGNUP_TOKEN_HEADER},{ACCESS_TOKEN_HEADER}"
-        resp.headers[hdrs.ACCESS_CONTROL_ALLOW_METHODS] = "GET,POST,PUT,DELETE,OPTIONS"
-        resp.headers[hdrs.ACCESS_CONTROL_MAX_AGE] = "300"
-
-    if isinstance(resp, web.HTTPException):
-        raise resp
-    else:
-        return resp
+        response.headers[hdrs.ACCESS_CONTROL_ALLOW_METHODS] = "GET,POST,PUT,DELETE,OPTIONS"
+        response.headers[hdrs.ACCESS_CONTROL_MAX_AGE] = "300"
 
 
 @routes.options("/{wildcard:.*}")
@@ -110,7 +105,7 @@ async def get_metadata(request: web.Request) -> web.Response:
         user_json = None
 
     db = get_db(request)
-    return web.json_response(
+    body = serialization.dumps(
         {
             "sections": {
                 "torah": TORAH_METADATA.dict(),
@@ -120,64 +115,208 @@ async def get_metadata(request: web.Request) -> web.Response:
             "logged_in_user": user_json,
         }
     )
+    # response depends on the logged in user, so the validator is computed from the body itself
+    response = conditional_json_response(
+        request, body=body, etag=content_hash(body), cache_control=config.METADATA_CACHE_CONTROL
+    )
+    response.headers[hdrs.VARY] = ACCESS_TOKEN_HEADER
+    return response
 
 
-@routes.get("/parsha/{index}")
-async def get_parsha(request: web.Request) -> web.Response:
-    parsha_index_str = request.match_info.get("index")
-    if parsha_index_str is None:
-        raise web.HTTPNotFound(reason="No parsha index in request path")
+def json_response(data: Any) -> web.Response:
+    return web.Response(body=serialization.dumps(data), content_type="application/json", charset="utf-8")
+
+
+def is_not_modified(request: web.Request, etag: str) -> bool:
+    # no Last-Modified / If-Modified-Since: content hash ETags are exact, while timestamps with second precision
+    # can't tell apart two versions saved within the same second
+    if request.if_none_match is None:
+        return False
+    return any(request_etag.value == etag or request_etag.value == ETAG_ANY for request_etag in request.if_none_match)
+
+
+def conditional_json_response(
+    request: web.Request,
+    body: bytes,
+    etag: str,
+    cache_control: str,
+    content_encoding: Optional[str] = None,
+) -> web.Response:
+    """Response with HTTP validators set, answering 304 Not Modified if the client already has the same body"""
+    if is_not_modified(request, etag):
+        response = web.Response(status=web.HTTPNotModified.status_code)
+    else:
+        response = web.Response(body=body, content_type="application/json", charset="utf-8")
+        if content_encoding is not None:
+            response.headers[hdrs.CONTENT_ENCODING] = content_encoding
+    response.etag = ETag(value=etag)
+    response.headers[hdrs.CACHE_CONTROL] = cache_control
+    return response
+
+
+async def streamed_json_response(
+    request: web.Request, chunks: Iterable[bytes], headers: Optional[Mapping[str, str]] = None
+) -> web.StreamResponse:
+    """Response body sent with chunked transfer encoding as the chunks are produced, compressed if the client
+    accepts it; for large bodies that are not cached, so that they are never held in memory as a whole"""
+    content_encoding = choose_content_encoding(request.headers.get(hdrs.ACCEPT_ENCODING, ""))
+    response = web.StreamResponse(headers={hdrs.VARY: hdrs.ACCEPT_ENCODING, **(headers or {})})
+    response.content_type = "application/json"
+    response.charset = "utf-8"
+    if content_encoding is not None:
+        response.headers[hdrs.CONTENT_ENCODING] = content_encoding
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    for chunk in serialization.compress_stream(chunks, content_encoding):
+        await response.write(chunk)
+    await response.write_eof()
+    return response
+
+
+def _int_path_param(request: web.Request, name: str, description: str) -> int:
+    value = request.match_info.get(name)
+    if value is None:
+        raise web.HTTPNotFound(reason=f"No {description.lower()} in request path")
     try:
-        parsha_index = int(parsha_index_str)
+        return int(value)
     except Exception:
-        raise web.HTTPBadRequest(reason="Parsha index must be a number")
+        raise web.HTTPBadRequest(reason=f"{description} must be a number")
 
+
+def _sources_query_param(request: web.Request, name: str) -> Optional[frozenset[str]]:
+    """Comma-separated source keys, None if the param is not specified (i.e. all sources)"""
+    value = request.query.get(name)
+    if value is None:
+        return None
+    return frozenset(source.strip() for source in value.split(",") if source.strip())
+
+
+def _source_filter(request: web.Request) -> Optional[SourceFilter]:
+    source_filter = SourceFilter(
+        text_sources=_sources_query_param(request, "text_sources"),
+        comment_sources=_sources_query_param(request, "comment_sources"),
+    )
+    if source_filter.text_sources is None and source_filter.comment_sources is None:
+        return None
+    return source_filter
+
+
+@routes.get("/parsha/{index}")
+async def get_parsha(request: web.Request) -> web.StreamResponse:
+    return await _parsha_data_response(request, parsha_index=_int_path_param(request, "index", "Parsha index"))
+
+
+@routes.get("/parsha/{index}/chapters/{chapter}")
+async def get_parsha_chapter(request: web.Request) -> web.StreamResponse:
+    return await _parsha_data_response(
+        request,
+        parsha_index=_int_path_param(request, "index", "Parsha index"),
+        chapter=_int_path_param(request, "chapter", "Chapter"),
+    )
+
+
+@routes.get(r"/parsha/{index}/chapters/{chapter}/verses/{first_verse:\d+}-{last_verse:\d+}")
+async def get_parsha_verses(request: web.Request) -> web.StreamResponse:
+    first_verse = _int_path_param(request, "first_verse", "First verse")
+    last_verse = _int_path_param(request, "last_verse", "Last verse")
+    if first_verse > last_verse:
+        raise web.HTTPBadRequest(reason="Verse range must not be empty")
+    return await _parsha_data_response(
+        request,
+        parsha_index=_int_path_param(request, "index", "Parsha index"),
+        chapter=_int_path_param(request, "chapter", "Chapter"),
+        first_verse=first_verse,
+        last_verse=last_verse,
+    )
+
+
+async def _parsha_data_response(
+    request: web.Request,
+    parsha_index: int,
+    chapter: Optional[int] = None,
+    first_verse: Optional[int] = None,
+    last_verse: Optional[int] = None,
+) -> web.StreamResponse:
+    """Whole parsha or its chapter / verse range, optionally with user-specific data and only some of the text and
+    comment sources; parts are sliced from the same cached parsha data"""
     db = get_db(request)
-    parsha_data = await db.get_parsha_data(parsha_index)
-    if parsha_data is None:
-        raise web.HTTPNotFound(reason="Parsha is not available")
+    view = ParshaDataView(chapter, first_verse, last_verse, source_filter=_source_filter(request))
 
     # optional query param things
     add_my_starred_comments = request.query.get("my_starred_comments")
     add_user_comments = request.query.get("add_user_comments")
-    if any(query_param is not None for query_param in (add_my_starred_comments, add_user_comments)):
-        logger.info(f"Adding user-specific data to parsha: {add_my_starred_comments = } {add_user_comments = }")
-        try:
-            user, _ = await get_authorized_user(request)
-
-            starred_comment_ids = set[str]()
-            if add_my_starred_comments == "true":
-                starred_comment_ids = {
-                    str(c.comment_id)
-                    for c in await db.lookup_starred_comments(
-                        starrer_username=user.username,
-                        parsha=parsha_index,
-                    )
-                }
-                logger.info(f"Found {len(starred_comment_ids)} starred comment(s)")
-
-            user_comments: list[DisplayedUserComment] = []
-            if add_user_comments == "mine":
-                user_comments = await db.lookup_user_comments(username=user.username, parsha=parsha_index)
-
-            # inserting the stuff we found into the parsha data
-            for chapter in parsha_data["chapters"]:
-                chapter_user_comments = [uc for uc in user_comments if uc.text_coords.chapter == chapter["chapter"]]
-                for verse in chapter["verses"]:
-                    verse["user_comments"] = [
-                        # HACK: this is TERRIBLE but I am not going to fix it until a proper refactoring!!! sorry!!!!!!
-                        json.loads(uc.json())  # type: ignore
-                        for uc in chapter_user_comments
-                        if uc.text_coords.verse == verse["verse"]
-                    ]
-                    for _, comments in verse["comments"].items():
-                        for comment in comments:
-                            if comment["id"] in starred_comment_ids:
-                                comment["is_starred_by_me"] = True
-        except Exception:
-            logger.info("Failed to add user-specific data to parsha, will return without it", exc_info=True)
-
-    return web.json_response(parsha_data)
+    with_user_data = add_my_starred_comments is not None or add_user_comments is not None
+    if not with_user_data:
+        # no user-specific data, serving pre-serialized response body
+        content_encoding = choose_content_encoding(request.headers.get(hdrs.ACCEPT_ENCODING, ""))
+        encoded = await db.get_parsha_data_encoded(parsha_index, content_encoding, view)
+        if encoded is None:
+            if chapter is None or await db.get_parsha_data(parsha_index) is None:
+                raise web.HTTPNotFound(reason="Parsha is not available")
+            raise web.HTTPNotFound(reason="No such verses in the parsha")
+        response = conditional_json_response(
+            request,
+            body=encoded.body,
+            etag=encoded.etag,
+            cache_control=config.PARSHA_CACHE_CONTROL,
+            content_encoding=encoded.content_encoding,
+        )
+        response.headers[hdrs.VARY] = hdrs.ACCEPT_ENCODING
+        return response
+
+    indexed_parsha_data = await db.get_parsha_data_indexed(parsha_index)
+    if indexed_parsha_data is None:
+        raise web.HTTPNotFound(reason="Parsha is not available")
+    parsha_data = indexed_parsha_data.parsha_data
+
+    logger.info(f"Adding user-specific data to parsha: {add_my_starred_comments = } {add_user_comments = }")
+    try:
+        user, _ = await get_authorized_user(request)
+
+        user_parsha_data = await db.lookup_user_parsha_data(
+            username=user.username,
+            parsha=parsha_index,
+            with_starred_comments=add_my_starred_comments == "true",
+            with_user_comments=add_user_comments == "mine",
+        )
+        logger.info(
+            f"Found {len(user_parsha_data.starred_comment_ids)} starred comment(s) "
+            + f"and {len(user_parsha_data.user_comments)} user comment(s)"
+        )
+
+        parsha_data = overlay_user_data(
+            indexed_parsha_data, user_parsha_data.starred_comment_ids, user_parsha_data.user_comments
+        )
+    except Exception:
+        logger.info("Failed to add user-specific data to parsha, will return without it", exc_info=True)
+
+    view_data = view.apply(parsha_data)
+    if view_data is None:
+        raise web.HTTPNotFound(reason="No such verses in the parsha")
+    headers: dict[str, str] = {
+        hdrs.CACHE_CONTROL: config.PRIVATE_PARSHA_CACHE_CONTROL,
+        hdrs.VARY: f"{hdrs.ACCEPT_ENCODING}, {ACCESS_TOKEN_HEADER}",
+    }
+    if chapter is None:
+        return await streamed_json_response(request, serialization.iter_parsha_data_chunks(view_data), headers)
+
+    # personalized slices are small enough to be serialized and compressed on every request
+    identity_body = serialization.dumps(view_data)
+    content_encoding = choose_content_encoding(request.headers.get(hdrs.ACCEPT_ENCODING, ""))
+    encoded = encoded_parsha_data(
+        body=serialization.compress(identity_body, content_encoding),
+        content_encoding=content_encoding,
+        identity_body_hash=content_hash(identity_body),
+    )
+    response = conditional_json_response(
+        request,
+        body=encoded.body,
+        etag=encoded.etag,
+        cache_control=config.PRIVATE_PARSHA_CACHE_CONTROL,
+        content_encoding=content_encoding,
+    )
+    response.headers.update(headers)
+    return response
 
 
 def check_admin_token(request: web.Request) -> None:
@@ -204,7 +343,7 @@ async def save_parsha_data(request: web.Request) -> web.Response:
         logger.info("No current parsha data, creating new one")
         diff_ = []
     await db.save_parsha_data(parsha_data, replace=True)
-    return web.json_response(diff_)
+    return json_response(diff_)
 
 
 @routes.put("/parsha")
@@ -309,7 +448,7 @@ async def login(request: web.Request) -> web.Response:
         raise web.HTTPForbidden(reason="Wrong password")
     token = secrets.token_hex(32)
     await db.save_access_token(access_token=token, user=user)
-    return web.json_response({"token": token})
+    return json_response({"token": token})
 
 
 @routes.get("/logout")
@@ -412,15 +551,25 @@ async def get_starred_comments(request: web.Request) -> web.Response:
         raise web.HTTPBadRequest(reason="parsha_indices query param must be a comma-separated list of integers")
 
     page_size, page = _get_pagination_query_params(request)
+    cursor = request.query.get("cursor")
 
-    logger.info(f"Looking up starred comments with {parsha_indices = } {page = } {page_size = }")
+    logger.info(f"Looking up starred comments with {parsha_indices = } {page = } {page_size = } {cursor = }")
 
     db = get_db(request)
+    try:
+        starred_comments_page = await db.lookup_starred_comments_data(
+            starrer_username=user.username,
+            parsha_indices=parsha_indices,
+            page=page,
+            page_size=page_size,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise web.HTTPBadRequest(reason=f"Invalid query param: {e}")
     return web.json_response(
         text=StarredCommentLookupResponse(
-            starred_comments=await db.lookup_starred_comments_data(
-                starrer_username=user.username, parsha_indices=parsha_indices, page=page, page_size=page_size
-            )
+            starred_comments=starred_comments_page.starred_comments,
+            next_cursor=starred_comments_page.next_cursor,
         ).to_public_json()
     )
 
@@ -431,7 +580,7 @@ MIN_QUERY_LEN = 3
 
 
 @routes.get("/search-text")
-async def search_text(request: web.Request) -> web.Response:
+async def search_text(request: web.Request) -> web.StreamResponse:
     try:
         user, _ = await get_authorized_user(request)
         username: Optional[str] = user.username
@@ -456,12 +605,13 @@ async def search_text(request: web.Request) -> web.Response:
             search_in=[SearchTextIn(v) for v in request.query.getall("search_in", [sti.value for sti in SearchTextIn])],
             with_verse_parsha_data=bool(request.query.get("with_verse_parsha_data", False)),
             username=username,
+            cursor=request.query.get("cursor"),
         )
     except KeyError as e:
         raise web.HTTPBadRequest(reason=f"Missing required query param: {e}")
     except ValueError as e:
         raise web.HTTPBadRequest(reason=f"Invalid query param: {e}")
-    return web.json_response(text=search_text_results.to_public_json())
+    return await streamed_json_response(request, search_text_results.iter_public_json_chunks())
 
 
 @routes.post("/count/comments")
@@ -469,7 +619,7 @@ async def count_comments(request: web.Request) -> web.Response:
     await get_authorized_user(request, require_editor=True)
     db = get_db(request)
     parsed = TextOrCommentIterRequest.from_request_json(await safe_request_json(request))
-    return web.json_response({"count": await db.count_comments(parsed)})
+    return json_response({"count": await db.count_comments(parsed)})
 
 
 @routes.post("/count/texts")
@@ -477,7 +627,7 @@ async def count_texts(request: web.Request) -> web.Response:
     await get_authorized_user(request, require_editor=True)
     db = get_db(request)
     parsed = TextOrCommentIterRequest.from_request_json(await safe_request_json(request))
-    return web.json_response({"count": await db.count_texts(parsed)})
+    return json_response({"count": await db.count_texts(parsed)})
 
 
 @routes.post("/iter/comments")
@@ -549,17 +699,78 @@ async def start_background_jobs(app: web.Application) -> None:
         db: DatabaseInterface = app[AppExtensions.DB]
         while True:
             logger.info(f"Cached parsha indices: {await db.get_cached_parsha_indices()}")
+            logger.info(f"Parsha cache stats: {await db.get_parsha_cache_stats()}")
+            auth_cache_stats = await db.get_auth_cache_stats()
+            if auth_cache_stats is not None:
+                logger.info(f"Auth cache stats: {auth_cache_stats}")
             await asyncio.sleep(60 * 60)
 
     background_jobs.add(asyncio.create_task(monitor_parsha_cache()))
     app[AppExtensions.BACKGROUND_JOBS_SET] = background_jobs  # to prevent garbage collection
 
 
+async def stop_background_jobs(app: web.Application) -> None:
+    for job in app[AppExtensions.BACKGROUND_JOBS_SET]:
+        job.cancel()
+
+
+async def warm_up_parsha_cache(db: DatabaseInterface, concurrency: int) -> None:
+    """Load all available parshas into cache (with pre-serialized response bodies) so that first readers don't wait"""
+    start_time = time.perf_counter()
+    parsha_indices = await db.get_available_parsha_indices()
+    logger.info(f"Warming up parsha cache for {len(parsha_indices)} parsha(s) with {concurrency = }")
+    initial_evictions = (await db.get_parsha_cache_stats()).evictions
+    semaphore = asyncio.Semaphore(concurrency)
+    warmed_up_count = 0
+
+    async def warm_up(index: int) -> None:
+        nonlocal warmed_up_count
+        async with semaphore:
+            if (await db.get_parsha_cache_stats()).evictions > initial_evictions:
+                # warming up further would only evict other parshas
+                logger.info(f"Parsha cache budget is exhausted, not warming up parsha #{index}")
+                return
+            parsha_start_time = time.perf_counter()
+            try:
+                await db.warm_up_parsha_data(index, supported_content_encodings())
+            except Exception:
+                logger.exception(f"Error warming up cache for parsha #{index}")
+                return
+            warmed_up_count += 1
+            logger.info(
+                f"Warmed up parsha #{index} ({warmed_up_count} / {len(parsha_indices)}) "
+                + f"in {time.perf_counter() - parsha_start_time:.2f} sec"
+            )
+
+    await asyncio.gather(*(warm_up(index) for index in parsha_indices))
+    logger.info(
+        f"Parsha cache warmup done in {time.perf_counter() - start_time:.2f} sec, "
+        + f"{warmed_up_count} / {len(parsha_indices)} parsha(s) warmed up; {await db.get_parsha_cache_stats()}"
+    )
+
+
+async def start_parsha_cache_warmup(app: web.Application) -> None:
+    db: DatabaseInterface = app[AppExtensions.DB]
+    # running in the background to start accepting requests right away
+    app[AppExtensions.PARSHA_CACHE_WARMUP_TASK] = asyncio.create_task(
+        warm_up_parsha_cache(db, concurrency=config.PARSHA_CACHE_WARMUP_CONCURRENCY)
+    )
+
+
+async def stop_parsha_cache_warmup(app: web.Application) -> None:
+    task: Optional[asyncio.Task] = app.get(AppExtensions.PARSHA_CACHE_WARMUP_TASK)
+    if task is None or task.done():
+        return
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
 class BackendApp:
-    def __init__(self, db: DatabaseInterface) -> None:
+    def __init__(self, db: DatabaseInterface, warm_up_parsha_cache: bool = config.PARSHA_CACHE_WARMUP) -> None:
         self.db = db
         self.app = web.Application(client_max_size=10 * 1024**2)
-        self.app.middlewares.append(cors_middleware)
+        self.app.on_response_prepare.append(add_cors_headers)  # type: ignore
         self.app.add_routes(routes)
         self.app[AppExtensions.DB] = db
 
@@ -567,8 +778,17 @@ class BackendApp:
             logger.info(f"Setting up db: {db}")
             await db.setup()
 
+        async def db_teardown(app: web.Application):
+            logger.info(f"Tearing down db: {db}")
+            await db.teardown()
+
         self.app.on_startup.append(db_setup)
         self.app.on_startup.append(start_background_jobs)
+        self.app.on_cleanup.append(stop_background_jobs)
+        self.app.on_cleanup.append(db_teardown)
+        if warm_up_parsha_cache:
+            self.app.on_startup.append(start_parsha_cache_warmup)
+            self.app.on_cleanup.append(stop_parsha_cache_warmup)
 
     def run(self) -> None:
         web.run_app(self.app, port=config.PORT, access_log=logger if not config.IS_PROD else None)
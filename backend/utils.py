@@ -33,6 +33,7 @@ def deduplicate_keeping_order(iterable: Iterable[ItemT]) -> list[ItemT]:
 ALPHABETS = {
     "en": set(string.ascii_lowercase),
     "ru": set("абвгдеёжзийклмнопрстуфхцчшщъыьэюя"),
+    "he": set("אבגדהוזחטיכךלמםנןסעפףצץקרשת"),
 }
 
 
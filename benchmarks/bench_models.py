@@ -0,0 +1,38 @@
+import copy
+from typing import Any
+
+import pytest
+
+from backend.database.mongo import parsha_data_to_texts_and_comments
+from backend.model import PydanticObjectId, StoredComment, StoredText
+from benchmarks.parsha_samples import PARSHA_DATA_SAMPLES, ParshaDataSample
+
+
+def from_mongo_db_docs(sample: ParshaDataSample) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """Texts and comments of the sample parsha as they are returned from Mongo"""
+    texts, comments = parsha_data_to_texts_and_comments(sample.parsha_data)
+    text_docs = [t.to_mongo_db() for t in texts]
+    for doc in text_docs:
+        doc["_id"] = PydanticObjectId()
+    return text_docs, [c.to_mongo_db() for c in comments]
+
+
+@pytest.mark.parametrize("trusted", [False, True], ids=["validated", "trusted"])
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_from_mongo_db(benchmark, sample: ParshaDataSample, trusted: bool):
+    text_docs, comment_docs = from_mongo_db_docs(sample)
+
+    def parse(text_docs: list[dict[str, Any]], comment_docs: list[dict[str, Any]]) -> None:
+        if trusted:
+            [StoredText.from_trusted_mongo_db(doc) for doc in text_docs]
+            [StoredComment.from_trusted_mongo_db(doc) for doc in comment_docs]
+        else:
+            [StoredText.from_mongo_db(doc) for doc in text_docs]
+            [StoredComment.from_mongo_db(doc) for doc in comment_docs]
+
+    # from_mongo_db modifies documents in place, so each round gets fresh copies
+    benchmark.pedantic(
+        parse,
+        setup=lambda: ((copy.deepcopy(text_docs), copy.deepcopy(comment_docs)), {}),
+        rounds=10,
+    )
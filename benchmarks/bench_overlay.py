@@ -0,0 +1,25 @@
+import pytest
+
+from backend.overlay import IndexedParshaData, overlay_user_data
+from benchmarks.parsha_samples import (
+    PARSHA_DATA_SAMPLES,
+    ParshaDataSample,
+    sample_starred_comments,
+    sample_user_comments,
+)
+
+
+@pytest.mark.parametrize("user_items_count", [0, 10, 100])
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_overlay_user_data(benchmark, sample: ParshaDataSample, user_items_count: int):
+    starred_comment_ids = {
+        str(sc.comment_id) for sc in sample_starred_comments(sample.parsha_data, "user", user_items_count)
+    }
+    user_comments = sample_user_comments(sample.parsha_data, "user", user_items_count)
+    indexed_parsha_data = IndexedParshaData(sample.parsha_data)
+    benchmark(overlay_user_data, indexed_parsha_data, starred_comment_ids, user_comments)
+
+
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_index_parsha_data(benchmark, sample: ParshaDataSample):
+    benchmark(IndexedParshaData, sample.parsha_data)
@@ -0,0 +1,25 @@
+import random
+
+import pytest
+
+from backend.database.mongo import (
+    parsha_data_to_texts_and_comments,
+    texts_and_comments_to_parsha_data,
+)
+from benchmarks.parsha_samples import PARSHA_DATA_SAMPLES, ParshaDataSample
+
+
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_texts_and_comments_to_parsha_data(benchmark, sample: ParshaDataSample):
+    random.seed(1312)
+    texts, comments = parsha_data_to_texts_and_comments(sample.parsha_data)
+    random.shuffle(texts)
+    random.shuffle(comments)
+    parsha_data = benchmark(texts_and_comments_to_parsha_data, texts, comments)
+    assert parsha_data == sample.parsha_data
+
+
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_parsha_data_to_texts_and_comments(benchmark, sample: ParshaDataSample):
+    texts, comments = benchmark(parsha_data_to_texts_and_comments, sample.parsha_data)
+    assert texts and comments
@@ -0,0 +1,40 @@
+import pytest
+
+from backend import config, serialization
+from backend.database.mongo import parsha_data_to_texts_and_comments
+from backend.model import FoundMatch, PydanticObjectId, SearchTextResult
+from benchmarks.parsha_samples import PARSHA_DATA_SAMPLES, ParshaDataSample
+
+JSON_ENCODERS = sorted(serialization.JSON_ENCODERS)
+
+
+@pytest.mark.parametrize("json_encoder", JSON_ENCODERS)
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_dumps_parsha_data(benchmark, sample: ParshaDataSample, json_encoder: str, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(config, "JSON_ENCODER", json_encoder)
+    benchmark(serialization.dumps, sample.parsha_data)
+
+
+def search_text_result(sample: ParshaDataSample, page_size: int) -> SearchTextResult:
+    """Search results page of the sample parsha's comments, with single-verse parsha data for each of them"""
+    _, comments = parsha_data_to_texts_and_comments(sample.parsha_data)
+    found_matches = []
+    for comment in comments[:page_size]:
+        chapter = next(c for c in sample.parsha_data["chapters"] if c["chapter"] == comment.text_coords.chapter)
+        verse = next(v for v in chapter["verses"] if v["verse"] == comment.text_coords.verse)
+        found_matches.append(
+            FoundMatch(
+                comment=comment.copy(update={"db_id": PydanticObjectId()}),
+                parsha_data={**sample.parsha_data, "chapters": [{"chapter": chapter["chapter"], "verses": [verse]}]},
+            )
+        )
+    return SearchTextResult(found_matches=found_matches, total_matched_texts=0, total_matched_comments=page_size)
+
+
+@pytest.mark.parametrize("json_encoder", JSON_ENCODERS)
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_search_text_result_to_public_json(
+    benchmark, sample: ParshaDataSample, json_encoder: str, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(config, "JSON_ENCODER", json_encoder)
+    benchmark(search_text_result(sample, page_size=100).to_public_json)
@@ -0,0 +1,125 @@
+import asyncio
+from typing import Iterator, Optional
+
+import pytest
+from aiohttp import hdrs
+from aiohttp.test_utils import TestClient, TestServer
+
+from backend.constants import ACCESS_TOKEN_HEADER
+from backend.database.memory import InMemoryDatabase
+from backend.model import StoredUser, StoredUserComment, UserData
+from backend.server import BackendApp
+from benchmarks.parsha_samples import (
+    PARSHA_DATA_SAMPLES,
+    ParshaDataSample,
+    sample_starred_comments,
+    sample_user_comments,
+)
+
+USERNAME = "benchmark-user"
+ACCESS_TOKEN = "benchmark-access-token"
+
+
+@pytest.fixture(scope="module")
+def event_loop() -> Iterator[asyncio.AbstractEventLoop]:
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module")
+def client(event_loop: asyncio.AbstractEventLoop) -> Iterator[TestClient]:
+    db = InMemoryDatabase()
+
+    async def populate() -> None:
+        user = await db.save_user(
+            StoredUser(
+                username=USERNAME,
+                data=UserData(full_name="Benchmark User"),
+                invited_by_username=None,
+                password_hash="",
+                salt="",
+            )
+        )
+        await db.save_access_token(ACCESS_TOKEN, user)
+        for sample in PARSHA_DATA_SAMPLES:
+            await db.save_parsha_data(sample.parsha_data, replace=True)
+            for starred_comment in sample_starred_comments(sample.parsha_data, USERNAME, count=50):
+                await db.save_starred_comment(starred_comment)
+            for user_comment in sample_user_comments(sample.parsha_data, USERNAME, count=20):
+                await db.save_user_comment(StoredUserComment(**user_comment.dict()))
+
+    event_loop.run_until_complete(populate())
+    # measuring server-side work only, compressed responses are not decompressed by the client
+    client = TestClient(TestServer(BackendApp(db).app), loop=event_loop, auto_decompress=False)
+    event_loop.run_until_complete(client.start_server())
+    yield client
+    event_loop.run_until_complete(client.close())
+
+
+def get(event_loop: asyncio.AbstractEventLoop, client: TestClient, path: str, headers: dict[str, str]) -> bytes:
+    async def request() -> bytes:
+        async with client.get(path, headers=headers) as response:
+            assert response.status in {200, 304}
+            return await response.read()
+
+    return event_loop.run_until_complete(request())
+
+
+@pytest.mark.parametrize("accept_encoding", [None, "gzip"])
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_get_parsha(
+    benchmark, event_loop, client: TestClient, sample: ParshaDataSample, accept_encoding: Optional[str]
+):
+    headers = {hdrs.ACCEPT_ENCODING: accept_encoding or "identity"}
+    benchmark(get, event_loop, client, f"/parsha/{sample.parsha_data['parsha']}", headers)
+
+
+@pytest.mark.parametrize("accept_encoding", [None, "gzip"])
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_get_parsha_chapter(
+    benchmark, event_loop, client: TestClient, sample: ParshaDataSample, accept_encoding: Optional[str]
+):
+    headers = {hdrs.ACCEPT_ENCODING: accept_encoding or "identity"}
+    parsha_data = sample.parsha_data
+    path = f"/parsha/{parsha_data['parsha']}/chapters/{parsha_data['chapters'][0]['chapter']}"
+    benchmark(get, event_loop, client, path, headers)
+
+
+@pytest.mark.parametrize("accept_encoding", [None, "gzip"])
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_get_parsha_single_text_source(
+    benchmark, event_loop, client: TestClient, sample: ParshaDataSample, accept_encoding: Optional[str]
+):
+    headers = {hdrs.ACCEPT_ENCODING: accept_encoding or "identity"}
+    parsha_data = sample.parsha_data
+    text_source = next(iter(parsha_data["chapters"][0]["verses"][0]["text"]))
+    path = f"/parsha/{parsha_data['parsha']}?text_sources={text_source}&comment_sources="
+    benchmark(get, event_loop, client, path, headers)
+
+
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_get_parsha_not_modified(benchmark, event_loop, client: TestClient, sample: ParshaDataSample):
+    path = f"/parsha/{sample.parsha_data['parsha']}"
+
+    async def get_etag() -> str:
+        async with client.get(path) as response:
+            return response.headers[hdrs.ETAG]
+
+    headers = {hdrs.IF_NONE_MATCH: event_loop.run_until_complete(get_etag())}
+    benchmark(get, event_loop, client, path, headers)
+
+
+@pytest.mark.parametrize("sample", PARSHA_DATA_SAMPLES, ids=lambda s: s.name)
+def test_get_parsha_with_user_data(benchmark, event_loop, client: TestClient, sample: ParshaDataSample):
+    benchmark(
+        get,
+        event_loop,
+        client,
+        f"/parsha/{sample.parsha_data['parsha']}?my_starred_comments=true&add_user_comments=mine",
+        {ACCESS_TOKEN_HEADER: ACCESS_TOKEN},
+    )
+
+
+def test_get_metadata(benchmark, event_loop, client: TestClient):
+    benchmark(get, event_loop, client, "/metadata", {ACCESS_TOKEN_HEADER: ACCESS_TOKEN})
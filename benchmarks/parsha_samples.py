@@ -0,0 +1,110 @@
+import datetime
+import itertools
+import json
+import random
+from pathlib import Path
+from typing import NamedTuple
+
+from backend.metadata import TORAH_METADATA
+from backend.model import (
+    ChapterData,
+    CommentData,
+    DisplayedUserComment,
+    ParshaData,
+    PydanticObjectId,
+    StarredComment,
+    TextCoords,
+    UserData,
+    VerseData,
+)
+
+JSON_DIR = Path(__file__).parent.parent / "json"
+
+
+class ParshaDataSample(NamedTuple):
+    name: str
+    parsha_data: ParshaData
+
+
+def generate_parsha_data(parsha: int, chapters: int, verses_per_chapter: int, comments_per_verse: int) -> ParshaData:
+    """Synthetic parsha data of roughly realistic shape, used when there are no downloaded parsha JSONs"""
+    text_sources = [ts.key for ts in TORAH_METADATA.text_sources]
+    comment_sources = [cs.key for cs in TORAH_METADATA.comment_sources]
+    parsha_data = ParshaData(book=1, parsha=parsha, chapters=[])
+    for chapter in range(1, chapters + 1):
+        chapter_data = ChapterData(chapter=chapter, verses=[])
+        for verse in range(1, verses_per_chapter + 1):
+            comments: dict[str, list[CommentData]] = {}
+            for i in range(comments_per_verse):
+                comments.setdefault(comment_sources[i % len(comment_sources)], []).append(
+                    CommentData(
+                        id=f"{parsha:08x}{chapter:04x}{verse:04x}{i:08x}",
+                        anchor_phrase=f"anchor phrase {i}",
+                        comment=f"Comment #{i} to verse {chapter}:{verse}. " * 20,
+                        format="plain",
+                    )
+                )
+            chapter_data["verses"].append(
+                VerseData(
+                    verse=verse,
+                    text={ts: f"Text of verse {chapter}:{verse} from {ts}. " * 5 for ts in text_sources},
+                    comments=comments,
+                    text_formats={ts: "plain" for ts in text_sources},
+                )
+            )
+        parsha_data["chapters"].append(chapter_data)
+    return parsha_data
+
+
+def load_parsha_data_samples() -> list[ParshaDataSample]:
+    if JSON_DIR.exists():
+        paths = sorted(p for p in JSON_DIR.iterdir() if p.stem.isdigit() and p.suffix == ".json")
+        if paths:
+            return [ParshaDataSample(name=p.name, parsha_data=json.loads(p.read_text())) for p in paths]
+    return [
+        ParshaDataSample(
+            name="synthetic-small",
+            parsha_data=generate_parsha_data(1, chapters=2, verses_per_chapter=25, comments_per_verse=5),
+        ),
+        ParshaDataSample(
+            name="synthetic-large",
+            parsha_data=generate_parsha_data(2, chapters=6, verses_per_chapter=40, comments_per_verse=12),
+        ),
+    ]
+
+
+PARSHA_DATA_SAMPLES = load_parsha_data_samples()
+
+
+def sample_starred_comments(parsha_data: ParshaData, username: str, count: int) -> list[StarredComment]:
+    comment_ids = [
+        comment["id"]
+        for chapter in parsha_data["chapters"]
+        for verse in chapter["verses"]
+        for comment in itertools.chain.from_iterable(verse["comments"].values())
+        if "id" in comment
+    ]
+    random.seed(1312)
+    return [
+        StarredComment(comment_id=PydanticObjectId(comment_id), starrer_username=username)
+        for comment_id in random.sample(comment_ids, k=min(count, len(comment_ids)))
+    ]
+
+
+def sample_user_comments(parsha_data: ParshaData, username: str, count: int) -> list[DisplayedUserComment]:
+    verse_coords = [
+        (chapter["chapter"], verse["verse"]) for chapter in parsha_data["chapters"] for verse in chapter["verses"]
+    ]
+    random.seed(1312)
+    return [
+        DisplayedUserComment(
+            db_id=PydanticObjectId(),
+            text_coords=TextCoords(parsha=parsha_data["parsha"], chapter=chapter, verse=verse),
+            anchor_phrase=None,
+            comment=f"User comment #{i}",
+            author_username=username,
+            timestamp=datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc),
+            author_user_data=UserData(full_name="Benchmark User"),
+        )
+        for i, (chapter, verse) in enumerate(random.choices(verse_coords, k=count))
+    ]
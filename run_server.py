@@ -1,9 +1,19 @@
 import logging
 
-from backend.database.mongo import MongoDatabase
+from backend import config
+from backend.database.interface import DatabaseInterface
+from backend.database.memory import InMemoryDatabase
+from backend.database.mongo import AsyncMongoDatabase, MongoDatabase
 from backend.server import BackendApp
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(name)s: %(message)s")
-    app = BackendApp(db=MongoDatabase.from_config())
+    db: DatabaseInterface
+    if config.DB_BACKEND == "memory":
+        db = InMemoryDatabase.from_config()
+    elif config.DB_BACKEND == "mongo-async":
+        db = AsyncMongoDatabase.from_config()
+    else:
+        db = MongoDatabase.from_config()
+    app = BackendApp(db=db)
     app.run()
@@ -0,0 +1,2 @@
+# results are saved to benchmarks/results and compared against the latest saved run
+pytest benchmarks --benchmark-autosave --benchmark-storage=benchmarks/results --benchmark-compare "$@"
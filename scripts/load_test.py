@@ -0,0 +1,78 @@
+"""Load test of a running backend: requests given paths from several concurrent clients and reports throughput and
+latency percentiles. To compare database backends, run it against servers started with DB_BACKEND=memory
+and DB_BACKEND=mongo on the same machine, e.g.
+
+DB_BACKEND=memory python run_server.py &
+python scripts/load_test.py --url http://localhost:8081 --duration 30 /parsha/1 /parsha/2 /metadata
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import statistics
+import time
+
+import aiohttp
+
+
+async def run_client(
+    session: aiohttp.ClientSession,
+    url: str,
+    paths: "itertools.cycle[str]",
+    headers: dict[str, str],
+    deadline: float,
+    latencies: list[float],
+    statuses: collections.Counter[int],
+) -> None:
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        async with session.get(url + next(paths), headers=headers) as response:
+            await response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status] += 1
+
+
+async def main(args: argparse.Namespace) -> None:
+    headers = {"Accept-Encoding": args.accept_encoding}
+    if args.token:
+        headers["X-Token"] = args.token
+    latencies: list[float] = []
+    statuses = collections.Counter[int]()
+    paths = itertools.cycle(args.paths)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector, auto_decompress=False) as session:
+        async with session.get(args.url + args.paths[0]) as response:  # warming up
+            await response.read()
+        start = time.monotonic()
+        deadline = start + args.duration
+        await asyncio.gather(
+            *(
+                run_client(session, args.url, paths, headers, deadline, latencies, statuses)
+                for _ in range(args.concurrency)
+            )
+        )
+        elapsed = time.monotonic() - start
+
+    if len(latencies) < 2:
+        print("Not enough requests were made, increase the duration")
+        return
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(f"{len(latencies)} requests in {elapsed:.1f} sec, {len(latencies) / elapsed:.1f} RPS")
+    print(f"statuses: {dict(statuses)}")
+    print(
+        "latency, ms: "
+        + f"mean {statistics.mean(latencies) * 1000:.1f}, "
+        + ", ".join(f"p{p} {percentiles[p - 1] * 1000:.1f}" for p in (50, 90, 99))
+        + f", max {max(latencies) * 1000:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test a running backend")
+    parser.add_argument("paths", nargs="+", help="paths to request in a round-robin fashion, e.g. /parsha/1")
+    parser.add_argument("--url", default="http://localhost:8081", help="backend base URL")
+    parser.add_argument("--concurrency", type=int, default=16, help="number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="test duration, seconds")
+    parser.add_argument("--token", default=None, help="access token to send with requests")
+    parser.add_argument("--accept-encoding", default="gzip", help="Accept-Encoding header value")
+    asyncio.run(main(parser.parse_args()))
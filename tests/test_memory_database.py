@@ -0,0 +1,191 @@
+import asyncio
+import datetime
+from typing import Optional
+
+import pytest
+
+from backend import config
+from backend.database.interface import SearchTextIn, SearchTextSorting
+from backend.database.memory import InMemoryDatabase
+from backend.model import (
+    ParshaData,
+    StarredComment,
+    StoredUser,
+    StoredUserComment,
+    TextCoords,
+    TextOrCommentIterRequest,
+    TextPositionFilter,
+    UserData,
+)
+
+PARSHA_DATA = ParshaData(
+    book=1,
+    parsha=1,
+    chapters=[
+        {
+            "chapter": 1,
+            "verses": [
+                {
+                    "verse": 1,
+                    "text": {"fg": "In the beginning God created the heaven and the earth"},
+                    "comments": {
+                        "rashi": [{"anchor_phrase": None, "comment": "about the beginning", "format": "plain"}],
+                    },
+                },
+                {
+                    "verse": 2,
+                    "text": {"fg": "And the earth was without form"},
+                    "comments": {
+                        "rashi": [{"anchor_phrase": "the earth", "comment": "without form", "format": "plain"}],
+                    },
+                },
+            ],
+        }
+    ],
+)
+
+
+def test_users_and_tokens():
+    async def run() -> None:
+        db = InMemoryDatabase()
+        user = await db.save_user(
+            StoredUser(
+                username="user", data=UserData(full_name="User"), invited_by_username=None, password_hash="", salt=""
+            )
+        )
+        assert await db.lookup_user("user") == user
+        await db.save_access_token("token", user)
+        assert await db.authenticate_user("token") == user
+        await db.delete_access_token("token")
+        assert await db.authenticate_user("token") is None
+
+    asyncio.run(run())
+
+
+def test_parsha_data_roundtrip_and_search():
+    async def run() -> None:
+        db = InMemoryDatabase()
+        await db.save_parsha_data(PARSHA_DATA, replace=True)
+        await db.save_parsha_data(PARSHA_DATA, replace=True)  # replacing does not duplicate texts
+        assert await db.get_available_parsha_indices() == [1]
+        assert await db.count_texts(TextOrCommentIterRequest(position=TextPositionFilter(parsha=1), offset=0)) == 2
+
+        parsha_data = await db.get_parsha_data(1)
+        assert parsha_data is not None
+        verses = parsha_data["chapters"][0]["verses"]
+        assert [v["text"]["fg"] for v in verses] == [v["text"]["fg"] for v in PARSHA_DATA["chapters"][0]["verses"]]
+
+        result = await db.search_text(
+            query='"the earth" -beginning',
+            language="russian",
+            page=0,
+            page_size=10,
+            sorting=SearchTextSorting.START_TO_END,
+            search_in=[SearchTextIn.TEXTS, SearchTextIn.COMMENTS],
+            with_verse_parsha_data=True,
+            username=None,
+        )
+        assert result.total_matched_texts == 1
+        assert result.total_matched_comments == 1
+        assert all(m.parsha_data is not None for m in result.found_matches)
+        assert {(m.text or m.comment).text_coords.verse for m in result.found_matches} == {2}  # type: ignore
+
+    asyncio.run(run())
+
+
+def test_starred_and_user_comments():
+    async def run() -> None:
+        db = InMemoryDatabase()
+        await db.save_parsha_data(PARSHA_DATA, replace=True)
+        await db.save_user(
+            StoredUser(
+                username="user", data=UserData(full_name="User"), invited_by_username=None, password_hash="", salt=""
+            )
+        )
+        parsha_data = await db.get_parsha_data(1)
+        assert parsha_data is not None
+        comment_id = parsha_data["chapters"][0]["verses"][1]["comments"]["rashi"][0]["id"]
+
+        await db.save_starred_comment(StarredComment(comment_id=comment_id, starrer_username="user"))
+        assert await db.count_starred_comments_by_parsha("user") == {1: 1}
+        starred_comments_page = await db.lookup_starred_comments_data("user", [], page=0, page_size=10)
+        assert [str(scd.comment.db_id) for scd in starred_comments_page.starred_comments] == [comment_id]
+        assert starred_comments_page.starred_comments[0].comment.is_starred
+        assert starred_comments_page.next_cursor is None
+
+        user_comment = await db.save_user_comment(
+            StoredUserComment(
+                text_coords=TextCoords(parsha=1, chapter=1, verse=1),
+                anchor_phrase=None,
+                comment="my comment",
+                author_username="user",
+                timestamp=datetime.datetime.now(datetime.timezone.utc),
+            )
+        )
+        assert [uc.comment for uc in await db.lookup_user_comments("user", parsha=1)] == ["my comment"]
+        user_parsha_data = await db.lookup_user_parsha_data(
+            "user", parsha=1, with_starred_comments=True, with_user_comments=True
+        )
+        assert user_parsha_data.starred_comment_ids == {comment_id}
+        assert [uc.comment for uc in user_parsha_data.user_comments] == ["my comment"]
+        assert not await db.delete_user_comment(user_comment.db_id, author_username="someone else")
+        assert await db.delete_user_comment(user_comment.db_id, author_username="user")
+        assert await db.lookup_user_comments("user", parsha=1) == []
+
+    asyncio.run(run())
+
+
+def test_search_cursor_pagination():
+    async def run() -> None:
+        db = InMemoryDatabase()
+        await db.save_parsha_data(PARSHA_DATA, replace=True)
+
+        for sorting in SearchTextSorting:
+            found_verses: list[int] = []
+            cursor: Optional[str] = None
+            for _ in range(10):
+                result = await db.search_text(
+                    query="the",
+                    language="russian",
+                    page=0,
+                    page_size=1,
+                    sorting=sorting,
+                    search_in=[SearchTextIn.TEXTS],
+                    with_verse_parsha_data=False,
+                    username=None,
+                    cursor=cursor,
+                )
+                found_verses.extend(m.text.text_coords.verse for m in result.found_matches)  # type: ignore
+                cursor = result.next_cursor
+                if cursor is None:
+                    break
+            assert sorted(found_verses) == [1, 2], sorting
+            if sorting is SearchTextSorting.END_TO_START:
+                assert found_verses == [2, 1]
+
+        with pytest.raises(ValueError):
+            await db.lookup_starred_comments_data("user", [], page=0, page_size=10, cursor="not a cursor")
+
+    asyncio.run(run())
+
+
+def test_search_count_cap(monkeypatch: pytest.MonkeyPatch):
+    async def run() -> None:
+        db = InMemoryDatabase()
+        await db.save_parsha_data(PARSHA_DATA, replace=True)
+        result = await db.search_text(
+            query="the",
+            language="russian",
+            page=0,
+            page_size=10,
+            sorting=SearchTextSorting.START_TO_END,
+            search_in=[SearchTextIn.TEXTS],
+            with_verse_parsha_data=False,
+            username=None,
+        )
+        assert len(result.found_matches) == 2
+        assert result.total_matched_texts == 1
+        assert result.are_totals_capped
+
+    monkeypatch.setattr(config, "SEARCH_COUNT_CAP", 1)
+    asyncio.run(run())
@@ -0,0 +1,35 @@
+import bson
+
+from backend.model import StoredComment, StoredText, TextCoords
+
+
+def test_from_trusted_mongo_db():
+    text_doc = {
+        "_id": bson.ObjectId(),
+        "text_coords": {"parsha": 1, "chapter": 2, "verse": 3},
+        "text_source": "fg",
+        "text": "In the beginning",
+        "language": "en",
+        "legacy_field": "not in the model",
+    }
+    text = StoredText.from_trusted_mongo_db(dict(text_doc))
+    assert text == StoredText.from_mongo_db(dict(text_doc))
+    assert text.text_coords == TextCoords(parsha=1, chapter=2, verse=3)
+    assert text.format == "plain"  # defaults are filled in
+    assert not hasattr(text, "legacy_field")
+    assert text.to_public_json() == StoredText.from_mongo_db(dict(text_doc)).to_public_json()
+
+    comment_doc = {
+        "_id": bson.ObjectId(),
+        "text_coords": {"parsha": 1, "chapter": 2, "verse": 3},
+        "comment_source": "rashi",
+        "anchor_phrase": None,
+        "comment": "Comment",
+        "format": "plain",
+        "language": "ru",
+        "index": 0,
+    }
+    comment = StoredComment.from_trusted_mongo_db(dict(comment_doc))
+    assert comment == StoredComment.from_mongo_db(dict(comment_doc))
+    assert comment.db_id == comment_doc["_id"]
+    assert comment.is_starred is None
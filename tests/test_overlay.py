@@ -0,0 +1,96 @@
+import copy
+import datetime
+import json
+
+from backend import serialization
+from backend.model import (
+    DisplayedUserComment,
+    ParshaData,
+    PydanticObjectId,
+    TextCoords,
+    UserData,
+)
+from backend.overlay import (
+    IndexedParshaData,
+    SourceFilter,
+    filter_sources,
+    overlay_user_data,
+    slice_parsha_data,
+)
+
+PARSHA_DATA = ParshaData(
+    book=1,
+    parsha=1,
+    chapters=[
+        {
+            "chapter": 1,
+            "verses": [
+                {
+                    "verse": 1,
+                    "text": {"fg": "In the beginning"},
+                    "comments": {
+                        "rashi": [
+                            {"id": "a", "anchor_phrase": None, "comment": "first", "format": "plain"},
+                            {"id": "b", "anchor_phrase": None, "comment": "second", "format": "plain"},
+                        ],
+                        "ramban": [{"id": "c", "anchor_phrase": None, "comment": "third", "format": "plain"}],
+                    },
+                },
+                {"verse": 2, "text": {"fg": "And the earth"}, "comments": {}},
+            ],
+        }
+    ],
+)
+
+
+def test_overlay_user_data():
+    original = copy.deepcopy(PARSHA_DATA)
+    user_comment = DisplayedUserComment(
+        db_id=PydanticObjectId(b"1" * 12),
+        text_coords=TextCoords(parsha=1, chapter=1, verse=2),
+        anchor_phrase=None,
+        comment="my comment",
+        author_username="user",
+        timestamp=datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc),
+        author_user_data=UserData(full_name="User"),
+    )
+
+    overlayed = overlay_user_data(
+        IndexedParshaData(PARSHA_DATA), starred_comment_ids={"b", "unknown"}, user_comments=[user_comment]
+    )
+
+    assert PARSHA_DATA == original
+    verse_1, verse_2 = overlayed["chapters"][0]["verses"]
+    assert "user_comments" not in verse_1
+    assert [uc["comment"] for uc in verse_2["user_comments"]] == ["my comment"]
+    assert json.loads(serialization.dumps(verse_2["user_comments"])) == [json.loads(user_comment.to_public_json())]
+    assert [c.get("is_starred_by_me") for c in verse_1["comments"]["rashi"]] == [None, True]
+    # unchanged data is shared with the original parsha data
+    original_verse_1 = PARSHA_DATA["chapters"][0]["verses"][0]
+    assert verse_2["comments"] is not PARSHA_DATA["chapters"][0]["verses"][1]["comments"]
+    assert verse_1["text"] is original_verse_1["text"]
+    assert verse_1["comments"]["ramban"] is original_verse_1["comments"]["ramban"]
+    assert verse_1["comments"]["rashi"][0] is original_verse_1["comments"]["rashi"][0]
+
+
+def test_slice_parsha_data():
+    chapter_slice = slice_parsha_data(PARSHA_DATA, chapter=1)
+    assert chapter_slice == PARSHA_DATA
+    verse_slice = slice_parsha_data(PARSHA_DATA, chapter=1, first_verse=2, last_verse=5)
+    assert verse_slice is not None
+    assert [v["verse"] for v in verse_slice["chapters"][0]["verses"]] == [2]
+    assert verse_slice["chapters"][0]["verses"][0] is PARSHA_DATA["chapters"][0]["verses"][1]  # not copied
+    assert slice_parsha_data(PARSHA_DATA, chapter=2) is None
+    assert slice_parsha_data(PARSHA_DATA, chapter=1, first_verse=3) is None
+
+
+def test_filter_sources():
+    original = copy.deepcopy(PARSHA_DATA)
+    filtered = filter_sources(PARSHA_DATA, SourceFilter(comment_sources=frozenset({"ramban"})))
+    verse = filtered["chapters"][0]["verses"][0]
+    assert verse["text"] == {"fg": "In the beginning"}
+    assert list(verse["comments"]) == ["ramban"]
+    assert verse["comments"]["ramban"] is PARSHA_DATA["chapters"][0]["verses"][0]["comments"]["ramban"]
+    no_texts = filter_sources(PARSHA_DATA, SourceFilter(text_sources=frozenset()))
+    assert [v["text"] for v in no_texts["chapters"][0]["verses"]] == [{}, {}]
+    assert PARSHA_DATA == original
@@ -0,0 +1,142 @@
+import asyncio
+import gzip
+import json
+import sys
+
+import pytest
+
+from backend.database.cache import EvictionPolicy, ParshaDataCache, estimate_size
+from backend.model import ParshaData
+from backend.overlay import ParshaDataView, SourceFilter
+
+
+def make_parsha_data(parsha: int) -> ParshaData:
+    return ParshaData(
+        book=1,
+        parsha=parsha,
+        chapters=[{"chapter": 1, "verses": [{"verse": 1, "text": {"fg": "In the beginning"}, "comments": {}}]}],
+    )
+
+
+ENTRY_SIZE = estimate_size(make_parsha_data(10))
+
+
+def test_cache_hits_and_misses():
+    cache = ParshaDataCache(max_size_bytes=10 * ENTRY_SIZE)
+    assert cache.get(11) is None
+    parsha_data = make_parsha_data(11)
+    cache.put(11, parsha_data)
+    assert cache.get(11) is parsha_data
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries, stats.size_bytes) == (1, 1, 1, ENTRY_SIZE)
+    assert stats.hit_ratio == 0.5
+    # peeking is not counted
+    assert cache.peek(11) is parsha_data
+    assert cache.peek(12) is None
+    assert cache.stats() == stats
+
+
+@pytest.mark.parametrize(
+    "policy, expected_indices",
+    [
+        (EvictionPolicy.LRU, [11, 13]),
+        (EvictionPolicy.LFU, [12, 13]),
+    ],
+)
+def test_cache_eviction(policy: EvictionPolicy, expected_indices: list[int]):
+    cache = ParshaDataCache(max_size_bytes=2 * ENTRY_SIZE, policy=policy)
+    cache.put(11, make_parsha_data(11))
+    cache.put(12, make_parsha_data(12))
+    cache.get(12)
+    cache.get(12)
+    cache.get(11)
+    cache.put(13, make_parsha_data(13))
+    assert sorted(cache.indices()) == expected_indices
+    assert cache.stats().evictions == 1
+    assert cache.stats().size_bytes == 2 * ENTRY_SIZE
+
+
+def test_cache_invalidation():
+    cache = ParshaDataCache(max_size_bytes=10 * ENTRY_SIZE)
+    cache.put(11, make_parsha_data(11))
+    cache.put(12, make_parsha_data(12))
+    cache.invalidate(11)
+    cache.invalidate(100)
+    assert cache.indices() == [12]
+    assert cache.stats().size_bytes == ENTRY_SIZE
+    cache.clear()
+    assert cache.indices() == []
+    assert cache.stats().size_bytes == 0
+
+
+def test_cache_skips_oversized_entries():
+    cache = ParshaDataCache(max_size_bytes=ENTRY_SIZE // 2)
+    cache.put(11, make_parsha_data(11))
+    assert 11 not in cache
+    assert cache.stats().evictions == 0
+
+
+def test_cache_encoded_parsha_data():
+    cache = ParshaDataCache(max_size_bytes=10 * ENTRY_SIZE)
+    assert cache.get_encoded(11, None) is None
+    parsha_data = make_parsha_data(11)
+    cache.put(11, parsha_data)
+    identity = cache.get_encoded(11, None)
+    assert identity is not None and json.loads(identity.body) == parsha_data
+    gzipped = cache.get_encoded(11, "gzip")
+    assert gzipped is not None and gzip.decompress(gzipped.body) == identity.body
+    assert gzipped.etag != identity.etag
+    assert cache.get_encoded(11, "gzip") == gzipped
+    assert cache.stats().size_bytes == ENTRY_SIZE + sys.getsizeof(identity.body) + sys.getsizeof(gzipped.body)
+    cache.invalidate(11)
+    assert cache.get_encoded(11, None) is None
+    assert cache.stats().size_bytes == 0
+    cache.put(11, {**parsha_data, "book": 2})
+    new_identity = cache.get_encoded(11, None)
+    assert new_identity is not None and new_identity.etag != identity.etag
+
+
+def test_cache_indexed_parsha_data():
+    cache = ParshaDataCache(max_size_bytes=10 * ENTRY_SIZE)
+    assert cache.get_indexed(11) is None
+    cache.put(11, make_parsha_data(11))
+    size_before = cache.stats().size_bytes
+    indexed = cache.get_indexed(11)
+    assert indexed is not None
+    assert indexed.verse_positions == {(1, 1): (0, 0)}
+    assert cache.get_indexed(11) is indexed
+    assert cache.stats().size_bytes > size_before
+
+
+def test_cache_encoded_parsha_data_views():
+    cache = ParshaDataCache(max_size_bytes=10 * ENTRY_SIZE, max_views=1)
+    cache.put(11, make_parsha_data(11))
+    full = cache.get_encoded(11, None)
+    no_texts = cache.get_encoded(11, None, ParshaDataView(source_filter=SourceFilter(text_sources=frozenset())))
+    assert full is not None and no_texts is not None
+    assert json.loads(no_texts.body)["chapters"][0]["verses"][0]["text"] == {}
+    assert no_texts.etag != full.etag
+    size_before = cache.stats().size_bytes
+    # the least recently used view's bodies are dropped, the whole parsha ones are kept
+    chapter = cache.get_encoded(11, None, ParshaDataView(chapter=1))
+    assert chapter is not None and json.loads(chapter.body) == make_parsha_data(11)
+    assert cache.stats().size_bytes == size_before - sys.getsizeof(no_texts.body) + sys.getsizeof(chapter.body)
+    assert cache.get_encoded(11, None) == full
+    assert cache.get_encoded(11, None, ParshaDataView(chapter=1)) == chapter
+    assert cache.stats().size_bytes == size_before - sys.getsizeof(no_texts.body) + sys.getsizeof(chapter.body)
+    assert cache.get_encoded(11, None, ParshaDataView(chapter=2)) is None
+
+
+def test_cache_warm_up_encoded():
+    cache = ParshaDataCache(max_size_bytes=10 * ENTRY_SIZE)
+    parsha_data = make_parsha_data(11)
+    cache.put(11, parsha_data)
+    asyncio.run(cache.warm_up_encoded(11, ["gzip"]))
+    warmed_up_size = cache.stats().size_bytes
+    identity = cache.get_encoded(11, None)
+    gzipped = cache.get_encoded(11, "gzip")
+    assert identity is not None and json.loads(identity.body) == parsha_data
+    assert gzipped is not None and gzip.decompress(gzipped.body) == identity.body
+    assert cache.stats().size_bytes == warmed_up_size  # nothing is encoded again
+    asyncio.run(cache.warm_up_encoded(12, ["gzip"]))  # not cached, no-op
+    assert cache.indices() == [11]
@@ -0,0 +1,92 @@
+from pathlib import Path
+
+import bson
+
+from backend.search.analysis import parse_query, tokenize
+from backend.search.engine import SearchEngine
+from backend.search.index import InvertedIndex
+
+
+def test_tokenize_strips_niqqud_and_cantillation():
+    assert tokenize("בְּרֵאשִׁ֖ית בָּרָ֣א אֱלֹהִ֑ים", "he") == ["בראשית", "ברא", "אלהימ"]  # final letters are folded
+    assert tokenize("מַה־טֹּבוּ", "he") == ["מה", "טבו"]  # maqaf separates words
+    assert tokenize("Ёлка и ель", "ru") == ["елка", "и", "ель"]
+    assert tokenize("בָּרָא Ёлка", "none") == ["ברא", "елка"]
+
+
+def test_parse_query():
+    query = parse_query('"the earth" -beginning God', "en")
+    assert query.terms == ["god", "the", "earth"]
+    assert query.phrases == [["the", "earth"]]
+    assert query.negated_terms == ["beginning"]
+
+
+def make_index() -> tuple[InvertedIndex, list[bson.ObjectId]]:
+    index = InvertedIndex()
+    doc_ids = [bson.ObjectId() for _ in range(3)]
+    index.add(doc_ids[0], (1, 1, 1), tokenize("In the beginning God created the heaven and the earth", "en"))
+    index.add(doc_ids[1], (1, 1, 2), tokenize("And the earth was without form", "en"))
+    index.add(doc_ids[2], (1, 1, 3), tokenize("earth earth earth", "en"))
+    return index, doc_ids
+
+
+def search(index: InvertedIndex, query: str) -> list[bson.ObjectId]:
+    return [hit.doc_id for hit in sorted(index.search(parse_query(query, "en")), key=lambda hit: -hit.score)]
+
+
+def test_inverted_index_search():
+    index, doc_ids = make_index()
+    assert search(index, "earth") == [doc_ids[2], doc_ids[1], doc_ids[0]]  # by term frequency and length
+    assert search(index, "earth -form") == [doc_ids[2], doc_ids[0]]
+    assert set(search(index, '"the earth"')) == {doc_ids[0], doc_ids[1]}
+    assert search(index, '"earth the"') == []
+    assert search(index, "nothing") == []
+
+    index.remove(doc_ids[2])
+    assert set(search(index, "earth")) == {doc_ids[0], doc_ids[1]}
+    index.add(doc_ids[1], (1, 1, 2), tokenize("Void", "en"))
+    assert search(index, "earth") == [doc_ids[0]]
+    assert search(index, "void") == [doc_ids[1]]
+
+
+def test_inverted_index_persistence(tmp_path: Path):
+    index, doc_ids = make_index()
+    index.remove(doc_ids[0])
+    index.save(tmp_path / "index.idx")
+
+    loaded = InvertedIndex.load(tmp_path / "index.idx")
+    assert len(loaded) == 2
+    assert doc_ids[0] not in loaded
+    assert search(loaded, "earth") == [doc_ids[2], doc_ids[1]]
+    hit = next(hit for hit in loaded.search(parse_query("form", "en")))
+    assert hit.coords == (1, 1, 2)
+
+    loaded.add(doc_ids[0], (1, 1, 1), tokenize("earth and form", "en"))
+    loaded.save(tmp_path / "index.idx")
+    reloaded = InvertedIndex.load(tmp_path / "index.idx")
+    assert set(search(reloaded, "form")) == {doc_ids[0], doc_ids[1]}
+    assert set(search(reloaded, "earth")) == set(doc_ids)
+
+
+def test_search_engine_compaction(tmp_path: Path):
+    texts_index, doc_ids = make_index()
+    engine = SearchEngine(texts_index, InvertedIndex())
+    texts_index.remove(doc_ids[2])
+    assert texts_index.needs_compaction()
+
+    saved_modifications = engine.save(tmp_path)
+    compacted = engine.load_compacted(tmp_path, saved_modifications)
+    assert list(compacted) == ["texts"]
+    engine.replace_compacted(compacted, saved_modifications)
+    assert engine.indices["texts"] is compacted["texts"]
+    assert engine.indices["texts"].doc_ids == doc_ids[:2]
+    assert set(search(engine.indices["texts"], "earth")) == set(doc_ids[:2])
+
+    # modified while the compacted index was being loaded, it would miss the modification
+    texts_index = engine.indices["texts"]
+    texts_index.remove(doc_ids[1])
+    saved_modifications = engine.save(tmp_path)
+    compacted = engine.load_compacted(tmp_path, saved_modifications)
+    texts_index.add(doc_ids[2], (1, 1, 3), tokenize("earth", "en"))
+    engine.replace_compacted(compacted, saved_modifications)
+    assert engine.indices["texts"] is texts_index
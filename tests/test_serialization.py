@@ -0,0 +1,88 @@
+import datetime
+import gzip
+import json
+from typing import Optional
+
+import bson
+import pytest
+
+from backend import config
+from backend.model import ParshaData, StoredUserComment, TextCoords
+from backend.serialization import (
+    JSON_ENCODERS,
+    choose_content_encoding,
+    compress_stream,
+    dumps,
+    iter_parsha_data_chunks,
+)
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected_content_encoding",
+    [
+        ("", None),
+        ("gzip", "gzip"),
+        ("gzip, deflate", "gzip"),
+        ("deflate;q=1.0, GZIP;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("identity", None),
+        ("gzip;q=0.5, identity", None),
+        ("gzip;q=0.5, identity;q=0", "gzip"),
+        ("identity;q=0", None),  # nothing acceptable, the header is disregarded
+        ("*", "gzip"),
+        ("*;q=0", None),
+        ("gzip;q=0, *", None),
+        ("identity;q=0, *", "gzip"),
+        ("gzip;q=bad", None),
+    ],
+)
+def test_choose_content_encoding(
+    accept_encoding: str, expected_content_encoding: Optional[str], monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(config, "RESPONSE_CONTENT_ENCODINGS", ["gzip"])
+    assert choose_content_encoding(accept_encoding) == expected_content_encoding
+
+
+PARSHA_DATA = ParshaData(
+    book=1,
+    parsha=1,
+    chapters=[
+        {"chapter": 1, "verses": [{"verse": 1, "text": {"fg": "В начале"}, "comments": {}}]},
+        {"chapter": 2, "verses": [{"verse": 1, "text": {"fg": "И были закончены"}, "comments": {}}]},
+    ],
+)
+
+
+def test_iter_parsha_data_chunks():
+    chunks = list(iter_parsha_data_chunks(PARSHA_DATA))
+    assert b"".join(chunks) == dumps(PARSHA_DATA)
+    assert b"," + dumps(PARSHA_DATA["chapters"][1]) in chunks  # one chunk per chapter
+
+
+@pytest.mark.parametrize("content_encoding", [None, "gzip"])
+def test_compress_stream(content_encoding: Optional[str]):
+    body = b"".join(compress_stream(iter_parsha_data_chunks(PARSHA_DATA), content_encoding))
+    assert (body if content_encoding is None else gzip.decompress(body)) == dumps(PARSHA_DATA)
+
+
+@pytest.mark.parametrize("json_encoder", sorted(JSON_ENCODERS))
+def test_json_encoders(json_encoder: str, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(config, "JSON_ENCODER", json_encoder)
+    assert dumps(PARSHA_DATA) == JSON_ENCODERS["json"](PARSHA_DATA, None)
+    assert dumps({1: "א"}) == '{"1":"א"}'.encode("utf-8")
+    comment = StoredUserComment(
+        db_id=bson.ObjectId("0123456789ab0123456789ab"),
+        text_coords=TextCoords(parsha=1, chapter=1, verse=1),
+        anchor_phrase=None,
+        comment="comment",
+        author_username="user",
+        timestamp=datetime.datetime(2023, 1, 2, 3, 4, 5, 6),
+    )
+    assert json.loads(comment.to_public_json()) == {
+        "db_id": "0123456789ab0123456789ab",
+        "text_coords": {"parsha": 1, "chapter": 1, "verse": 1},
+        "anchor_phrase": None,
+        "comment": "comment",
+        "author_username": "user",
+        "timestamp": "2023-01-02T03:04:05.000006",
+    }
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from aiohttp import hdrs
+from aiohttp.test_utils import TestClient, TestServer
+
+from backend.database.memory import InMemoryDatabase
+from backend.model import ParshaData
+from backend.server import BackendApp
+
+ORIGIN = "https://tanakh-reading.nj-vs-vh.name"
+
+PARSHA_DATA = ParshaData(
+    book=1,
+    parsha=1,
+    chapters=[{"chapter": 1, "verses": [{"verse": 1, "text": {"fg": "And the earth"}, "comments": {}}]}],
+)
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/parsha/1",
+        "/parsha/1/chapters/1",
+        "/parsha/1?my_starred_comments=true",  # streamed
+        "/search-text?query=earth",  # streamed
+    ],
+)
+def test_cors_headers(path: str):
+    async def run() -> None:
+        db = InMemoryDatabase()
+        await db.save_parsha_data(PARSHA_DATA, replace=True)
+        async with TestClient(TestServer(BackendApp(db, warm_up_parsha_cache=False).app)) as client:
+            async with client.get(path, headers={hdrs.ORIGIN: ORIGIN}) as response:
+                assert response.status == 200
+                assert response.headers[hdrs.ACCESS_CONTROL_ALLOW_ORIGIN] == ORIGIN
+                await response.read()
+
+    asyncio.run(run())
+
+
+def test_slice_etags_differ_between_content_encodings():
+    async def run() -> None:
+        db = InMemoryDatabase()
+        await db.save_parsha_data(PARSHA_DATA, replace=True)
+        async with TestClient(TestServer(BackendApp(db, warm_up_parsha_cache=False).app)) as client:
+            etags = set()
+            for accept_encoding in ["identity", "gzip"]:
+                async with client.get(
+                    "/parsha/1/chapters/1", headers={hdrs.ACCEPT_ENCODING: accept_encoding}
+                ) as response:
+                    assert response.status == 200
+                    etags.add(response.headers[hdrs.ETAG])
+            assert len(etags) == 2
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "path, reason",
+    [
+        ("/parsha/2", "Parsha is not available"),
+        ("/parsha/2/chapters/1", "Parsha is not available"),
+        ("/parsha/1/chapters/2", "No such verses in the parsha"),
+        ("/parsha/1/chapters/1/verses/2-3", "No such verses in the parsha"),
+    ],
+)
+def test_missing_parsha_data(path: str, reason: str):
+    async def run() -> None:
+        db = InMemoryDatabase()
+        await db.save_parsha_data(PARSHA_DATA, replace=True)
+        async with TestClient(TestServer(BackendApp(db, warm_up_parsha_cache=False).app)) as client:
+            async with client.get(path) as response:
+                assert response.status == 404
+                assert response.reason == reason
+
+    asyncio.run(run())
@@ -0,0 +1,39 @@
+from backend.database.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_expiration():
+    clock = FakeClock()
+    cache = TTLCache[str, str](ttl=10, max_entries=10, clock=clock)
+    assert cache.get("token") is None
+    cache.put("token", "user")
+    clock.now = 9.9
+    assert cache.get("token") == "user"
+    clock.now = 10
+    assert cache.get("token") is None
+    stats = cache.stats()
+    assert (stats.entries, stats.hits, stats.misses, stats.expirations) == (0, 1, 2, 1)
+
+
+def test_ttl_cache_eviction_and_invalidation():
+    cache = TTLCache[str, str](ttl=10, max_entries=2)
+    cache.put("token-1", "user-1")
+    cache.put("token-2", "user-2")
+    cache.put("token-3", "user-2")
+    assert cache.get("token-1") is None  # the oldest entry is evicted
+
+    cache.invalidate("token-2")
+    assert cache.get("token-2") is None
+    assert cache.get("token-3") == "user-2"
+
+    cache.put("token-1", "user-1")
+    cache.invalidate_where(lambda user: user == "user-2")
+    assert cache.get("token-3") is None
+    assert cache.get("token-1") == "user-1"
@@ -2,7 +2,7 @@ from typing import Any
 
 import pytest
 
-from backend.utils import deduplicate_keeping_order
+from backend.utils import deduplicate_keeping_order, worst_language_detection_ever
 
 
 @pytest.mark.parametrize(
@@ -17,3 +17,17 @@ from backend.utils import deduplicate_keeping_order
 )
 def test_deduplicate_keeping_order(original: list[Any], expected_deduplicated: list[Any]):
     assert deduplicate_keeping_order(original) == expected_deduplicated
+
+
+@pytest.mark.parametrize(
+    "text, expected_language",
+    [
+        ("In the beginning", "en"),
+        ("В начале сотворил", "ru"),
+        ("בראשית ברא", "he"),
+        ("בְּרֵאשִׁ֖ית בָּרָ֣א", "he"),
+        ("12345", "none"),
+    ],
+)
+def test_worst_language_detection_ever(text: str, expected_language: str):
+    assert worst_language_detection_ever(text) == expected_language